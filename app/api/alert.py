@@ -284,7 +284,7 @@ async def check_alerts():
     try:
         service = get_alert_service()
         with session_scope() as session:
-            triggered_alerts = await service.check_all_alerts(session)
+            triggered_alerts = await service.check_all_alerts_list(session)
             return {
                 "checked": True,
                 "triggered_count": len(triggered_alerts),
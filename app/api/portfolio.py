@@ -84,7 +84,7 @@ class TransactionCreate(BaseModel):
     transaction_type: str
     quantity: float
     price: float
-    trade_date: Optional[str] = None
+    trade_date: Optional[date] = None
     commission: float = 0.0
     notes: Optional[str] = None
 
@@ -99,7 +99,7 @@ class TransactionResponse(BaseModel):
     price: float
     amount: float
     commission: float
-    trade_date: str
+    trade_date: date
     notes: Optional[str]
     created_at: str
 
@@ -116,7 +116,7 @@ class PortfolioHistoryResponse(BaseModel):
     total_cost: float
     profit_loss: float
     profit_loss_pct: float
-    record_date: str
+    record_date: date
     created_at: str
 
     class Config:
@@ -342,11 +342,8 @@ async def update_position(
         if not position:
             raise HTTPException(status_code=404, detail="持仓不存在")
 
+        # 市值与盈亏为数据库生成列，只需写入当前价格
         position.current_price = position_update.current_price
-        if position.quantity > 0:
-            position.market_value = position.current_price * position.quantity
-            position.profit_loss = position.market_value - position.total_cost
-            position.profit_loss_pct = (position.profit_loss / position.total_cost * 100) if position.total_cost > 0 else 0
 
         await session.commit()
         await session.refresh(position)
@@ -381,7 +378,7 @@ async def add_transaction(
     添加交易记录
     """
     try:
-        trade_date = transaction.trade_date or date.today().strftime("%Y-%m-%d")
+        trade_date = transaction.trade_date or date.today()
 
         async with session_scope() as session:
             service = PortfolioService(session)
@@ -419,8 +416,8 @@ async def add_transaction(
 async def get_transactions(
     portfolio_id: int,
     stock_code: Optional[str] = Query(None, description="股票代码"),
-    start_date: Optional[str] = Query(None, description="开始日期"),
-    end_date: Optional[str] = Query(None, description="结束日期"),
+    start_date: Optional[date] = Query(None, description="开始日期 (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="结束日期 (YYYY-MM-DD)"),
 ):
     """
     获取交易记录列表
@@ -491,8 +488,8 @@ async def update_portfolio_value(portfolio_id: int):
 @router.get("/{portfolio_id}/history", response_model=List[PortfolioHistoryResponse])
 async def get_portfolio_history(
     portfolio_id: int,
-    start_date: Optional[str] = Query(None, description="开始日期"),
-    end_date: Optional[str] = Query(None, description="结束日期"),
+    start_date: Optional[date] = Query(None, description="开始日期 (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="结束日期 (YYYY-MM-DD)"),
 ):
     """
     获取投资组合历史记录
@@ -5,13 +5,14 @@
 """
 import time
 from collections import defaultdict
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Literal, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Path, Query, Request
 from pydantic import BaseModel
 
 from app.services.stock_service import StockService, get_stock_service
 from app.services.cache_service import get_cache, cached, CACHE_TTL
 from app.services.rate_limiter import get_rate_limiter, get_rate_limit_for_endpoint
+from app.api.validators import STOCK_CODE_PATTERN, DATE_PATTERN
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -188,7 +189,10 @@ async def search_stocks(
 
 
 @router.get("/quote/{code}", response_model=StockQuote)
-async def get_stock_quote(request: Request, code: str):
+async def get_stock_quote(
+    request: Request,
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）")
+):
     """
     获取股票实时行情（缓存 30 秒）
 
@@ -233,10 +237,10 @@ async def get_stock_quote(request: Request, code: str):
 @router.get("/kline/{code}", response_model=List[KLineData])
 async def get_kline(
     request: Request,
-    code: str,
-    start_date: Optional[str] = Query(None, description="开始日期 (YYYYMMDD)"),
-    end_date: Optional[str] = Query(None, description="结束日期 (YYYYMMDD)"),
-    period: str = Query("daily", description="周期类型 (daily/weekly/monthly)"),
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）"),
+    start_date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="开始日期 (YYYYMMDD)"),
+    end_date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="结束日期 (YYYYMMDD)"),
+    period: Literal["daily", "weekly", "monthly"] = Query("daily", description="周期类型 (daily/weekly/monthly)"),
     adjust: str = Query("qfq", description="复权类型 (qfq/hfq/空字符串)")
 ):
     """
@@ -255,14 +259,6 @@ async def get_kline(
     # 检查频率限制
     await _handle_rate_limit_check(request, "kline")
 
-    # 验证周期参数
-    valid_periods = ["daily", "weekly", "monthly"]
-    if period not in valid_periods:
-        raise HTTPException(
-            status_code=400,
-            detail=f"无效的周期类型: {period}。支持的类型: {valid_periods}"
-        )
-
     logger.info(f"获取K线数据: {code}, 周期: {period}, 复权: {adjust}")
 
     try:
@@ -300,7 +296,10 @@ async def get_kline(
 
 
 @router.get("/{code}", response_model=StockInfo)
-async def get_stock_info(request: Request, code: str):
+async def get_stock_info(
+    request: Request,
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）")
+):
     """
     获取股票详细信息（缓存 5 分钟）
 
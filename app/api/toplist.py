@@ -3,13 +3,14 @@
 
 提供龙虎榜数据、机构席位追踪、资金流向分析和大单监控接口。
 """
-from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional, List, Literal, Dict, Any
+from fastapi import APIRouter, HTTPException, Path, Query, Request
 from pydantic import BaseModel
 
 from app.services.toplist_service import TopListService, get_toplist_service
 from app.services.cache_service import get_cache, CACHE_TTL
 from app.services.rate_limiter import get_rate_limiter, get_rate_limit_for_endpoint
+from app.api.validators import STOCK_CODE_PATTERN, DATE_PATTERN
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -172,7 +173,7 @@ async def _handle_rate_limit_check(request: Request, endpoint_type: str = "defau
 @router.get("/daily", response_model=DailyToplistResponse)
 async def get_daily_toplist(
     request: Request,
-    date: Optional[str] = Query(None, description="日期，格式 YYYYMMDD，默认最新日期")
+    date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="日期，格式 YYYYMMDD，默认最新日期")
 ):
     """
     获取每日龙虎榜数据
@@ -218,9 +219,9 @@ async def get_daily_toplist(
 @router.get("/stock/{code}", response_model=List[StockToplistItem])
 async def get_stock_toplist(
     request: Request,
-    code: str,
-    start_date: Optional[str] = Query(None, description="开始日期 (YYYYMMDD)"),
-    end_date: Optional[str] = Query(None, description="结束日期 (YYYYMMDD)")
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）"),
+    start_date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="开始日期 (YYYYMMDD)"),
+    end_date: Optional[str] = Query(None, pattern=DATE_PATTERN, description="结束日期 (YYYYMMDD)")
 ):
     """
     获取个股历史龙虎榜数据
@@ -254,7 +255,7 @@ async def get_stock_toplist(
 @router.get("/institutional/{code}", response_model=InstitutionalTrackingResponse)
 async def get_institutional_tracking(
     request: Request,
-    code: str,
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）"),
     days: int = Query(30, ge=1, le=90, description="追踪天数")
 ):
     """
@@ -289,8 +290,8 @@ async def get_institutional_tracking(
 @router.get("/money_flow/{code}", response_model=MoneyFlowResponse)
 async def get_money_flow(
     request: Request,
-    code: str,
-    period: str = Query("daily", description="周期类型 (daily/weekly/monthly)")
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）"),
+    period: Literal["daily", "weekly", "monthly"] = Query("daily", description="周期类型 (daily/weekly/monthly)")
 ):
     """
     获取资金流向分析
@@ -324,7 +325,7 @@ async def get_money_flow(
 @router.get("/large_order/{code}", response_model=LargeOrderResponse)
 async def get_large_order_monitoring(
     request: Request,
-    code: str,
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）"),
     threshold: float = Query(10000000, ge=1000000, description="大单阈值（金额）")
 ):
     """
@@ -359,7 +360,7 @@ async def get_large_order_monitoring(
 @router.get("/capital/{code}", response_model=CapitalDistributionResponse)
 async def get_capital_distribution(
     request: Request,
-    code: str
+    code: str = Path(..., pattern=STOCK_CODE_PATTERN, description="股票代码（6位数字）")
 ):
     """
     获取主力资金分布
@@ -0,0 +1,11 @@
+"""
+路由层参数校验规则
+
+各路由共用的路径/查询参数格式约束，非法请求在进入服务层前即被拒绝。
+"""
+
+# 股票代码（6位数字）
+STOCK_CODE_PATTERN = r"^[0-9]{6}$"
+
+# 日期（YYYYMMDD）
+DATE_PATTERN = r"^\d{8}$"
@@ -4,19 +4,44 @@ WebSocket 实时行情 API
 提供 WebSocket 连接用于实时股票行情推送。
 """
 import asyncio
-import json
+import heapq
 import time
 import uuid
-from typing import Dict, Set, Optional
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Set, Optional, Tuple, Union
+
+import msgspec
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 from pydantic import BaseModel, Field
+from app.config import get_config
+from app.db.database import SharedPubSub, snapshot
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+# 行情发布频道前缀，频道名为 quote:<stock_code>
+QUOTE_CHANNEL_PREFIX = "quote:"
+
+# 预先序列化的固定服务器帧
+INVALID_JSON_FRAME = orjson.dumps({"type": "error", "message": "Invalid JSON format"}).decode()
+MESSAGE_TOO_LARGE_FRAME = orjson.dumps({"type": "error", "message": "Message too large"}).decode()
+
+
+def _pong_frame() -> str:
+    """生成 pong 帧（仅拼接时间戳，不经过 dict 构造与序列化）"""
+    return f'{{"type":"pong","timestamp":{time.time()!r}}}'
+
+
+@lru_cache(maxsize=32)
+def _error_frame(message: str) -> str:
+    """生成错误帧（按错误信息缓存）"""
+    return orjson.dumps({"type": "error", "message": message}).decode()
+
 
 # ============================================
 # 连接管理
@@ -34,24 +59,125 @@ class ConnectionManager:
     """
 
     def __init__(self):
-        # 所有活跃连接: {client_id: websocket}
-        self.active_connections: Dict[str, WebSocket] = {}
+        # 客户端句柄: {client_id: handle}，句柄即连接槽位下标
+        self._handles: Dict[str, int] = {}
+
+        # 连接槽位（按句柄索引）: [websocket | None]
+        self._sockets: List[Optional[WebSocket]] = []
+
+        # 槽位对应的客户端 ID（按句柄索引）: [client_id | None]
+        self._client_ids: List[Optional[str]] = []
+
+        # 可复用的空闲句柄
+        self._free_handles: List[int] = []
+
+        # 行情推送队列与写协程（按句柄索引）
+        self._queues: List[Optional[asyncio.Queue]] = []
+        self._writers: List[Optional[asyncio.Task]] = []
 
         # 客户端订阅的股票: {client_id: Set[stock_code]}
         self.client_subscriptions: Dict[str, Set[str]] = {}
 
-        # 股票订阅者: {stock_code: Set[client_id]}
-        self.stock_subscribers: Dict[str, Set[str]] = {}
+        # 股票订阅者: {stock_code: array('I') of handle}
+        self.stock_subscribers: Dict[str, array] = {}
 
         # 客户端心跳: {client_id: last_ping_time}
         self.client_heartbeat: Dict[str, float] = {}
 
+        # 心跳截止时间小顶堆: [(deadline, client_id)]
+        # 刷新心跳时直接压入新条目，过期的旧条目在弹出时按最新心跳时间过滤
+        self._deadlines: List[Tuple[float, str]] = []
+
         # 心跳间隔（秒）
         self.heartbeat_interval = 30
 
+        # 客户端单帧消息最大长度，超出时不解析直接拒绝
+        self.max_message_size = get_config().ws_max_size
+
+        # 行情推送合并参数：队列上限（溢出时丢弃最旧）、合并窗口（秒）、单帧最大条数
+        self.max_queue = get_config().ws_send_queue
+        self.batch_window = 0.005
+        self.batch_max_items = 100
+
         # 清理任务
         self._cleanup_task: Optional[asyncio.Task] = None
 
+        # 共享的 Redis 行情订阅（未启用时仅支持进程内广播）
+        self._pubsub: Optional[SharedPubSub] = None
+
+        # 订阅总数（随订阅变化增量维护）
+        self._total_subscriptions = 0
+
+        # 统计信息及其序列化帧缓存，连接或订阅变化时失效
+        self._stats_cache: Optional[dict] = None
+        self._stats_frame_cache: Optional[str] = None
+
+    def attach_pubsub(self, pubsub: SharedPubSub):
+        """
+        接入共享的 Redis 行情订阅
+
+        之后某只股票的订阅者从 0 变为 1 时订阅 quote:<code> 频道，
+        从 1 变为 0 时取消订阅；收到的行情在本地分发到各客户端队列。
+
+        Args:
+            pubsub: 共享订阅连接
+        """
+        self._pubsub = pubsub
+        pubsub.set_handler(self._on_pubsub_message)
+
+    def _on_pubsub_message(self, channel: str, data):
+        """处理 Redis 行情消息"""
+        stock_code = channel[len(QUOTE_CHANNEL_PREFIX):]
+        self._enqueue_quote(stock_code, orjson.loads(data))
+
+    async def _sync_channels(self, subscribe: list[str] = (), unsubscribe: list[str] = ()):
+        """
+        同步 Redis 频道订阅（仅在订阅者数量 0↔1 变化时调用）
+
+        Args:
+            subscribe: 需要新订阅的股票代码
+            unsubscribe: 需要取消订阅的股票代码
+        """
+        if self._pubsub is None:
+            return
+
+        try:
+            if subscribe:
+                await self._pubsub.subscribe(*(QUOTE_CHANNEL_PREFIX + code for code in subscribe))
+            if unsubscribe:
+                await self._pubsub.unsubscribe(*(QUOTE_CHANNEL_PREFIX + code for code in unsubscribe))
+        except Exception as e:
+            logger.warning(f"Failed to sync quote channels: {e}")
+
+    @property
+    def active_connections(self) -> Dict[str, WebSocket]:
+        """所有活跃连接: {client_id: websocket}"""
+        return {
+            client_id: self._sockets[handle]
+            for client_id, handle in self._handles.items()
+        }
+
+    def _allocate_handle(self, client_id: str, websocket: WebSocket) -> int:
+        """为新连接分配句柄，优先复用已释放的槽位"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        writer = asyncio.create_task(self._writer_loop(client_id, websocket, queue))
+
+        if self._free_handles:
+            handle = self._free_handles.pop()
+            self._sockets[handle] = websocket
+            self._client_ids[handle] = client_id
+            self._queues[handle] = queue
+            self._writers[handle] = writer
+        else:
+            handle = len(self._sockets)
+            self._sockets.append(websocket)
+            self._client_ids.append(client_id)
+            self._queues.append(queue)
+            self._writers.append(writer)
+
+        self._handles[client_id] = handle
+        return handle
+
     async def connect(self, websocket: WebSocket, client_id: Optional[str] = None) -> str:
         """
         处理新的 WebSocket 连接
@@ -70,11 +196,12 @@ class ConnectionManager:
             client_id = str(uuid.uuid4())
 
         # 注册连接
-        self.active_connections[client_id] = websocket
+        self._allocate_handle(client_id, websocket)
         self.client_subscriptions[client_id] = set()
-        self.client_heartbeat[client_id] = time.time()
+        self._touch_heartbeat(client_id)
+        self._invalidate_stats()
 
-        logger.info(f"WebSocket client connected: {client_id}, total: {len(self.active_connections)}")
+        logger.info(f"WebSocket client connected: {client_id}, total: {len(self._handles)}")
 
         # 发送连接成功消息
         await self._send_personal_message({
@@ -96,21 +223,56 @@ class ConnectionManager:
         Args:
             client_id: 客户端 ID
         """
+        handle = self._handles.pop(client_id, None)
+
         # 从所有股票订阅中移除
-        if client_id in self.client_subscriptions:
-            for stock_code in self.client_subscriptions[client_id]:
-                if stock_code in self.stock_subscribers:
-                    self.stock_subscribers[stock_code].discard(client_id)
-                    # 如果没有订阅者了，清理空集合
-                    if not self.stock_subscribers[stock_code]:
-                        del self.stock_subscribers[stock_code]
-
-        # 移除连接
-        self.active_connections.pop(client_id, None)
-        self.client_subscriptions.pop(client_id, None)
+        released = []
+        subscriptions = self.client_subscriptions.pop(client_id, None)
+        if subscriptions:
+            self._total_subscriptions -= len(subscriptions)
+        if subscriptions and handle is not None:
+            for stock_code in subscriptions:
+                if self._remove_subscriber(stock_code, handle):
+                    released.append(stock_code)
+
+        # 释放连接槽位
+        if handle is not None:
+            writer = self._writers[handle]
+            if writer is not None and writer is not asyncio.current_task():
+                writer.cancel()
+            self._sockets[handle] = None
+            self._client_ids[handle] = None
+            self._queues[handle] = None
+            self._writers[handle] = None
+            self._free_handles.append(handle)
+
         self.client_heartbeat.pop(client_id, None)
+        self._invalidate_stats()
+
+        await self._sync_channels(unsubscribe=released)
+
+        logger.info(f"WebSocket client disconnected: {client_id}, remaining: {len(self._handles)}")
+
+    def _remove_subscriber(self, stock_code: str, handle: int) -> bool:
+        """
+        从股票订阅者中移除句柄，没有订阅者时清理空数组
+
+        Returns:
+            该股票是否已没有订阅者
+        """
+        subscribers = self.stock_subscribers.get(stock_code)
+        if subscribers is None:
+            return False
+
+        try:
+            subscribers.remove(handle)
+        except ValueError:
+            pass
 
-        logger.info(f"WebSocket client disconnected: {client_id}, remaining: {len(self.active_connections)}")
+        if not subscribers:
+            del self.stock_subscribers[stock_code]
+            return True
+        return False
 
     async def subscribe(self, client_id: str, stock_codes: list[str]):
         """
@@ -123,14 +285,27 @@ class ConnectionManager:
         if client_id not in self.client_subscriptions:
             self.client_subscriptions[client_id] = set()
 
+        subscriptions = self.client_subscriptions[client_id]
+        handle = self._handles.get(client_id)
+        acquired = []
+
         for code in stock_codes:
+            if code in subscriptions:
+                continue
+
             # 添加到客户端订阅
-            self.client_subscriptions[client_id].add(code)
+            subscriptions.add(code)
+            self._total_subscriptions += 1
 
             # 添加到股票订阅者
-            if code not in self.stock_subscribers:
-                self.stock_subscribers[code] = set()
-            self.stock_subscribers[code].add(client_id)
+            if handle is not None:
+                if code not in self.stock_subscribers:
+                    self.stock_subscribers[code] = array("I")
+                    acquired.append(code)
+                self.stock_subscribers[code].append(handle)
+
+        self._invalidate_stats()
+        await self._sync_channels(subscribe=acquired)
 
         logger.info(f"Client {client_id} subscribed to: {stock_codes}")
 
@@ -151,15 +326,24 @@ class ConnectionManager:
         if client_id not in self.client_subscriptions:
             return
 
+        subscriptions = self.client_subscriptions[client_id]
+        handle = self._handles.get(client_id)
+        released = []
+
         for code in stock_codes:
+            if code not in subscriptions:
+                continue
+
             # 从客户端订阅中移除
-            self.client_subscriptions[client_id].discard(code)
+            subscriptions.discard(code)
+            self._total_subscriptions -= 1
 
             # 从股票订阅者中移除
-            if code in self.stock_subscribers:
-                self.stock_subscribers[code].discard(client_id)
-                if not self.stock_subscribers[code]:
-                    del self.stock_subscribers[code]
+            if handle is not None and self._remove_subscriber(code, handle):
+                released.append(code)
+
+        self._invalidate_stats()
+        await self._sync_channels(unsubscribe=released)
 
         logger.info(f"Client {client_id} unsubscribed from: {stock_codes}")
 
@@ -173,22 +357,69 @@ class ConnectionManager:
         """
         向订阅某股票的的所有客户端广播数据
 
+        行情只放入各客户端的推送队列，由写协程合并后以 multi 消息发送。
+
         Args:
             stock_code: 股票代码
             data: 要发送的数据
         """
+        self._enqueue_quote(stock_code, data)
+
+    def _enqueue_quote(self, stock_code: str, data: dict):
+        """将行情放入该股票所有订阅者的推送队列"""
         if stock_code not in self.stock_subscribers:
             return
 
-        subscribers = self.stock_subscribers[stock_code].copy()
         message = {
             "type": "quote",
             "stock_code": stock_code,
             "data": data
         }
 
-        for client_id in subscribers:
-            await self._send_personal_message(message, client_id)
+        for handle in self.stock_subscribers[stock_code]:
+            queue = self._queues[handle]
+            if queue is None:
+                continue
+            # 队列已满时丢弃最旧的行情，避免慢客户端积压
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def send_snapshot(self, client_id: str, stock_codes: list[str]):
+        """
+        向客户端发送订阅股票的最新行情快照
+
+        通过一次 MGET 读取全部快照，直接拼接 Redis 中预序列化的行情 JSON，
+        打包为一条 multi 消息发送。未接入 Redis 行情源时跳过。
+
+        Args:
+            client_id: 客户端 ID
+            stock_codes: 股票代码列表
+        """
+        if self._pubsub is None or not stock_codes:
+            return
+
+        try:
+            values = await snapshot(stock_codes)
+        except Exception as e:
+            logger.warning(f"Failed to load quote snapshot for {client_id}: {e}")
+            return
+
+        items = []
+        for code, raw in zip(stock_codes, values):
+            if raw is None:
+                continue
+            # 快照值原样拼入消息，只接受 JSON 对象文本，其他写入方留下的值跳过
+            try:
+                data = raw.decode() if isinstance(raw, bytes) else raw
+            except UnicodeDecodeError:
+                data = ""
+            if not data.startswith("{"):
+                logger.warning(f"Skipping malformed quote snapshot for {code}")
+                continue
+            items.append('{"type":"quote","stock_code":' + orjson.dumps(code).decode() + ',"data":' + data + '}')
+        if items:
+            await self._send_raw('{"type":"multi","items":[' + ",".join(items) + ']}', client_id)
 
     async def broadcast_to_all(self, data: dict):
         """
@@ -202,8 +433,74 @@ class ConnectionManager:
             "data": data
         }
 
-        for client_id in list(self.active_connections.keys()):
-            await self._send_personal_message(message, client_id)
+        await self._broadcast(message, list(self._handles.values()))
+
+    async def _broadcast(self, message: dict, handles: list[int]):
+        """
+        并发向多个客户端发送同一消息
+
+        单个客户端发送失败不会中断其他客户端，失败的连接在发送结束后统一断开。
+
+        Args:
+            message: 消息内容
+            handles: 客户端句柄列表
+        """
+        # 发送前先解析出连接，避免并发期间槽位被复用导致错发
+        targets = [
+            (handle, self._sockets[handle])
+            for handle in handles
+            if self._sockets[handle] is not None
+        ]
+
+        # 消息只序列化一次，所有客户端共享同一份负载
+        payload = orjson.dumps(message).decode()
+        results = await asyncio.gather(
+            *(self._send(payload, websocket) for _, websocket in targets),
+            return_exceptions=True
+        )
+
+        for (handle, websocket), result in zip(targets, results):
+            if isinstance(result, Exception) and self._sockets[handle] is websocket:
+                client_id = self._client_ids[handle]
+                logger.error(f"Failed to send message to {client_id}: {result}")
+                await self.disconnect(client_id)
+
+    async def _writer_loop(self, client_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        客户端行情写协程
+
+        等到第一条行情后再等待一个合并窗口，把窗口内累积的行情
+        （最多 batch_max_items 条）合并为一条 multi 消息发送。
+
+        Args:
+            client_id: 客户端 ID
+            websocket: WebSocket 连接
+            queue: 该客户端的行情推送队列
+        """
+        while True:
+            batch = [await queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while len(batch) < self.batch_max_items and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            payload = orjson.dumps({"type": "multi", "items": batch}).decode()
+            try:
+                await self._send(payload, websocket)
+            except Exception as e:
+                logger.error(f"Failed to send message to {client_id}: {e}")
+                await self.disconnect(client_id)
+                return
+
+    async def _send(self, payload: str, websocket: WebSocket):
+        """
+        向指定连接发送已序列化的消息（发送失败时抛出异常）
+
+        Args:
+            payload: 已序列化的 JSON 文本
+            websocket: WebSocket 连接
+        """
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.send_text(payload)
 
     async def _send_personal_message(self, message: dict, client_id: str):
         """
@@ -213,14 +510,22 @@ class ConnectionManager:
             message: 消息内容
             client_id: 客户端 ID
         """
-        if client_id not in self.active_connections:
-            return
+        await self._send_raw(orjson.dumps(message).decode(), client_id)
+
+    async def _send_raw(self, payload: str, client_id: str):
+        """
+        向指定客户端发送已序列化的消息
 
-        websocket = self.active_connections[client_id]
+        Args:
+            payload: 已序列化的 JSON 文本
+            client_id: 客户端 ID
+        """
+        handle = self._handles.get(client_id)
+        if handle is None:
+            return
 
         try:
-            if websocket.client_state == WebSocketState.CONNECTED:
-                await websocket.send_json(message)
+            await self._send(payload, self._sockets[handle])
         except Exception as e:
             logger.error(f"Failed to send message to {client_id}: {e}")
             # 连接可能已断开，标记待清理
@@ -233,14 +538,25 @@ class ConnectionManager:
         Args:
             client_id: 客户端 ID
         """
-        self.client_heartbeat[client_id] = time.time()
+        self._touch_heartbeat(client_id)
+
+    def _touch_heartbeat(self, client_id: str):
+        """记录心跳时间并登记新的超时截止时间"""
+        now = time.time()
+        self.client_heartbeat[client_id] = now
+        heapq.heappush(self._deadlines, (now + self.heartbeat_interval * 2, client_id))
 
     async def _cleanup_loop(self):
         """
-        定期清理超时连接
+        按最早的心跳截止时间休眠并清理超时连接
+
+        截止时间随心跳单调递增，堆顶即为下一次可能超时的时刻；
+        堆为空时循环退出，下一个连接建立时会重新启动。
         """
-        while True:
-            await asyncio.sleep(10)
+        while self._deadlines:
+            delay = self._deadlines[0][0] - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
             await self._cleanup_stale_connections()
 
     async def _cleanup_stale_connections(self):
@@ -248,32 +564,63 @@ class ConnectionManager:
         清理超时未发送心跳的连接
         """
         current_time = time.time()
+        timeout = self.heartbeat_interval * 2  # 60秒超时
         stale_clients = []
 
-        for client_id, last_ping in self.client_heartbeat.items():
-            if current_time - last_ping > self.heartbeat_interval * 2:  # 60秒超时
+        while self._deadlines and self._deadlines[0][0] <= current_time:
+            _, client_id = heapq.heappop(self._deadlines)
+            last_ping = self.client_heartbeat.get(client_id)
+            # 已断开或之后刷新过心跳的条目直接丢弃
+            if last_ping is not None and last_ping + timeout <= current_time:
                 stale_clients.append(client_id)
 
         for client_id in stale_clients:
             logger.warning(f"Client {client_id} heartbeat timeout, disconnecting")
             await self.disconnect(client_id)
 
+    def _invalidate_stats(self):
+        """连接或订阅变化后使统计缓存失效"""
+        self._stats_cache = None
+        self._stats_frame_cache = None
+
     def get_stats(self) -> dict:
         """
         获取连接统计信息
 
+        结果在连接或订阅发生变化前保持缓存，重复查询不再遍历订阅表。
+
         Returns:
             统计信息字典
         """
-        return {
-            "total_connections": len(self.active_connections),
-            "total_subscriptions": sum(len(s) for s in self.client_subscriptions.values()),
-            "tracked_stocks": len(self.stock_subscribers),
-            "subscribers_per_stock": {
+        if self._stats_cache is None:
+            subscribers_per_stock = {
                 stock: len(subscribers)
                 for stock, subscribers in self.stock_subscribers.items()
             }
-        }
+            self._stats_cache = {
+                "total_connections": len(self._handles),
+                "total_subscriptions": self._total_subscriptions,
+                "tracked_stocks": len(self.stock_subscribers),
+                "subscribers_per_stock": subscribers_per_stock,
+                "top_stocks": heapq.nlargest(
+                    10, subscribers_per_stock.items(), key=lambda item: item[1]
+                )
+            }
+        return self._stats_cache
+
+    def get_stats_frame(self) -> str:
+        """
+        获取序列化后的 stats 帧（与统计信息共用缓存失效时机）
+
+        Returns:
+            已序列化的 stats 消息
+        """
+        if self._stats_frame_cache is None:
+            self._stats_frame_cache = orjson.dumps({
+                "type": "stats",
+                "data": self.get_stats()
+            }).decode()
+        return self._stats_frame_cache
 
 
 # 全局连接管理器
@@ -304,6 +651,51 @@ class WebSocketMessage(BaseModel):
     stock_code: Optional[str] = None
 
 
+# 客户端帧：按 type 字段区分的标签联合，直接解码为类型化结构体
+
+class SubscribeFrame(msgspec.Struct, tag_field="type", tag="subscribe"):
+    """订阅帧"""
+    stocks: list[str] = []
+
+
+class UnsubscribeFrame(msgspec.Struct, tag_field="type", tag="unsubscribe"):
+    """取消订阅帧"""
+    stocks: list[str] = []
+
+
+class PingFrame(msgspec.Struct, tag_field="type", tag="ping"):
+    """心跳帧"""
+
+
+class ListFrame(msgspec.Struct, tag_field="type", tag="list"):
+    """订阅列表查询帧"""
+
+
+class StatsFrame(msgspec.Struct, tag_field="type", tag="stats"):
+    """统计信息查询帧"""
+
+
+ClientFrame = Union[SubscribeFrame, UnsubscribeFrame, PingFrame, ListFrame, StatsFrame]
+
+_FRAME_DECODER = msgspec.json.Decoder(ClientFrame)
+_FRAME_TYPES = frozenset({"subscribe", "unsubscribe", "ping", "list", "stats"})
+
+
+def _invalid_frame_error(data: Union[str, bytes], error: msgspec.ValidationError) -> str:
+    """为校验失败的帧生成错误帧（仅在错误路径上再次解析）"""
+    try:
+        msg_type = orjson.loads(data).get("type")
+    except Exception:
+        msg_type = None
+
+    if msg_type in _FRAME_TYPES:
+        return orjson.dumps({
+            "type": "error",
+            "message": f"Invalid {msg_type} message: {error}"
+        }).decode()
+    return _error_frame(f"Unknown message type: {msg_type}")
+
+
 # ============================================
 # WebSocket 端点
 # ============================================
@@ -316,6 +708,7 @@ async def websocket_quote(websocket: WebSocket):
     支持以下功能：
     - 连接建立后发送订阅消息订阅股票
     - 接收实时股票行情推送
+    - 订阅或查询订阅列表（list）时推送最新行情快照（multi 消息）
     - 心跳保活（ping/pong）
     - 取消订阅
 
@@ -327,19 +720,25 @@ async def websocket_quote(websocket: WebSocket):
     }
     ```
 
-    服务器消息格式：
+    服务器行情推送格式（合并窗口内的多条行情打包为一条 multi 消息，
+    客户端需遍历 items）：
     ```json
     {
-        "type": "quote",
-        "stock_code": "600000",
-        "data": {
-            "code": "600000",
-            "name": "浦发银行",
-            "price": 10.5,
-            "change": 0.1,
-            "change_percent": 0.96,
-            ...
-        }
+        "type": "multi",
+        "items": [
+            {
+                "type": "quote",
+                "stock_code": "600000",
+                "data": {
+                    "code": "600000",
+                    "name": "浦发银行",
+                    "price": 10.5,
+                    "change": 0.1,
+                    "change_percent": 0.96,
+                    ...
+                }
+            }
+        ]
     }
     ```
     """
@@ -351,60 +750,58 @@ async def websocket_quote(websocket: WebSocket):
 
         # 消息处理循环
         while True:
-            # 接收客户端消息
-            data = await websocket.receive_text()
+            # 接收客户端消息（文本帧或二进制帧）
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            data = received.get("bytes") or received.get("text") or ""
+
+            # 上限按字节计：文本帧按 UTF-8 编码长度比较（每字符至多 4 字节，短文本无需编码）
+            size = len(data)
+            if isinstance(data, str) and size * 4 > manager.max_message_size:
+                size = len(data.encode())
+            if size > manager.max_message_size:
+                await manager._send_raw(MESSAGE_TOO_LARGE_FRAME, client_id)
+                continue
 
             try:
-                message = json.loads(data)
-            except json.JSONDecodeError:
-                await manager._send_personal_message({
-                    "type": "error",
-                    "message": "Invalid JSON format"
-                }, client_id)
+                frame = _FRAME_DECODER.decode(data)
+            except msgspec.ValidationError as e:
+                await manager._send_raw(_invalid_frame_error(data, e), client_id)
+                continue
+            except msgspec.DecodeError:
+                await manager._send_raw(INVALID_JSON_FRAME, client_id)
                 continue
 
-            msg_type = message.get("type")
-
-            # 处理订阅请求
-            if msg_type == "subscribe":
-                stocks = message.get("stocks", [])
-                if stocks:
-                    await manager.subscribe(client_id, stocks)
-
-            # 处理取消订阅请求
-            elif msg_type == "unsubscribe":
-                stocks = message.get("stocks", [])
-                if stocks:
-                    await manager.unsubscribe(client_id, stocks)
-
-            # 处理心跳
-            elif msg_type == "ping":
-                await manager.handle_ping(client_id)
-                await manager._send_personal_message({
-                    "type": "pong",
-                    "timestamp": time.time()
-                }, client_id)
-
-            # 处理获取订阅列表请求
-            elif msg_type == "list":
-                subscriptions = list(manager.client_subscriptions.get(client_id, set()))
-                await manager._send_personal_message({
-                    "type": "subscription_list",
-                    "stocks": subscriptions
-                }, client_id)
-
-            # 处理获取统计信息请求
-            elif msg_type == "stats":
-                await manager._send_personal_message({
-                    "type": "stats",
-                    "data": manager.get_stats()
-                }, client_id)
-
-            else:
-                await manager._send_personal_message({
-                    "type": "error",
-                    "message": f"Unknown message type: {msg_type}"
-                }, client_id)
+            match frame:
+                # 处理订阅请求
+                case SubscribeFrame(stocks=stocks):
+                    if stocks:
+                        await manager.subscribe(client_id, stocks)
+                        await manager.send_snapshot(client_id, stocks)
+
+                # 处理取消订阅请求
+                case UnsubscribeFrame(stocks=stocks):
+                    if stocks:
+                        await manager.unsubscribe(client_id, stocks)
+
+                # 处理心跳
+                case PingFrame():
+                    await manager.handle_ping(client_id)
+                    await manager._send_raw(_pong_frame(), client_id)
+
+                # 处理获取订阅列表请求
+                case ListFrame():
+                    subscriptions = list(manager.client_subscriptions.get(client_id, set()))
+                    await manager._send_personal_message({
+                        "type": "subscription_list",
+                        "stocks": subscriptions
+                    }, client_id)
+                    await manager.send_snapshot(client_id, subscriptions)
+
+                # 处理获取统计信息请求
+                case StatsFrame():
+                    await manager._send_raw(manager.get_stats_frame(), client_id)
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: {client_id}")
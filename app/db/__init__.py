@@ -4,18 +4,20 @@
 导出数据库连接和会话管理功能。
 """
 from app.db.database import (
-    AsyncSessionLocal,
     DatabaseManager,
+    SharedPubSub,
     close_connections,
     create_engine,
     create_redis_client,
     get_db_manager,
     get_engine,
+    get_pubsub,
     get_redis,
     get_redis_async,
     get_session,
     init_connections,
     session_scope,
+    snapshot,
     test_database_connection,
     test_redis_connection,
 )
@@ -23,16 +25,27 @@ from app.db.database import (
 __all__ = [
     "AsyncSessionLocal",
     "DatabaseManager",
+    "SharedPubSub",
     "close_connections",
     "create_engine",
     "create_redis_client",
     "get_db_manager",
     "get_engine",
+    "get_pubsub",
     "get_redis",
     "get_redis_async",
     "get_session",
     "init_connections",
     "session_scope",
+    "snapshot",
     "test_database_connection",
     "test_redis_connection",
 ]
+
+
+def __getattr__(name: str):
+    # AsyncSessionLocal 延迟到首次访问时创建，避免导入时初始化数据库引擎
+    if name == "AsyncSessionLocal":
+        from app.db import database
+        return database.AsyncSessionLocal
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,24 +4,46 @@
 提供 PostgreSQL 和 Redis 连接管理，支持异步操作。
 """
 import asyncio
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Optional
+import time
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Union
 
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
+    async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 import redis.asyncio as redis
 
 from app.config import get_config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 # 全局引擎和连接池
 _engine: Optional[AsyncEngine] = None
 _redis_client: Optional[redis.Redis] = None
+_pubsub: Optional["SharedPubSub"] = None
+
+# 最新行情快照键前缀，键名为 snapshot:quote:<stock_code>，值为预序列化的行情 JSON；
+# 与 RedisCache 的 quote: 缓存键分开，避免互相覆盖或被 invalidate_cache("quote") 清除
+QUOTE_KEY_PREFIX = "snapshot:quote:"
+
+# 连接探测语句（预编译一次复用）
+SELECT1 = text("SELECT 1")
+
+# SQLAlchemy 编译缓存容量（默认 500）
+QUERY_CACHE_SIZE = 1200
+
+# 探测结果缓存时长（秒），避免健康检查风暴压垮数据库
+PROBE_TTL = 1.0
+_last_db_ok_at: float = 0.0
 
 
 def get_database_url() -> str:
@@ -49,8 +71,8 @@ def get_redis_url() -> str:
 def create_engine(
     database_url: Optional[str] = None,
     echo: bool = False,
-    pool_size: int = 5,
-    max_overflow: int = 10,
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
 ) -> AsyncEngine:
     """
     创建数据库引擎
@@ -58,8 +80,8 @@ def create_engine(
     Args:
         database_url: 数据库连接 URL，默认从配置获取
         echo: 是否打印 SQL 语句
-        pool_size: 连接池大小
-        max_overflow: 最大溢出连接数
+        pool_size: 连接池大小，默认读取配置 db_pool_size
+        max_overflow: 最大溢出连接数，默认读取配置 db_max_overflow
 
     Returns:
         SQLAlchemy 异步引擎
@@ -69,19 +91,38 @@ def create_engine(
         return _engine
 
     url = database_url or get_database_url()
+    backend = make_url(url).get_backend_name()
+    # 热点点查（jti、股票代码等）语句形状固定，放大编译缓存避免 LRU 淘汰后重复编译
+    engine_kwargs: Dict[str, Any] = {
+        "echo": echo,
+        "pool_pre_ping": True,
+        "query_cache_size": QUERY_CACHE_SIZE,
+    }
 
-    # 使用 NullPool 以便更好地控制连接生命周期
-    # 对于异步应用，使用 NullPool 并手动管理连接
-    _engine = create_async_engine(
-        url,
-        echo=echo,
-        poolclass=NullPool,
-        pool_pre_ping=True,
-        connect_args={
-            "server_settings": {"application_name": "stock_analyzer"},
-            "timeout": 30,
-        },
-    )
+    config = get_config()
+    if config.use_null_pool:
+        # 无服务器部署无法跨调用复用连接，保留 NullPool
+        engine_kwargs["poolclass"] = NullPool
+    elif backend != "sqlite":
+        # 默认 AsyncAdaptedQueuePool，复用连接以摊销 TCP/TLS 与握手开销
+        engine_kwargs.update(
+            pool_size=pool_size if pool_size is not None else config.db_pool_size,
+            max_overflow=max_overflow if max_overflow is not None else config.db_max_overflow,
+            pool_recycle=1800,
+        )
+
+    if backend == "postgresql":
+        # timeout 为 asyncpg 建立连接超时，command_timeout 为单条语句超时；
+        # OLTP 小查询关闭 JIT，避免 JIT 编译带来的启动延迟
+        engine_kwargs["connect_args"] = {
+            "server_settings": {"application_name": "stock_analyzer", "jit": "off"},
+            "timeout": config.db_connect_timeout,
+            "command_timeout": config.db_command_timeout,
+            "statement_cache_size": 1024,
+            "prepared_statement_cache_size": 256,
+        }
+
+    _engine = create_async_engine(url, **engine_kwargs)
 
     return _engine
 
@@ -101,11 +142,14 @@ def get_engine() -> AsyncEngine:
 
 async def create_redis_client(
     redis_url: Optional[str] = None,
-    decode_responses: bool = True,
+    decode_responses: bool = False,
 ) -> redis.Redis:
     """
     创建 Redis 客户端
 
+    使用显式大小的连接池并开启健康检查与 TCP keepalive。默认不解码响应，
+    预序列化的行情 JSON 以原始字节直接转发给 WebSocket。
+
     Args:
         redis_url: Redis 连接 URL，默认从配置获取
         decode_responses: 是否自动解码响应
@@ -119,12 +163,17 @@ async def create_redis_client(
 
     url = redis_url or get_redis_url()
 
-    _redis_client = redis.from_url(
+    pool = redis.ConnectionPool.from_url(
         url,
+        max_connections=get_config().redis_pool_max,
+        health_check_interval=30,
+        socket_keepalive=True,
         decode_responses=decode_responses,
         encoding="utf-8",
         encoding_errors="ignore",
     )
+    # from_pool 使客户端持有连接池，关闭客户端时一并断开池中连接
+    _redis_client = redis.Redis.from_pool(pool)
 
     return _redis_client
 
@@ -152,42 +201,146 @@ async def get_redis_async() -> redis.Redis:
     Returns:
         Redis 异步客户端
     """
-    global _redis_client
     if _redis_client is None:
-        await create_redis_client()
+        return await create_redis_client()
     return _redis_client
 
 
-# 异步会话工厂
-AsyncSessionLocal = sessionmaker(
-    bind=get_engine(),
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+async def snapshot(stocks: List[str]) -> List[Optional[Union[str, bytes]]]:
+    """
+    批量读取股票的最新行情快照（一次 MGET，只有一个往返）
+
+    Args:
+        stocks: 股票代码列表
+
+    Returns:
+        与 stocks 顺序一致的行情 JSON，无快照的股票为 None
+    """
+    if not stocks:
+        return []
+    client = await get_redis_async()
+    return await client.mget([QUOTE_KEY_PREFIX + code for code in stocks])
+
+
+class SharedPubSub:
+    """
+    共享的 Redis 订阅连接
+
+    整个进程只持有一个 pubsub 连接，由一个后台任务读取消息并交给
+    本地回调分发，避免每个订阅各自占用一个 Redis 连接。
+    """
+
+    def __init__(self, client: redis.Redis):
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._handler: Optional[Callable[[str, Any], None]] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    def set_handler(self, handler: Callable[[str, Any], None]) -> None:
+        """
+        设置消息回调
+
+        Args:
+            handler: 回调函数，参数为 (channel, data)
+        """
+        self._handler = handler
+
+    async def subscribe(self, *channels: str) -> None:
+        """
+        订阅频道，并在需要时启动读取任务
+
+        Args:
+            channels: 频道名称
+        """
+        if not channels:
+            return
+
+        await self._pubsub.subscribe(*channels)
+
+        if self._reader_task is None or self._reader_task.done():
+            self._reader_task = asyncio.create_task(self._reader_loop())
+
+    async def unsubscribe(self, *channels: str) -> None:
+        """
+        取消订阅频道
+
+        Args:
+            channels: 频道名称
+        """
+        if channels:
+            await self._pubsub.unsubscribe(*channels)
+
+    async def _reader_loop(self) -> None:
+        """读取订阅消息并分发，所有频道都取消订阅后自动退出"""
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message" or self._handler is None:
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            try:
+                self._handler(channel, message["data"])
+            except Exception as e:
+                logger.error(f"PubSub handler error on {message.get('channel')}: {e}")
+
+    async def close(self) -> None:
+        """停止读取任务并关闭订阅连接"""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reader_task
+            self._reader_task = None
+        await self._pubsub.close()
+
+
+async def get_pubsub() -> SharedPubSub:
+    """
+    获取共享的 Redis 订阅连接（单例，延迟创建）
+
+    Returns:
+        共享订阅连接
+    """
+    global _pubsub
+    if _pubsub is None:
+        _pubsub = SharedPubSub(await get_redis_async())
+    return _pubsub
+
+
+@lru_cache(maxsize=1)
+def _session_factory() -> async_sessionmaker[AsyncSession]:
+    """
+    获取异步会话工厂（首次使用时创建，导入模块时不初始化引擎）
+
+    Returns:
+        异步会话工厂
+    """
+    return async_sessionmaker(
+        get_engine(),
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+
+def __getattr__(name: str):
+    # 兼容旧的 AsyncSessionLocal 引用，访问时才创建会话工厂
+    if name == "AsyncSessionLocal":
+        return _session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
-    获取数据库会话的异步生成器
+    获取数据库会话（FastAPI 依赖，委托给 session_scope）
 
     Yields:
         异步数据库会话
 
     Example:
-        async with get_session() as session:
+        @router.get("/items")
+        async def list_items(session: AsyncSession = Depends(get_session)):
             result = await session.execute(...)
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-            await session.commit()
-        except Exception:
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+    async with session_scope() as session:
+        yield session
 
 
 @asynccontextmanager
@@ -202,15 +355,13 @@ async def session_scope() -> AsyncGenerator[AsyncSession, None]:
         async with session_scope() as session:
             result = await session.execute(...)
     """
-    async with AsyncSessionLocal() as session:
+    async with _session_factory()() as session:
         try:
             yield session
             await session.commit()
         except Exception:
             await session.rollback()
             raise
-        finally:
-            await session.close()
 
 
 async def test_database_connection() -> bool:
@@ -220,15 +371,20 @@ async def test_database_connection() -> bool:
     Returns:
         连接是否成功
     """
+    global _last_db_ok_at
+    if time.monotonic() - _last_db_ok_at < PROBE_TTL:
+        return True
+
     try:
         async with get_engine().connect() as conn:
-            await conn.execute(
-                "SELECT 1" if "sqlite" in get_database_url() else "SELECT 1"
-            )
-        return True
+            await conn.execute(SELECT1)
     except Exception:
+        _last_db_ok_at = 0.0
         return False
 
+    _last_db_ok_at = time.monotonic()
+    return True
+
 
 async def test_redis_connection() -> bool:
     """
@@ -249,11 +405,16 @@ async def close_connections() -> None:
     """
     关闭所有数据库连接
     """
-    global _engine, _redis_client
+    global _engine, _redis_client, _pubsub
+
+    if _pubsub is not None:
+        await _pubsub.close()
+        _pubsub = None
 
     if _engine is not None:
         await _engine.dispose()
         _engine = None
+        _session_factory.cache_clear()
 
     if _redis_client is not None:
         await _redis_client.close()
@@ -326,7 +487,7 @@ class DatabaseManager:
         if self.engine is not None:
             try:
                 async with self.engine.connect() as conn:
-                    await conn.execute("SELECT 1")
+                    await conn.execute(SELECT1)
                 results["database"] = True
             except Exception:
                 pass
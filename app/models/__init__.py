@@ -1,55 +1,57 @@
 """
 数据模型模块
 
-导出所有数据库模型。
+导出所有数据库模型。子模块在首次访问对应名称时才导入（PEP 562），
+只用到部分模型的进程无需加载全部表定义。
 """
-from app.models.stock import (
-    Base,
-    Stock,
-    StockQuote,
-    KLineData,
-    StockAnalysis,
-    MarketType,
-    MODELS as STOCK_MODELS,
-)
-from app.models.user import (
-    User,
-    APIKey,
-    UserSession,
-    UserRole,
-    USER_MODELS,
-)
-from app.models.portfolio import (
-    Portfolio,
-    Position,
-    Transaction,
-    PortfolioHistory,
-    PortfolioStatus,
-    PositionType,
-    TransactionType,
-    PORTFOLIO_MODELS,
-)
+import importlib
+from typing import Any, Dict, Tuple
+
+# 导出名称 -> (所在模块, 模块内属性名)
+_ATTR_MAP: Dict[str, Tuple[str, str]] = {
+    "Base": ("app.models.stock", "Base"),
+    "Stock": ("app.models.stock", "Stock"),
+    "StockQuote": ("app.models.stock", "StockQuote"),
+    "KLineData": ("app.models.stock", "KLineData"),
+    "StockAnalysis": ("app.models.stock", "StockAnalysis"),
+    "KLineIndicators": ("app.models.stock", "KLineIndicators"),
+    "MarketType": ("app.models.stock", "MarketType"),
+    "KLinePeriod": ("app.models.stock", "KLinePeriod"),
+    "StockAnalysisType": ("app.models.stock", "StockAnalysisType"),
+    "STOCK_MODELS": ("app.models.stock", "MODELS"),
+    "bulk_insert_quotes": ("app.models.stock", "bulk_insert_quotes"),
+    "bulk_insert_klines": ("app.models.stock", "bulk_insert_klines"),
+    "bulk_insert_kline_indicators": ("app.models.stock", "bulk_insert_kline_indicators"),
+    "User": ("app.models.user", "User"),
+    "APIKey": ("app.models.user", "APIKey"),
+    "UserSession": ("app.models.user", "UserSession"),
+    "UserRole": ("app.models.user", "UserRole"),
+    "USER_MODELS": ("app.models.user", "USER_MODELS"),
+    "Portfolio": ("app.models.portfolio", "Portfolio"),
+    "Position": ("app.models.portfolio", "Position"),
+    "Transaction": ("app.models.portfolio", "Transaction"),
+    "PortfolioHistory": ("app.models.portfolio", "PortfolioHistory"),
+    "PortfolioStatus": ("app.models.portfolio", "PortfolioStatus"),
+    "PositionType": ("app.models.portfolio", "PositionType"),
+    "TransactionType": ("app.models.portfolio", "TransactionType"),
+    "PORTFOLIO_MODELS": ("app.models.portfolio", "PORTFOLIO_MODELS"),
+}
 
 # 导出所有模型
-__all__ = [
-    "Base",
-    "Stock",
-    "StockQuote",
-    "KLineData",
-    "StockAnalysis",
-    "MarketType",
-    "User",
-    "APIKey",
-    "UserSession",
-    "UserRole",
-    "Portfolio",
-    "Position",
-    "Transaction",
-    "PortfolioHistory",
-    "PortfolioStatus",
-    "PositionType",
-    "TransactionType",
-    "STOCK_MODELS",
-    "USER_MODELS",
-    "PORTFOLIO_MODELS",
-]
+__all__ = list(_ATTR_MAP)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _ATTR_MAP[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(module_name), attr)
+    # 缓存到模块命名空间，后续访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
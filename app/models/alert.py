@@ -17,6 +17,8 @@ from sqlalchemy import (
     Integer,
     String,
     Text,
+    func,
+    text,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -59,8 +61,8 @@ class AlertRule(Base):
     # 预警名称
     name: Mapped[str] = mapped_column(String(100), nullable=False)
 
-    # 股票代码
-    stock_code: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
+    # 股票代码（由复合索引 ix_alert_rule_stock_status 的前导列覆盖）
+    stock_code: Mapped[str] = mapped_column(String(20), nullable=False)
 
     # 预警类型
     alert_type: Mapped[str] = mapped_column(String(30), nullable=False)
@@ -83,12 +85,12 @@ class AlertRule(Base):
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新时间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 关联关系
@@ -117,9 +119,9 @@ class AlertRecord(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 关联预警规则
+    # 关联预警规则（由复合索引 ix_alert_record_rule_triggered 的前导列覆盖）
     rule_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), nullable=False
     )
 
     # 触发时的股票价格
@@ -148,18 +150,25 @@ class AlertRecord(Base):
 
     # 触发时间
     triggered_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 处理时间
-    handled_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    handled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # 关联关系
-    rule: Mapped["AlertRule"] = relationship("AlertRule", back_populates="alerts")
+    # 禁止隐式懒加载：需要规则信息时由查询显式预加载，避免逐条 SELECT
+    rule: Mapped["AlertRule"] = relationship("AlertRule", back_populates="alerts", lazy="raise")
 
     # 复合索引
     __table_args__ = (
         Index("ix_alert_record_rule_triggered", "rule_id", "triggered_at"),
+        # 部分索引只含未读且未处理的记录，未读计数与未读列表不随历史记录增长
+        Index(
+            "ix_alert_record_unread",
+            "triggered_at",
+            postgresql_where=text("is_read = false AND is_handled = false"),
+        ),
     )
 
     def __repr__(self) -> str:
@@ -3,23 +3,30 @@
 
 定义投资组合、持仓、交易记录等数据库模型。
 """
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, Optional, Type
 
 from sqlalchemy import (
+    Computed,
+    Date,
     DateTime,
     Float,
     ForeignKey,
     Index,
     Integer,
+    SmallInteger,
     String,
     Text,
-    Enum as SQLEnum,
+    desc,
+    func,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.types import TypeDecorator
 
 from app.models.stock import Base
+# portfolios.user_id 外键引用 users 表，确保其已注册到同一 metadata
+from app.models import user as _user  # noqa: F401
 
 
 class PortfolioStatus(str, Enum):
@@ -47,6 +54,54 @@ class TransactionType(str, Enum):
     MERGE = "merge"  # 合股
 
 
+# 枚举 -> SMALLINT 编码（只可追加，不可修改已有编码）
+_STATUS_CODES: Dict[Enum, int] = {
+    PortfolioStatus.ACTIVE: 1,
+    PortfolioStatus.CLOSED: 2,
+    PortfolioStatus.ARCHIVED: 3,
+}
+
+_POSITION_TYPE_CODES: Dict[Enum, int] = {
+    PositionType.LONG: 1,
+    PositionType.SHORT: 2,
+}
+
+_TRANSACTION_TYPE_CODES: Dict[Enum, int] = {
+    TransactionType.BUY: 1,
+    TransactionType.SELL: 2,
+    TransactionType.DIVIDEND: 3,
+    TransactionType.SPLIT: 4,
+    TransactionType.MERGE: 5,
+}
+
+
+class SmallIntEnum(TypeDecorator):
+    """
+    以 SMALLINT 存储的枚举类型
+
+    写入时接受枚举成员或其字符串值，读取时返回枚举成员。
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_cls: Type[Enum], codes: Dict[Enum, int]):
+        super().__init__()
+        self.enum_cls = enum_cls
+        self._to_code = dict(codes)
+        self._to_enum = {code: member for member, code in codes.items()}
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[int]:
+        if value is None:
+            return None
+        return self._to_code[self.enum_cls(value)]
+
+    def process_result_value(self, value: Optional[int], dialect) -> Optional[Enum]:
+        if value is None:
+            return None
+        return self._to_enum[value]
+
+
 class Portfolio(Base):
     """
     投资组合模型
@@ -59,9 +114,9 @@ class Portfolio(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 用户ID
+    # 用户ID（由复合索引 ix_portfolio_user_status 的前导列覆盖）
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
     # 组合名称
@@ -78,7 +133,7 @@ class Portfolio(Base):
 
     # 状态
     status: Mapped[str] = mapped_column(
-        SQLEnum(PortfolioStatus),
+        SmallIntEnum(PortfolioStatus, _STATUS_CODES),
         nullable=False,
         default=PortfolioStatus.ACTIVE.value
     )
@@ -88,12 +143,12 @@ class Portfolio(Base):
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新时间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 关联关系
@@ -128,9 +183,9 @@ class Position(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 投资组合ID
+    # 投资组合ID（由复合唯一索引的前导列覆盖）
     portfolio_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False
     )
 
     # 股票代码
@@ -141,7 +196,7 @@ class Position(Base):
 
     # 持仓类型
     position_type: Mapped[str] = mapped_column(
-        SQLEnum(PositionType), nullable=False, default=PositionType.LONG.value
+        SmallIntEnum(PositionType, _POSITION_TYPE_CODES), nullable=False, default=PositionType.LONG.value
     )
 
     # 持仓数量
@@ -156,26 +211,39 @@ class Position(Base):
     # 持仓成本
     total_cost: Mapped[float] = mapped_column(Float, nullable=False)
 
+    # 以下为数据库生成列：行情更新只需写 current_price，其余由数据库计算
     # 当前市值
-    market_value: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    market_value: Mapped[Optional[float]] = mapped_column(
+        Float, Computed("quantity * current_price", persisted=True)
+    )
 
     # 持仓盈亏
-    profit_loss: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    profit_loss: Mapped[Optional[float]] = mapped_column(
+        Float, Computed("quantity * current_price - total_cost", persisted=True)
+    )
 
     # 盈亏比例
-    profit_loss_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    profit_loss_pct: Mapped[Optional[float]] = mapped_column(
+        Float,
+        Computed(
+            "CASE WHEN total_cost > 0 "
+            "THEN (quantity * current_price - total_cost) / total_cost * 100 "
+            "ELSE 0 END",
+            persisted=True,
+        ),
+    )
 
     # 备注
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新时间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 关联关系
@@ -186,6 +254,9 @@ class Position(Base):
         Index("ix_position_portfolio_stock", "portfolio_id", "stock_code", unique=True),
     )
 
+    # UPDATE 时通过 RETURNING 取回生成列，避免异步会话中的延迟加载
+    __mapper_args__ = {"eager_defaults": True}
+
     def __repr__(self) -> str:
         return f"<Position(id={self.id}, stock_code={self.stock_code}, quantity={self.quantity})>"
 
@@ -202,20 +273,20 @@ class Transaction(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 投资组合ID
+    # 投资组合ID（由 ix_tx_portfolio_date_cover 的前导列覆盖）
     portfolio_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False
     )
 
-    # 股票代码
-    stock_code: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
+    # 股票代码（由复合索引 ix_transaction_stock_date 的前导列覆盖）
+    stock_code: Mapped[str] = mapped_column(String(20), nullable=False)
 
     # 股票名称
     stock_name: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
     # 交易类型
     transaction_type: Mapped[str] = mapped_column(
-        SQLEnum(TransactionType), nullable=False
+        SmallIntEnum(TransactionType, _TRANSACTION_TYPE_CODES), nullable=False
     )
 
     # 交易数量
@@ -231,14 +302,14 @@ class Transaction(Base):
     commission: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
 
     # 交易日期
-    trade_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)
+    trade_date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
 
     # 备注
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
@@ -246,7 +317,13 @@ class Transaction(Base):
 
     # 复合索引
     __table_args__ = (
-        Index("ix_transaction_portfolio_date", "portfolio_id", "trade_date"),
+        # 覆盖索引：按组合倒序读取近期交易并聚合盈亏时可走 index-only scan
+        Index(
+            "ix_tx_portfolio_date_cover",
+            "portfolio_id",
+            desc("trade_date"),
+            postgresql_include=["transaction_type", "quantity", "price", "amount", "commission"],
+        ),
         Index("ix_transaction_stock_date", "stock_code", "trade_date"),
     )
 
@@ -266,9 +343,9 @@ class PortfolioHistory(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 投资组合ID
+    # 投资组合ID（由复合唯一索引的前导列覆盖）
     portfolio_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False
     )
 
     # 总资产
@@ -290,14 +367,14 @@ class PortfolioHistory(Base):
     profit_loss_pct: Mapped[float] = mapped_column(Float, nullable=False)
 
     # 记录日期
-    record_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)
+    record_date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
 
     # 备注
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
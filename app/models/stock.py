@@ -3,23 +3,132 @@
 
 定义股票、行情和K线数据的数据库模型。
 """
-from datetime import datetime
+import zlib
+from datetime import date, datetime
 from enum import Enum
-from typing import Optional
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Type
 
+import msgspec
 from sqlalchemy import (
     JSON,
+    BigInteger,
     Boolean,
+    CheckConstraint,
+    Date,
     DateTime,
+    Enum as SAEnum,
     Float,
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     String,
+    Table,
     Text,
+    TypeDecorator,
+    column as column_clause,
+    func,
+    insert,
+    select,
+    table as table_clause,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB, Insert as PGInsert, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+# 批量写入时每次 execute 的行数
+BULK_INSERT_BATCH_SIZE = 10_000
+
+# upsert 行数达到该值时改走 COPY 暂存表（仅 PostgreSQL + asyncpg）
+COPY_UPSERT_MIN_ROWS = 1000
+
+# VALUES 路径 upsert 每条语句的行数（另受 PostgreSQL 单语句 32767 个绑定参数限制）
+UPSERT_CHUNK = 5000
+PG_MAX_BIND_PARAMS = 32767
+
+# 大字段的延迟加载分组：列表查询不读取，详情查询用 undefer_group(HEAVY_GROUP) 一次取回
+HEAVY_GROUP = "heavy"
+
+# PostgreSQL 上使用 JSONB（二进制存储，支持 GIN 索引），其他数据库回退为 JSON
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+
+# 定点存储的放大倍数：价格保留 4 位小数，金额保留到分
+PRICE_SCALE = 10_000
+AMOUNT_SCALE = 100
+
+
+class FixedPoint(TypeDecorator):
+    """
+    以 BIGINT 存储的定点数（值 × scale 后取整）
+
+    Python 侧读写仍为 float；数据库中为精确整数，比较与排序不受浮点误差影响。
+    SUM/MIN/MAX 沿用列类型会自动还原；AVG 等改变类型的聚合需自行除以 scale。
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def __init__(self, scale: int = 1):
+        super().__init__()
+        self.scale = scale
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[int]:
+        if value is None:
+            return None
+        return round(value * self.scale)
+
+    def process_result_value(self, value: Optional[int], dialect) -> Optional[float]:
+        if value is None:
+            return None
+        return value / self.scale
+
+
+class PackedJSON(TypeDecorator):
+    """
+    以 MessagePack + zlib 压缩存储的 JSON 文档（BYTEA）
+
+    Python 侧读写仍为 dict/list；适合体积较大、只整体读写、不做库内 JSON 查询的字段。
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    # 压缩级别：LLM 输出重复键多，较低级别即可取得大部分收益
+    COMPRESS_LEVEL = 3
+
+    _encoder = msgspec.msgpack.Encoder()
+    _decoder = msgspec.msgpack.Decoder()
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return zlib.compress(self._encoder.encode(value), self.COMPRESS_LEVEL)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Any:
+        if value is None:
+            return None
+        return self._decoder.decode(zlib.decompress(value))
+
+
+def pg_enum(enum_cls: Type[Enum], name: str) -> SAEnum:
+    """
+    以 PostgreSQL 原生 ENUM 存储的字符串枚举列类型
+
+    数据库中存储枚举值（而非成员名），读写两侧均为普通字符串；
+    其他方言退化为 VARCHAR。
+
+    Args:
+        enum_cls: 字符串枚举类
+        name: 数据库枚举类型名
+
+    Returns:
+        SQLAlchemy Enum 类型
+    """
+    return SAEnum(*(member.value for member in enum_cls), name=name, native_enum=True)
+
 
 class Base(DeclarativeBase):
     """数据库模型基类"""
@@ -37,6 +146,27 @@ class MarketType(str, Enum):
     US = "US"  # 美股
 
 
+class KLinePeriod(str, Enum):
+    """K线周期枚举"""
+
+    DAY = "1d"
+    WEEK = "1w"
+    MONTH = "1m"
+    MIN_5 = "5m"
+    MIN_15 = "15m"
+    MIN_30 = "30m"
+    MIN_60 = "60m"
+
+
+class StockAnalysisType(str, Enum):
+    """股票分析记录类型枚举"""
+
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    CUSTOM = "custom"
+
+
 class Stock(Base):
     """
     股票基本信息模型
@@ -56,7 +186,9 @@ class Stock(Base):
     name: Mapped[str] = mapped_column(String(100), nullable=False)
 
     # 市场类型
-    market: Mapped[str] = mapped_column(String(10), nullable=False, default=MarketType.SZ.value)
+    market: Mapped[str] = mapped_column(
+        pg_enum(MarketType, "market_type"), nullable=False, default=MarketType.SZ.value
+    )
 
     # 交易所代码
     exchange: Mapped[str] = mapped_column(String(10), nullable=False)
@@ -80,19 +212,23 @@ class Stock(Base):
     sector: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
     # 备注
-    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    notes: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 元数据 (JSON格式，存储其他信息)
-    extra_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    extra_data: Mapped[Optional[dict]] = mapped_column(
+        JSONType, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新时间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 关联关系
@@ -103,6 +239,12 @@ class Stock(Base):
         "KLineData", back_populates="stock", cascade="all, delete-orphan"
     )
 
+    # 复合索引
+    __table_args__ = (
+        # 在市股票按代码分页（WHERE is_listed ORDER BY code）只扫描在市子集
+        Index("ix_stock_code_listed", "code", postgresql_where=text("is_listed = true")),
+    )
+
     def __repr__(self) -> str:
         return f"<Stock(code={self.code}, name={self.name}, market={self.market})>"
 
@@ -119,37 +261,37 @@ class StockQuote(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 关联股票
+    # 关联股票（由复合唯一索引的前导列覆盖）
     stock_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False
     )
 
-    # 交易日期
-    trade_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)
+    # 交易日期（DATE 4 字节，范围查询按日期比较而非字符串字典序）
+    trade_date: Mapped[date] = mapped_column(Date, nullable=False)
 
     # 开盘价
-    open: Mapped[float] = mapped_column(Float, nullable=False)
+    open: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 最高价
-    high: Mapped[float] = mapped_column(Float, nullable=False)
+    high: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 最低价
-    low: Mapped[float] = mapped_column(Float, nullable=False)
+    low: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 收盘价
-    close: Mapped[float] = mapped_column(Float, nullable=False)
+    close: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 成交量
-    volume: Mapped[float] = mapped_column(Float, nullable=False)
+    volume: Mapped[float] = mapped_column(FixedPoint(), nullable=False)
 
     # 成交额
-    amount: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    amount: Mapped[Optional[float]] = mapped_column(FixedPoint(AMOUNT_SCALE), nullable=True)
 
     # 涨跌幅
     change_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # 涨跌额
-    change: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    change: Mapped[Optional[float]] = mapped_column(FixedPoint(PRICE_SCALE), nullable=True)
 
     # 换手率
     turnover_rate: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
@@ -167,11 +309,13 @@ class StockQuote(Base):
     float_market_cap: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # 备注
-    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    notes: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
@@ -179,7 +323,20 @@ class StockQuote(Base):
 
     # 复合索引
     __table_args__ = (
-        Index("ix_stock_quote_stock_date", "stock_id", "trade_date", unique=True),
+        # 唯一索引同时作为覆盖索引：stock_id = ? ORDER BY trade_date DESC LIMIT N
+        # 反向扫描即可，INCLUDE 的 OHLCV 列使最新 N 条行情走 index-only scan
+        Index(
+            "ix_stock_quote_stock_date",
+            "stock_id",
+            "trade_date",
+            unique=True,
+            postgresql_include=["open", "high", "low", "close", "volume"],
+        ),
+        # 价格与成交量的取值约束
+        CheckConstraint("low >= 0 AND high >= low", name="ck_quote_price_range"),
+        CheckConstraint("volume >= 0", name="ck_quote_volume_nonneg"),
+        # 追加写入的时序表按交易日期基本有序，BRIN 以极小体积支持全市场日期范围扫描
+        Index("ix_quote_trade_date_brin", "trade_date", postgresql_using="brin"),
     )
 
     def __repr__(self) -> str:
@@ -198,40 +355,42 @@ class KLineData(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 关联股票
+    # 关联股票（由复合唯一索引的前导列覆盖）
     stock_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False
     )
 
-    # K线周期 (1d, 1w, 1m, 5m, 15m, 30m, 60m等)
-    period: Mapped[str] = mapped_column(String(10), nullable=False, default="1d")
+    # K线周期 (1d, 1w, 1m, 5m, 15m, 30m, 60m)
+    period: Mapped[str] = mapped_column(
+        pg_enum(KLinePeriod, "kline_period"), nullable=False, default=KLinePeriod.DAY.value
+    )
 
-    # 交易日期
-    trade_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)
+    # 交易日期（DATE 4 字节，范围查询按日期比较而非字符串字典序）
+    trade_date: Mapped[date] = mapped_column(Date, nullable=False)
 
     # 开盘价
-    open: Mapped[float] = mapped_column(Float, nullable=False)
+    open: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 最高价
-    high: Mapped[float] = mapped_column(Float, nullable=False)
+    high: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 最低价
-    low: Mapped[float] = mapped_column(Float, nullable=False)
+    low: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 收盘价
-    close: Mapped[float] = mapped_column(Float, nullable=False)
+    close: Mapped[float] = mapped_column(FixedPoint(PRICE_SCALE), nullable=False)
 
     # 成交量
-    volume: Mapped[float] = mapped_column(Float, nullable=False)
+    volume: Mapped[float] = mapped_column(FixedPoint(), nullable=False)
 
     # 成交额
-    amount: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    amount: Mapped[Optional[float]] = mapped_column(FixedPoint(AMOUNT_SCALE), nullable=True)
 
     # 涨跌幅
     change_pct: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # 涨跌额
-    change: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    change: Mapped[Optional[float]] = mapped_column(FixedPoint(PRICE_SCALE), nullable=True)
 
     # 换手率
     turnover_rate: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
@@ -240,14 +399,16 @@ class KLineData(Base):
     amplitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # 前收 (前一交易日收盘价)
-    pre_close: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    pre_close: Mapped[Optional[float]] = mapped_column(FixedPoint(PRICE_SCALE), nullable=True)
 
     # 备注
-    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    notes: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
@@ -255,8 +416,21 @@ class KLineData(Base):
 
     # 复合索引
     __table_args__ = (
-        Index("ix_kline_stock_period_date", "stock_id", "period", "trade_date", unique=True),
+        # 唯一索引同时作为覆盖索引，最新 N 根K线走 index-only 反向扫描
+        Index(
+            "ix_kline_stock_period_date",
+            "stock_id",
+            "period",
+            "trade_date",
+            unique=True,
+            postgresql_include=["open", "high", "low", "close", "volume", "amount"],
+        ),
         Index("ix_kline_period_date", "period", "trade_date"),
+        # 价格与成交量的取值约束
+        CheckConstraint("low >= 0 AND high >= low", name="ck_kline_price_range"),
+        CheckConstraint("volume >= 0", name="ck_kline_volume_nonneg"),
+        # 全市场按日期范围扫描
+        Index("ix_kline_trade_date_brin", "trade_date", postgresql_using="brin"),
     )
 
     def __repr__(self) -> str:
@@ -275,19 +449,25 @@ class StockAnalysis(Base):
     # 主键
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    # 关联股票
+    # 关联股票（由复合唯一索引的前导列覆盖）
     stock_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False, index=True
+        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False
     )
 
     # 分析类型 (daily, weekly, monthly, custom)
-    analysis_type: Mapped[str] = mapped_column(String(20), nullable=False, default="daily")
+    analysis_type: Mapped[str] = mapped_column(
+        pg_enum(StockAnalysisType, "stock_analysis_type"),
+        nullable=False,
+        default=StockAnalysisType.DAILY.value,
+    )
 
     # 分析日期
-    analysis_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)
+    analysis_date: Mapped[date] = mapped_column(Date, nullable=False)
 
-    # 分析内容 (JSON格式)
-    content: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # 分析内容（MessagePack 压缩存储于 content_packed 列，属性名保持 content）
+    content: Mapped[dict] = mapped_column(
+        "content_packed", PackedJSON, nullable=False, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 分析摘要
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -296,29 +476,308 @@ class StockAnalysis(Base):
     confidence: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # 标签 (如: 看好, 看空, 观望)
-    tags: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    tags: Mapped[Optional[list]] = mapped_column(
+        JSONType, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 备注
-    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    notes: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, deferred=True, deferred_group=HEAVY_GROUP
+    )
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 复合索引
     __table_args__ = (
         Index("ix_stock_analysis_stock_type_date", "stock_id", "analysis_type", "analysis_date", unique=True),
+        # 跨股票按类型筛选并按日期范围查询
+        Index("ix_stock_analysis_type_date", "analysis_type", "analysis_date"),
+        # 标签包含查询（tags @> '["看好"]'）走 GIN 索引
+        Index(
+            "ix_stock_analysis_tags_gin",
+            "tags",
+            postgresql_using="gin",
+            postgresql_ops={"tags": "jsonb_path_ops"},
+        ),
+        CheckConstraint("confidence BETWEEN 0 AND 1", name="ck_analysis_confidence"),
     )
 
     def __repr__(self) -> str:
         return f"<StockAnalysis(stock_id={self.stock_id}, type={self.analysis_type}, date={self.analysis_date})>"
 
 
+class KLineIndicators(Base):
+    """
+    K线指标预计算模型
+
+    按 (股票, 周期, 交易日) 存储常用指标，分析与回测直接读取，不再逐次重算。
+    """
+
+    __tablename__ = "kline_indicators"
+
+    # 主键
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    # 关联股票（由复合唯一索引的前导列覆盖）
+    stock_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("stocks.id", ondelete="CASCADE"), nullable=False
+    )
+
+    # K线周期
+    period: Mapped[str] = mapped_column(
+        pg_enum(KLinePeriod, "kline_period"), nullable=False, default=KLinePeriod.DAY.value
+    )
+
+    # 交易日期
+    trade_date: Mapped[date] = mapped_column(Date, nullable=False)
+
+    # 指数移动平均
+    ema_12: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    ema_26: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # MACD (DIF = EMA12 - EMA26)
+    macd: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # RSI-14
+    rsi_14: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # ATR-14
+    atr_14: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # 布林带上轨 (20, 2)
+    bb_upper_20: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # 简单移动平均
+    ma_50: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    ma_200: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # 复合索引
+    __table_args__ = (
+        Index("ix_kline_indicators_stock_period_date", "stock_id", "period", "trade_date", unique=True),
+    )
+
+    def __repr__(self) -> str:
+        return f"<KLineIndicators(stock_id={self.stock_id}, period={self.period}, date={self.trade_date})>"
+
+
 # 模型列表，用于创建表
-MODELS = [Stock, StockQuote, KLineData, StockAnalysis]
+MODELS = [Stock, StockQuote, KLineData, StockAnalysis, KLineIndicators]
+
+
+async def _bulk_insert(
+    session: AsyncSession,
+    table: Table,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int,
+) -> int:
+    """
+    以 Core executemany 分批插入（触发 insertmanyvalues，不经过 ORM 工作单元）
+
+    Args:
+        session: 数据库会话
+        table: 目标表
+        rows: 行数据（列名 -> 值）
+        batch_size: 每批行数
+
+    Returns:
+        插入的行数
+    """
+    stmt = insert(table)
+    iterator = iter(rows)
+    total = 0
+    while batch := list(islice(iterator, batch_size)):
+        await session.execute(stmt, batch)
+        total += len(batch)
+    return total
+
+
+async def bulk_insert_quotes(
+    session: AsyncSession,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = BULK_INSERT_BATCH_SIZE,
+) -> int:
+    """
+    批量插入行情数据（历史回填使用，不提交事务）
+
+    Args:
+        session: 数据库会话
+        rows: 行情数据，键为 stock_quotes 列名
+        batch_size: 每批行数
+
+    Returns:
+        插入的行数
+    """
+    return await _bulk_insert(session, StockQuote.__table__, rows, batch_size)
+
+
+async def bulk_insert_klines(
+    session: AsyncSession,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = BULK_INSERT_BATCH_SIZE,
+) -> int:
+    """
+    批量插入K线数据（历史回填使用，不提交事务）
+
+    Args:
+        session: 数据库会话
+        rows: K线数据，键为 kline_data 列名
+        batch_size: 每批行数
+
+    Returns:
+        插入的行数
+    """
+    return await _bulk_insert(session, KLineData.__table__, rows, batch_size)
+
+
+async def bulk_insert_kline_indicators(
+    session: AsyncSession,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = BULK_INSERT_BATCH_SIZE,
+) -> int:
+    """
+    批量插入K线指标（不提交事务）
+
+    Args:
+        session: 数据库会话
+        rows: 指标数据，键为 kline_indicators 列名
+        batch_size: 每批行数
+
+    Returns:
+        插入的行数
+    """
+    return await _bulk_insert(session, KLineIndicators.__table__, rows, batch_size)
+
+
+def _copy_records(table: Table, columns: List[str], rows: Iterable[Dict[str, Any]], dialect) -> Iterator[tuple]:
+    """
+    按列类型的绑定处理器逐行转换，生成可直接 COPY 的元组（不整体物化）
+
+    COPY 绕过 SQLAlchemy 的参数处理，FixedPoint 缩放、JSON 序列化等需在此显式完成。
+
+    Args:
+        table: 目标表
+        columns: 列名顺序
+        rows: 行数据（列名 -> 值）
+        dialect: 数据库方言
+
+    Returns:
+        与 columns 顺序一致的元组迭代器
+    """
+    processors = [table.c[name].type.dialect_impl(dialect).bind_processor(dialect) for name in columns]
+    return (
+        tuple(
+            value if proc is None or value is None else proc(value)
+            for proc, value in zip(processors, (row[name] for name in columns))
+        )
+        for row in rows
+    )
+
+
+def _stage_ddl(table: Table, stage: str, columns: List[str]) -> str:
+    """
+    生成 COPY 暂存表的建表语句
+
+    Args:
+        table: 目标表
+        stage: 暂存表名
+        columns: 写入的列名
+
+    Returns:
+        CREATE TEMP TABLE ... AS SELECT ... WITH NO DATA 语句
+    """
+    return (
+        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+        f"SELECT {', '.join(columns)} FROM {table.name} WITH NO DATA"
+    )
+
+
+async def _copy_upsert(
+    session: AsyncSession,
+    table: Table,
+    columns: List[str],
+    rows: Iterable[Dict[str, Any]],
+    on_conflict: Callable[[PGInsert], PGInsert],
+) -> None:
+    """
+    COPY 到临时暂存表后以 INSERT ... SELECT ... ON CONFLICT 合并到目标表
+
+    Args:
+        session: 数据库会话
+        table: 目标表
+        columns: 写入的列名
+        rows: 行数据迭代器，由 asyncpg 边转换边发送
+        on_conflict: 为 INSERT 语句附加 ON CONFLICT 子句的函数
+    """
+    stage = f"_stage_{table.name}"
+    dialect = session.get_bind().dialect
+
+    # 只取写入列建表（列类型随目标表，FixedPoint 列即为 BIGINT），不带 id 等默认值，
+    # 避免 COPY 每行消耗目标表序列；显式 DROP 以便同一事务内重复调用
+    await session.execute(text(_stage_ddl(table, stage, columns)))
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        stage, records=_copy_records(table, columns, rows, dialect), columns=columns
+    )
+
+    staging = table_clause(stage, *(column_clause(name) for name in columns))
+    await session.execute(on_conflict(pg_insert(table).from_select(columns, select(*staging.c))))
+    await session.execute(text(f"DROP TABLE {stage}"))
+
+
+async def upsert_rows(
+    session: AsyncSession,
+    table: Table,
+    rows: Iterable[Dict[str, Any]],
+    on_conflict: Callable[[PGInsert], PGInsert],
+    row_count: Optional[int] = None,
+) -> int:
+    """
+    批量 upsert（不提交事务）
+
+    行数达到 COPY_UPSERT_MIN_ROWS 且连接为 asyncpg 时走 COPY 暂存表，
+    避免多行 VALUES 的参数绑定开销；否则按 UPSERT_CHUNK 分块生成
+    INSERT ... VALUES ... ON CONFLICT，各块在调用方的同一事务内执行。
+    rows 可为生成器，两条路径都按需消费，不会整体物化。
+
+    Args:
+        session: 数据库会话
+        table: 目标表
+        rows: 行数据，各行键一致
+        on_conflict: 为 INSERT 语句附加 ON CONFLICT 子句的函数
+        row_count: 行数，rows 为生成器时由调用方给出，用于选择写入路径
+
+    Returns:
+        写入的行数
+    """
+    if row_count is None:
+        rows = rows if isinstance(rows, list) else list(rows)
+        row_count = len(rows)
+
+    iterator = iter(rows)
+    first = next(iterator, None)
+    if first is None:
+        return 0
+    columns = list(first)
+    iterator = chain((first,), iterator)
+
+    if row_count >= COPY_UPSERT_MIN_ROWS:
+        dialect = session.get_bind().dialect
+        if dialect.name == "postgresql" and dialect.driver == "asyncpg":
+            await _copy_upsert(session, table, columns, iterator, on_conflict)
+            return row_count
+
+    chunk_size = max(1, min(UPSERT_CHUNK, PG_MAX_BIND_PARAMS // len(columns)))
+    total = 0
+    while chunk := list(islice(iterator, chunk_size)):
+        await session.execute(on_conflict(pg_insert(table).values(chunk)))
+        total += len(chunk)
+    return total
@@ -9,16 +9,20 @@ from typing import Optional
 
 from sqlalchemy import (
     Boolean,
+    CheckConstraint,
     DateTime,
     ForeignKey,
     Integer,
+    LargeBinary,
     String,
     Text,
     Index,
+    func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from app.models.stock import Base
+from app.models.stock import Base, pg_enum
 
 
 class UserRole(str, Enum):
@@ -55,7 +59,9 @@ class User(Base):
     display_name: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
     # 用户角色
-    role: Mapped[str] = mapped_column(String(20), nullable=False, default=UserRole.BASIC.value)
+    role: Mapped[str] = mapped_column(
+        pg_enum(UserRole, "user_role"), nullable=False, default=UserRole.BASIC.value
+    )
 
     # 是否激活
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
@@ -73,19 +79,19 @@ class User(Base):
     api_used: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
     # 最后登录时间
-    last_login_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_login_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # 备注
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 更新时间
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # 关联关系
@@ -99,6 +105,7 @@ class User(Base):
     # 复合索引
     __table_args__ = (
         Index("ix_user_role", "role"),
+        CheckConstraint("api_quota >= 0 AND api_used >= 0", name="ck_user_quota_nonneg"),
     )
 
     def __repr__(self) -> str:
@@ -125,8 +132,8 @@ class APIKey(Base):
     # 密钥名称
     name: Mapped[str] = mapped_column(String(100), nullable=False)
 
-    # API 密钥 (哈希存储)
-    key_hash: Mapped[str] = mapped_column(String(255), nullable=False, unique=True, index=True)
+    # API 密钥 (32 字节 SHA-256 原始摘要，仅在启用子集上建唯一索引)
+    key_hash: Mapped[bytes] = mapped_column(LargeBinary(32), nullable=False)
 
     # 密钥前缀 (用于显示)
     key_prefix: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -135,19 +142,24 @@ class APIKey(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
 
     # 最后使用时间
-    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # 过期时间
-    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
     user: Mapped["User"] = relationship("User", back_populates="api_keys")
 
+    # 部分索引：校验时只扫描启用的密钥，停用的密钥不再占用索引
+    __table_args__ = (
+        Index("ix_apikey_hash_active", "key_hash", unique=True, postgresql_where=text("is_active = true")),
+    )
+
     def __repr__(self) -> str:
         return f"<APIKey(id={self.id}, name={self.name}, user_id={self.user_id})>"
 
@@ -169,8 +181,8 @@ class UserSession(Base):
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
 
-    # 会话令牌 (JWT ID)
-    jti: Mapped[str] = mapped_column(String(255), nullable=False, unique=True, index=True)
+    # 会话令牌 (JWT ID，仅在有效会话上建唯一索引)
+    jti: Mapped[str] = mapped_column(String(255), nullable=False)
 
     # 设备信息
     device_info: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
@@ -182,16 +194,23 @@ class UserSession(Base):
     is_valid: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
 
     # 过期时间
-    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
 
     # 创建时间
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
     # 关联关系
     user: Mapped["User"] = relationship("User", back_populates="sessions")
 
+    # 部分索引：失效与过期会话累积后索引大小仍只与有效会话数相关
+    __table_args__ = (
+        Index("ix_session_jti_valid", "jti", unique=True, postgresql_where=text("is_valid = true")),
+        # 清理任务按过期时间范围删除
+        Index("ix_session_expires", "expires_at"),
+    )
+
     def __repr__(self) -> str:
         return f"<UserSession(id={self.id}, user_id={self.user_id}, jti={self.jti})>"
 
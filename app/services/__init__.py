@@ -4,54 +4,54 @@
 提供各种业务服务：
 - 股票数据服务
 - LLM 服务
+
+子模块在首次访问对应名称时才导入（PEP 562），只用到股票数据的进程
+无需加载 anthropic / openai 等 LLM SDK。
 """
+import importlib
+from typing import Any, Dict, Tuple
+
+_STOCK = "app.services.stock_service"
+_LLM = "app.services.llm_service"
 
-from app.services.stock_service import (
-    StockService,
-    StockCache,
-    get_stock_service,
-    get_cache,
-    clear_cache,
-)
-
-from app.services.llm_service import (
-    # 数据类
-    Message,
-    LLMResponse,
-    StreamChunk,
-    # 枚举
-    LLMProviderType,
-    # 提供者
-    LLMProvider,
-    AnthropicProvider,
-    OpenAIProvider,
-    # 对话管理
-    ConversationManager,
-    # 工厂函数
-    get_default_provider,
-    get_conversation_manager,
-    create_provider,
-    reset_default_provider,
-)
-
-__all__ = [
+# 导出名称 -> (所在模块, 模块内属性名)
+_ATTR_MAP: Dict[str, Tuple[str, str]] = {
     # Stock Service
-    "StockService",
-    "StockCache",
-    "get_stock_service",
-    "get_cache",
-    "clear_cache",
+    "StockService": (_STOCK, "StockService"),
+    "StockCache": (_STOCK, "StockCache"),
+    "BarBuffer": (_STOCK, "BarBuffer"),
+    "get_stock_service": (_STOCK, "get_stock_service"),
+    "get_cache": (_STOCK, "get_cache"),
+    "clear_cache": (_STOCK, "clear_cache"),
     # LLM Service
-    "Message",
-    "LLMResponse",
-    "StreamChunk",
-    "LLMProviderType",
-    "LLMProvider",
-    "AnthropicProvider",
-    "OpenAIProvider",
-    "ConversationManager",
-    "get_default_provider",
-    "get_conversation_manager",
-    "create_provider",
-    "reset_default_provider",
-]
+    "Message": (_LLM, "Message"),
+    "LLMResponse": (_LLM, "LLMResponse"),
+    "StreamChunk": (_LLM, "StreamChunk"),
+    "LLMProviderType": (_LLM, "LLMProviderType"),
+    "LLMProvider": (_LLM, "LLMProvider"),
+    "AnthropicProvider": (_LLM, "AnthropicProvider"),
+    "OpenAIProvider": (_LLM, "OpenAIProvider"),
+    "ConversationManager": (_LLM, "ConversationManager"),
+    "get_default_provider": (_LLM, "get_default_provider"),
+    "get_conversation_manager": (_LLM, "get_conversation_manager"),
+    "create_provider": (_LLM, "create_provider"),
+    "reset_default_provider": (_LLM, "reset_default_provider"),
+}
+
+__all__ = list(_ATTR_MAP)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _ATTR_MAP[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(module_name), attr)
+    # 缓存到模块命名空间，后续访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
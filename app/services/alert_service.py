@@ -8,40 +8,257 @@
 - 预警通知推送
 """
 import asyncio
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Callable
+import time
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, NamedTuple, Tuple
 
-from sqlalchemy import select, and_, or_, func
+import numpy as np
+from sqlalchemy import bindparam, select, insert, update, delete, and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, selectinload
 
+from app.config import get_config
 from app.db.database import get_engine
 from app.models.alert import AlertRule, AlertRecord, AlertType, AlertStatus
-from app.services.stock_service import get_stock_service
+from app.services.stock_service import StockCache, get_stock_service
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 预警检查内的数据缓存时间（秒）：同一轮及相邻几轮检查共用行情与K线
+QUOTE_CACHE_TTL = 5
+KLINE_CACHE_TTL = 60
+
+# 通知合并窗口（秒）：窗口内触发的预警合并为一批分发给回调
+NOTIFY_LATENCY = 0.2
+
+# 未读预警数量的缓存时间（秒），预警记录变更时立即失效
+UNREAD_COUNT_TTL = 1.0
+
+
+class Quote(NamedTuple):
+    """预警判断所需的行情字段（获取时转换一次，判断时按属性读取）"""
+
+    price: float
+    change_percent: float
+    volume: float
+    amount: float
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Quote":
+        """从股票服务返回的行情字典构造，缺失或空值记为 0"""
+        return cls(*(float(data.get(field) or 0) for field in cls._fields))
+
+
+# 批量写入预警记录时由 _evaluate 填充的列
+ALERT_RECORD_INSERT_COLUMNS = ("rule_id", "trigger_price", "trigger_change_pct", "trigger_volume", "message")
+
+# 固定形状的查询语句在模块加载时构造一次，调用时只传绑定参数
+_STMT_RULE_BY_ID = select(AlertRule).where(AlertRule.id == bindparam("rule_id"))
+_STMT_ACTIVE_RULES = select(AlertRule).where(AlertRule.status == AlertStatus.ACTIVE.value)
+# COUNT(*) 配合部分索引 ix_alert_record_unread 可走 index-only scan
+_STMT_UNREAD_COUNT = select(func.count()).select_from(AlertRecord).where(
+    and_(
+        AlertRecord.is_read == False,
+        AlertRecord.is_handled == False,
+    )
+)
+
+# 需要历史K线才能判断的预警类型（AlertType 为 str 枚举，可直接用规则中的字符串判断）
+KLINE_ALERT_TYPES = frozenset({AlertType.VOLUME_SPIKE, AlertType.TURNOVER_SPIKE})
+
+# 编译后的预警判断函数：(股票代码, 价格, 涨跌幅, 成交量, 近期K线数组) -> 触发消息，未触发返回 None
+# 阈值在编译时取出并绑定到闭包中，判断时不再查阈值字典
+AlertPredicate = Callable[[str, float, float, float, Optional[Dict[str, np.ndarray]]], Optional[str]]
+
+
+def _compile_price_above(th: Dict[str, Any]) -> AlertPredicate:
+    """价格高于目标价"""
+    target_price = th.get("price", 0)
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        if price >= target_price:
+            return f"股票 {code} 当前价格 {price:.2f} 超过目标价格 {target_price:.2f}"
+        return None
+
+    return predicate
+
+
+def _compile_price_below(th: Dict[str, Any]) -> AlertPredicate:
+    """价格低于目标价"""
+    target_price = th.get("price", 0)
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        if price <= target_price:
+            return f"股票 {code} 当前价格 {price:.2f} 低于目标价格 {target_price:.2f}"
+        return None
+
+    return predicate
+
+
+def _compile_change_up(th: Dict[str, Any]) -> AlertPredicate:
+    """涨幅高于目标涨幅"""
+    target_change = th.get("change_percent", 0)
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        if change_pct >= target_change:
+            return f"股票 {code} 涨幅 {change_pct:.2f}% 超过目标涨幅 {target_change:.2f}%"
+        return None
+
+    return predicate
+
+
+def _compile_change_down(th: Dict[str, Any]) -> AlertPredicate:
+    """跌幅高于目标跌幅"""
+    target_change = th.get("change_percent", 0)
+    lower_bound = -target_change
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        if change_pct <= lower_bound:
+            return f"股票 {code} 跌幅 {abs(change_pct):.2f}% 超过目标跌幅 {target_change:.2f}%"
+        return None
+
+    return predicate
+
+
+def _compile_volume_spike(th: Dict[str, Any]) -> AlertPredicate:
+    """成交量超过近期均量的指定倍数"""
+    threshold_ratio = th.get("volume_ratio", 2.0)
+    threshold_days = th.get("days", 5)
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        # 计算近期平均成交量
+        recent_volumes = kline_data["volume"][:threshold_days]
+        if not recent_volumes.size:
+            return None
+        avg_volume = float(recent_volumes.mean())
+        if avg_volume > 0 and volume >= avg_volume * threshold_ratio:
+            return f"股票 {code} 成交量 {volume:.0f} 超过近 {threshold_days} 日平均 {avg_volume:.0f} 的 {threshold_ratio:.1f} 倍"
+        return None
+
+    return predicate
+
+
+def _compile_turnover_spike(th: Dict[str, Any]) -> AlertPredicate:
+    """最新换手率超过近期平均换手率的指定倍数"""
+    threshold_ratio = th.get("turnover_ratio", 1.5)
+    threshold_days = th.get("days", 5)
+
+    def predicate(code, price, change_pct, volume, kline_data) -> Optional[str]:
+        # 计算近期平均换手率
+        recent_turnover = kline_data["turnover"][:threshold_days]
+        if not recent_turnover.size:
+            return None
+        avg_turnover = float(recent_turnover.mean())
+        current_turnover = float(recent_turnover[0])
+        if avg_turnover > 0 and current_turnover >= avg_turnover * threshold_ratio:
+            return f"股票 {code} 换手率 {current_turnover:.2f}% 超过近 {threshold_days} 日平均 {avg_turnover:.2f}% 的 {threshold_ratio:.1f} 倍"
+        return None
+
+    return predicate
+
+
+# 预警类型 -> 判断函数编译器
+_COMPILERS: Dict[str, Callable[[Dict[str, Any]], AlertPredicate]] = {
+    AlertType.PRICE_ABOVE: _compile_price_above,
+    AlertType.PRICE_BELOW: _compile_price_below,
+    AlertType.CHANGE_UP: _compile_change_up,
+    AlertType.CHANGE_DOWN: _compile_change_down,
+    AlertType.VOLUME_SPIKE: _compile_volume_spike,
+    AlertType.TURNOVER_SPIKE: _compile_turnover_spike,
+}
+
 
 class AlertService:
     """预警服务类"""
 
-    def __init__(self):
-        """初始化预警服务"""
+    def __init__(self, notify_latency: float = NOTIFY_LATENCY):
+        """
+        初始化预警服务
+
+        Args:
+            notify_latency: 通知合并窗口（秒）
+        """
         self.engine = get_engine()
         self.stock_service = get_stock_service()
-        self._notification_callbacks: List[Callable] = []
-
-    def register_notification_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        self._quote_cache = StockCache(ttl=QUOTE_CACHE_TTL)
+        self._kline_cache = StockCache(ttl=KLINE_CACHE_TTL)
+        # (回调, 是否按批接收)
+        self._notification_callbacks: List[Tuple[Callable, bool]] = []
+        self._notify_latency = notify_latency
+        self._notify_queue: Optional[asyncio.Queue] = None
+        self._notify_task: Optional[asyncio.Task] = None
+        # (缓存时刻, 未读数量)
+        self._unread_count_cache: Optional[Tuple[float, int]] = None
+        # 进行中的上游请求，同一键的并发请求共享一次结果
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # 规则ID -> ((预警类型, 更新时间), 编译后的判断函数)
+        self._predicates: Dict[int, Tuple[Tuple[Any, Any], AlertPredicate]] = {}
+
+    def register_notification_callback(self, callback: Callable, batch: bool = False):
         """
         注册预警通知回调函数
 
+        回调在后台任务中执行，同步函数放到线程中运行，不阻塞预警检查。
+
         Args:
-            callback: 回调函数，接收预警记录作为参数
+            callback: 回调函数（同步或异步）
+            batch: 为 True 时每批调用一次并传入预警记录列表，否则逐条传入预警记录
         """
-        self._notification_callbacks.append(callback)
+        self._notification_callbacks.append((callback, batch))
+
+    def _ensure_notify_worker(self) -> asyncio.Queue:
+        """按需启动通知分发任务（任务结束或事件循环更换后重新创建）"""
+        if self._notify_task is None or self._notify_task.done():
+            self._notify_queue = asyncio.Queue()
+            self._notify_task = asyncio.create_task(self._notify_worker(self._notify_queue))
+        return self._notify_queue
+
+    async def _notify_worker(self, queue: asyncio.Queue):
+        """等待首条通知后再收集一个合并窗口内的通知，整批分发"""
+        while True:
+            batch = [await queue.get()]
+            try:
+                await asyncio.sleep(self._notify_latency)
+            finally:
+                # 窗口内被取消（close）时也分发已收集的通知
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Dict[str, Any]]):
+        """将一批预警分发给全部回调"""
+        for callback, wants_batch in self._notification_callbacks:
+            for payload in ([batch] if wants_batch else batch):
+                try:
+                    if asyncio.iscoroutinefunction(callback):
+                        await callback(payload)
+                    else:
+                        await asyncio.to_thread(callback, payload)
+                except Exception as e:
+                    logger.error(f"Notification callback error: {e}")
+
+    async def close(self):
+        """停止通知分发任务，并分发队列中剩余的通知"""
+        if self._notify_task is None:
+            return
+        self._notify_task.cancel()
+        try:
+            await self._notify_task
+        except asyncio.CancelledError:
+            pass
+        self._notify_task = None
+
+        pending = []
+        while not self._notify_queue.empty():
+            pending.append(self._notify_queue.get_nowait())
+        if pending:
+            await self._dispatch(pending)
 
     async def _notify(self, alert_record: AlertRecord, rule: AlertRule):
-        """触发通知回调"""
+        """将预警加入通知队列，由后台任务合并分发"""
+        if not self._notification_callbacks:
+            return
+
         alert_data = {
             "id": alert_record.id,
             "rule_id": rule.id,
@@ -55,11 +272,7 @@ class AlertService:
             "triggered_at": alert_record.triggered_at.isoformat() if alert_record.triggered_at else None,
         }
 
-        for callback in self._notification_callbacks:
-            try:
-                callback(alert_data)
-            except Exception as e:
-                logger.error(f"Notification callback error: {e}")
+        self._ensure_notify_worker().put_nowait(alert_data)
 
     # ==================== 预警规则管理 ====================
 
@@ -170,8 +383,7 @@ class AlertService:
         Returns:
             AlertRule 对象或 None
         """
-        stmt = select(AlertRule).where(AlertRule.id == rule_id)
-        result = await session.execute(stmt)
+        result = await session.execute(_STMT_RULE_BY_ID, {"rule_id": rule_id})
         return result.scalar_one_or_none()
 
     async def update_alert_rule(
@@ -210,9 +422,10 @@ class AlertService:
         if notes is not None:
             rule.notes = notes
 
-        rule.updated_at = datetime.utcnow()
+        rule.updated_at = func.now()
         await session.commit()
         await session.refresh(rule)
+        self._predicates.pop(rule_id, None)
 
         logger.info(f"Updated alert rule: {rule_id}")
         return rule
@@ -232,12 +445,13 @@ class AlertService:
         Returns:
             是否成功删除
         """
-        rule = await self.get_alert_rule_by_id(session, rule_id)
-        if not rule:
-            return False
-
-        await session.delete(rule)
+        # 单条 DELETE，关联预警记录由外键 ON DELETE CASCADE 删除
+        result = await session.execute(delete(AlertRule).where(AlertRule.id == rule_id))
         await session.commit()
+        self._unread_count_cache = None
+        self._predicates.pop(rule_id, None)
+        if not result.rowcount:
+            return False
 
         logger.info(f"Deleted alert rule: {rule_id}")
         return True
@@ -264,158 +478,308 @@ class AlertService:
 
     # ==================== 预警检查 ====================
 
-    async def check_alert(
+    def _fetch_kline(self, stock_code: str) -> Optional[List[Dict[str, Any]]]:
+        """获取异动判断所用的日K线（不复权）"""
+        return self.stock_service.get_kline_data(
+            symbol=stock_code,
+            period="daily",
+            start_date=None,
+            end_date=None,
+            adjust=""
+        )
+
+    async def _single_flight(self, key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        合并同一键的并发请求：已有请求进行中时等待其结果，否则发起请求
+
+        Args:
+            key: 请求键（数据类型, 股票代码）
+            fetch: 发起请求的协程函数
+
+        Returns:
+            请求结果
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            # shield：某个等待方被取消时不影响共享的请求
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已读取，无人等待时不产生 "never retrieved" 警告
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _cached_quote(self, stock_code: str) -> Optional[Quote]:
+        """获取实时行情（带短时缓存），未命中时在线程中调用股票服务"""
+        quote = self._quote_cache.get(stock_code)
+        if quote is None:
+            data = await self._single_flight(
+                ("quote", stock_code),
+                lambda: asyncio.to_thread(self.stock_service.get_stock_quote, stock_code),
+            )
+            if not data:
+                return None
+            quote = Quote.from_dict(data)
+            self._quote_cache.set(stock_code, quote)
+        return quote
+
+    async def _cached_kline(self, stock_code: str, days: int) -> Optional[Dict[str, np.ndarray]]:
+        """
+        获取最近 days 根日K线的成交量与换手率数组（带缓存）
+
+        只缓存判断所需的切片，同一股票的多条异动规则共用一份数组。
+        """
+        key = f"{stock_code}:{days}"
+        arrays = self._kline_cache.get(key)
+        if arrays is None:
+            kline_data = await self._single_flight(
+                ("kline", stock_code),
+                lambda: asyncio.to_thread(self._fetch_kline, stock_code),
+            )
+            if not kline_data:
+                return None
+            recent = kline_data[:days]
+            arrays = {
+                "volume": np.fromiter((float(k.get("volume", 0)) for k in recent), np.float64, len(recent)),
+                "turnover": np.fromiter((float(k.get("turnover_rate", 0)) for k in recent), np.float64, len(recent)),
+            }
+            self._kline_cache.set(key, arrays)
+        return arrays
+
+    def _predicate_for(self, rule: AlertRule) -> Optional[AlertPredicate]:
+        """
+        获取规则编译后的判断函数
+
+        按规则ID缓存，预警类型或更新时间变化（规则被修改）后重新编译；
+        未持久化或更新时间未加载的规则每次现编译，不写入缓存。
+
+        Args:
+            rule: 预警规则
+
+        Returns:
+            判断函数，未知预警类型时返回 None
+        """
+        # 直接读实例字典，避免触发过期属性的懒加载
+        version = (rule.alert_type, rule.__dict__.get("updated_at"))
+        cached = self._predicates.get(rule.id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        compiler = _COMPILERS.get(rule.alert_type)
+        if compiler is None:
+            return None
+        predicate = compiler(rule.threshold)
+        if rule.id is not None and version[1] is not None:
+            self._predicates[rule.id] = (version, predicate)
+        return predicate
+
+    def _evaluate(
         self,
-        session: AsyncSession,
         rule: AlertRule,
+        quote: Optional[Quote],
+        kline_data: Optional[Dict[str, np.ndarray]] = None,
     ) -> Optional[AlertRecord]:
         """
-        检查单个预警规则是否触发
+        根据行情与K线判断规则是否触发（不访问数据库）
 
         Args:
-            session: 数据库会话
             rule: 预警规则
+            quote: 实时行情
+            kline_data: 近期成交量与换手率数组（_cached_kline 的结果），仅异动判断需要
 
         Returns:
-            AlertRecord 对象或 None（未触发时）
+            未保存的 AlertRecord 对象或 None（未触发时）
         """
-        try:
-            alert_type = AlertType(rule.alert_type)
-        except ValueError:
+        predicate = self._predicate_for(rule)
+        if predicate is None:
             logger.warning(f"Unknown alert type: {rule.alert_type}")
             return None
 
-        # 获取股票实时行情
-        quote = self.stock_service.get_stock_quote(rule.stock_code)
-        if not quote:
+        if quote is None:
             logger.warning(f"Cannot get quote for {rule.stock_code}")
             return None
 
-        price = quote.get("price", 0)
-        change_pct = quote.get("change_percent", 0)
-        volume = quote.get("volume", 0)
-        amount = quote.get("amount", 0)
+        code = rule.stock_code
+        price, change_pct, volume = quote.price, quote.change_percent, quote.volume
+
+        # 历史K线不足时无法判断异动
+        if rule.alert_type in KLINE_ALERT_TYPES:
+            if kline_data is None or len(kline_data["volume"]) < rule.threshold.get("days", 5):
+                logger.warning(f"Insufficient kline data for {code}")
+                return None
+
+        message = predicate(code, price, change_pct, volume, kline_data)
+        if message is None:
+            return None
+
+        return AlertRecord(
+            rule_id=rule.id,
+            trigger_price=price,
+            trigger_change_pct=change_pct,
+            trigger_volume=volume,
+            message=message,
+        )
+
+    async def check_alert(
+        self,
+        session: AsyncSession,
+        rule: AlertRule,
+    ) -> Optional[AlertRecord]:
+        """
+        检查单个预警规则是否触发
+
+        Args:
+            session: 数据库会话
+            rule: 预警规则
+
+        Returns:
+            AlertRecord 对象或 None（未触发时）
+        """
+        # 获取股票实时行情
+        quote = await self._cached_quote(rule.stock_code)
 
         # 获取历史成交量数据用于异动判断
         kline_data = None
-        if alert_type in [AlertType.VOLUME_SPIKE, AlertType.TURNOVER_SPIKE]:
-            threshold_days = rule.threshold.get("days", 5)
-            kline_data = self.stock_service.get_kline_data(
-                symbol=rule.stock_code,
-                period="daily",
-                start_date=None,
-                end_date=None,
-                adjust=""
-            )
-            if not kline_data or len(kline_data) < threshold_days:
-                logger.warning(f"Insufficient kline data for {rule.stock_code}")
-                return None
+        if quote is not None and rule.alert_type in KLINE_ALERT_TYPES:
+            kline_data = await self._cached_kline(rule.stock_code, rule.threshold.get("days", 5))
 
-        # 根据预警类型判断是否触发
-        triggered = False
-        message = ""
-
-        if alert_type == AlertType.PRICE_ABOVE:
-            target_price = rule.threshold.get("price", 0)
-            if price >= target_price:
-                triggered = True
-                message = f"股票 {rule.stock_code} 当前价格 {price:.2f} 超过目标价格 {target_price:.2f}"
-
-        elif alert_type == AlertType.PRICE_BELOW:
-            target_price = rule.threshold.get("price", 0)
-            if price <= target_price:
-                triggered = True
-                message = f"股票 {rule.stock_code} 当前价格 {price:.2f} 低于目标价格 {target_price:.2f}"
-
-        elif alert_type == AlertType.CHANGE_UP:
-            target_change = rule.threshold.get("change_percent", 0)
-            if change_pct >= target_change:
-                triggered = True
-                message = f"股票 {rule.stock_code} 涨幅 {change_pct:.2f}% 超过目标涨幅 {target_change:.2f}%"
-
-        elif alert_type == AlertType.CHANGE_DOWN:
-            target_change = rule.threshold.get("change_percent", 0)
-            if change_pct <= -target_change:
-                triggered = True
-                message = f"股票 {rule.stock_code} 跌幅 {abs(change_pct):.2f}% 超过目标跌幅 {target_change:.2f}%"
-
-        elif alert_type == AlertType.VOLUME_SPIKE:
-            threshold_ratio = rule.threshold.get("volume_ratio", 2.0)
-            threshold_days = rule.threshold.get("days", 5)
-
-            # 计算近期平均成交量
-            recent_volumes = [float(k.get("volume", 0)) for k in kline_data[:threshold_days]]
-            if recent_volumes:
-                avg_volume = sum(recent_volumes) / len(recent_volumes)
-                if avg_volume > 0 and volume >= avg_volume * threshold_ratio:
-                    triggered = True
-                    message = f"股票 {rule.stock_code} 成交量 {volume:.0f} 超过近 {threshold_days} 日平均 {avg_volume:.0f} 的 {threshold_ratio:.1f} 倍"
-
-        elif alert_type == AlertType.TURNOVER_SPIKE:
-            threshold_ratio = rule.threshold.get("turnover_ratio", 1.5)
-            threshold_days = rule.threshold.get("days", 5)
-
-            # 计算近期平均换手率
-            recent_turnover = [float(k.get("turnover_rate", 0)) for k in kline_data[:threshold_days]]
-            if recent_turnover:
-                avg_turnover = sum(recent_turnover) / len(recent_turnover)
-                # 获取当前换手率
-                current_turnover = kline_data[0].get("turnover_rate", 0) if kline_data else 0
-                if avg_turnover > 0 and current_turnover >= avg_turnover * threshold_ratio:
-                    triggered = True
-                    message = f"股票 {rule.stock_code} 换手率 {current_turnover:.2f}% 超过近 {threshold_days} 日平均 {avg_turnover:.2f}% 的 {threshold_ratio:.1f} 倍"
-
-        if triggered:
-            # 创建预警记录
-            alert_record = AlertRecord(
-                rule_id=rule.id,
-                trigger_price=price,
-                trigger_change_pct=change_pct,
-                trigger_volume=volume,
-                message=message,
-            )
+        alert_record = self._evaluate(rule, quote, kline_data)
+        if alert_record is None:
+            return None
 
-            session.add(alert_record)
-            await session.commit()
-            await session.refresh(alert_record)
+        session.add(alert_record)
+        await session.commit()
+        self._unread_count_cache = None
+        await session.refresh(alert_record)
 
-            logger.info(f"Alert triggered: {rule.id} - {message}")
+        logger.info(f"Alert triggered: {rule.id} - {alert_record.message}")
 
-            # 触发通知回调
-            await self._notify(alert_record, rule)
+        # 触发通知回调
+        await self._notify(alert_record, rule)
 
-            return alert_record
+        return alert_record
 
-        return None
+    async def _gather_by_symbol(
+        self,
+        fetch: Callable[[str], Awaitable[Any]],
+        symbols: List[str],
+        semaphore: asyncio.Semaphore,
+    ) -> Dict[str, Any]:
+        """并发地对每只股票获取一次数据（并发数受 semaphore 限制），失败的股票结果为 None"""
+
+        async def bounded(symbol: str) -> Any:
+            async with semaphore:
+                return await fetch(symbol)
+
+        results = await asyncio.gather(
+            *(bounded(symbol) for symbol in symbols),
+            return_exceptions=True,
+        )
+        data = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching alert data for {symbol}: {result}")
+                result = None
+            data[symbol] = result
+        return data
 
     async def check_all_alerts(
         self,
         session: AsyncSession,
-    ) -> List[AlertRecord]:
+    ) -> AsyncIterator[AlertRecord]:
         """
-        检查所有活跃预警规则
+        检查所有活跃预警规则，逐条产出触发记录
+
+        按股票代码合并数据请求：每只股票每轮只取一次行情，
+        含异动规则的股票只取一次K线；触发记录一次性提交。
+        提交后先将全部记录加入通知队列，再逐条产出，
+        调用方提前结束迭代也不会丢失通知。
 
         Args:
             session: 数据库会话
 
-        Returns:
-            触发预警记录列表
+        Yields:
+            已提交的触发预警记录
         """
         # 获取所有活跃的预警规则
-        stmt = select(AlertRule).where(AlertRule.status == AlertStatus.ACTIVE.value)
-        result = await session.execute(stmt)
+        result = await session.execute(_STMT_ACTIVE_RULES)
         rules = list(result.scalars().all())
+        if not rules:
+            return
 
-        triggered_alerts = []
+        symbols = list(dict.fromkeys(rule.stock_code for rule in rules))
+        # 每只股票取其异动规则中最长的回看天数
+        kline_days: Dict[str, int] = {}
+        for rule in rules:
+            if rule.alert_type in KLINE_ALERT_TYPES:
+                days = rule.threshold.get("days", 5)
+                kline_days[rule.stock_code] = max(days, kline_days.get(rule.stock_code, 0))
+
+        # 行情与K线请求共用并发上限，避免压垮上游接口与默认线程池
+        semaphore = asyncio.Semaphore(get_config().alert_concurrency)
+        quotes, klines = await asyncio.gather(
+            self._gather_by_symbol(self._cached_quote, symbols, semaphore),
+            self._gather_by_symbol(
+                lambda code: self._cached_kline(code, kline_days[code]), list(kline_days), semaphore
+            ),
+        )
+
+        triggered: List[Tuple[AlertRecord, AlertRule]] = []
         for rule in rules:
             try:
-                alert_record = await self.check_alert(session, rule)
+                alert_record = self._evaluate(rule, quotes[rule.stock_code], klines.get(rule.stock_code))
                 if alert_record:
-                    triggered_alerts.append(alert_record)
+                    triggered.append((alert_record, rule))
             except Exception as e:
                 logger.error(f"Error checking alert {rule.id}: {e}")
 
-        return triggered_alerts
+        if not triggered:
+            return
+
+        # 一条 INSERT ... RETURNING 写入全部记录并取回 ID 与 triggered_at 等服务端默认值
+        rows = [
+            {column: getattr(draft, column) for column in ALERT_RECORD_INSERT_COLUMNS}
+            for draft, _ in triggered
+        ]
+        result = await session.scalars(
+            insert(AlertRecord).returning(AlertRecord, sort_by_parameter_order=True), rows
+        )
+        records = list(result.all())
+        await session.commit()
+        self._unread_count_cache = None
+
+        # 提交成功后再通知
+        for alert_record, (_, rule) in zip(records, triggered):
+            logger.info(f"Alert triggered: {rule.id} - {alert_record.message}")
+            await self._notify(alert_record, rule)
+
+        for alert_record in records:
+            yield alert_record
+
+    async def check_all_alerts_list(self, session: AsyncSession) -> List[AlertRecord]:
+        """
+        检查所有活跃预警规则并返回完整列表（check_all_alerts 的列表形式）
+
+        Args:
+            session: 数据库会话
+
+        Returns:
+            触发预警记录列表
+        """
+        return [record async for record in self.check_all_alerts(session)]
 
     # ==================== 预警记录查询 ====================
 
@@ -428,6 +792,7 @@ class AlertService:
         is_handled: Optional[bool] = None,
         limit: int = 100,
         offset: int = 0,
+        with_rule: bool = False,
     ) -> List[AlertRecord]:
         """
         获取预警记录列表
@@ -440,6 +805,7 @@ class AlertService:
             is_handled: 已处理状态过滤
             limit: 返回数量限制
             offset: 偏移量
+            with_rule: 是否同时加载关联的预警规则（record.rule）
 
         Returns:
             AlertRecord 列表
@@ -455,8 +821,13 @@ class AlertService:
             conditions.append(AlertRecord.is_handled == is_handled)
 
         if stock_code:
-            # 关联 AlertRule 进行过滤
-            stmt = stmt.join(AlertRule).where(AlertRule.stock_code == stock_code)
+            # 关联 AlertRule 进行过滤；已 JOIN 时直接从同一结果行填充 record.rule
+            stmt = stmt.join(AlertRecord.rule).where(AlertRule.stock_code == stock_code)
+            if with_rule:
+                stmt = stmt.options(contains_eager(AlertRecord.rule))
+        elif with_rule:
+            # 未 JOIN 时以一次 IN 查询批量加载规则
+            stmt = stmt.options(selectinload(AlertRecord.rule))
 
         if conditions:
             stmt = stmt.where(and_(*conditions))
@@ -480,16 +851,12 @@ class AlertService:
         Returns:
             是否成功
         """
-        stmt = select(AlertRecord).where(AlertRecord.id == record_id)
-        result = await session.execute(stmt)
-        record = result.scalar_one_or_none()
-
-        if not record:
-            return False
-
-        record.is_read = True
+        result = await session.execute(
+            update(AlertRecord).where(AlertRecord.id == record_id).values(is_read=True)
+        )
         await session.commit()
-        return True
+        self._unread_count_cache = None
+        return result.rowcount > 0
 
     async def mark_alert_as_handled(
         self,
@@ -506,24 +873,21 @@ class AlertService:
         Returns:
             是否成功
         """
-        stmt = select(AlertRecord).where(AlertRecord.id == record_id)
-        result = await session.execute(stmt)
-        record = result.scalar_one_or_none()
-
-        if not record:
-            return False
-
-        record.is_handled = True
-        record.handled_at = datetime.utcnow()
+        result = await session.execute(
+            update(AlertRecord)
+            .where(AlertRecord.id == record_id)
+            .values(is_handled=True, handled_at=func.now())
+        )
         await session.commit()
-        return True
+        self._unread_count_cache = None
+        return result.rowcount > 0
 
     async def get_unread_count(
         self,
         session: AsyncSession,
     ) -> int:
         """
-        获取未读预警数量
+        获取未读预警数量（短时缓存）
 
         Args:
             session: 数据库会话
@@ -531,14 +895,14 @@ class AlertService:
         Returns:
             未读预警数量
         """
-        stmt = select(func.count(AlertRecord.id)).where(
-            and_(
-                AlertRecord.is_read == False,
-                AlertRecord.is_handled == False,
-            )
-        )
-        result = await session.execute(stmt)
-        return result.scalar() or 0
+        cached = self._unread_count_cache
+        if cached is not None and time.monotonic() - cached[0] < UNREAD_COUNT_TTL:
+            return cached[1]
+
+        result = await session.execute(_STMT_UNREAD_COUNT)
+        count = result.scalar() or 0
+        self._unread_count_cache = (time.monotonic(), count)
+        return count
 
 
 # 全局预警服务实例
@@ -3,26 +3,85 @@
 
 提供用户认证、授权和 API 密钥管理功能。
 """
+import asyncio
+import hashlib
+import hmac
 import secrets
 import string
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional
 
 import bcrypt
 from jose import JWTError, jwt
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from app.config import get_config
+from app.db.database import session_scope
 from app.models.user import APIKey, User, UserSession, UserRole
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 # JWT 算法
 ALGORITHM = "HS256"
 
+# 会话清理每批删除行数
+SESSION_REAP_BATCH = 10_000
+
+# 已验证令牌的解码缓存容量
+TOKEN_CACHE_SIZE = 4096
+
+# API 密钥格式：固定前缀 + 32 位随机字母数字
+API_KEY_PREFIX = "sk_"
+API_KEY_LENGTH = len(API_KEY_PREFIX) + 32
+
+# 热点点查语句在模块加载时构造一次，调用时只传绑定参数
+_STMT_USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+_STMT_USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+_STMT_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_STMT_USER_QUOTA = select(User.api_used, User.api_quota).where(User.id == bindparam("user_id"))
+_STMT_USER_BY_LOGIN = select(User).where(
+    (User.username == bindparam("login")) | (User.email == bindparam("login"))
+)
+# 密钥查找同时 JOIN 出所属用户，验证通过后无需再查一次用户
+_STMT_ACTIVE_API_KEY_BY_HASH = (
+    select(APIKey)
+    .options(joinedload(APIKey.user))
+    .where(
+        APIKey.key_hash == bindparam("key_hash"),
+        APIKey.is_active == True,
+    )
+)
+
+
+# argon2 哈希器（首次使用时创建）
+_argon2_hasher = None
+
+
+def _get_argon2_hasher():
+    """获取 argon2id 哈希器，argon2-cffi 为可选依赖"""
+    global _argon2_hasher
+    if _argon2_hasher is None:
+        try:
+            from argon2 import PasswordHasher
+        except ImportError:
+            raise ImportError("Please install argon2-cffi package: pip install argon2-cffi")
+        _argon2_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+    return _argon2_hasher
+
+
+def _utcnow() -> datetime:
+    """当前 UTC 时间（带时区）；调用方每个流程只取一次并复用"""
+    return datetime.now(timezone.utc)
+
 
 def get_password_hash(password: str) -> str:
     """
-    密码哈希
+    密码哈希（算法由配置 password_hasher 决定）
 
     Args:
         password: 原始密码
@@ -30,12 +89,16 @@ def get_password_hash(password: str) -> str:
     Returns:
         哈希后的密码
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    config = get_config()
+    if config.password_hasher == "argon2":
+        return _get_argon2_hasher().hash(password)
+    salt = bcrypt.gensalt(rounds=config.bcrypt_rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    验证密码
+    验证密码（按哈希格式识别 bcrypt 或 argon2）
 
     Args:
         plain_password: 原始密码
@@ -44,9 +107,27 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         是否匹配
     """
+    if hashed_password.startswith("$argon2"):
+        hasher = _get_argon2_hasher()
+        from argon2.exceptions import VerificationError
+
+        try:
+            return hasher.verify(hashed_password, plain_password)
+        except VerificationError:
+            return False
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+async def hash_password_async(password: str) -> str:
+    """在线程中计算密码哈希，避免慢哈希阻塞事件循环"""
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在线程中验证密码，避免慢哈希阻塞事件循环"""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     创建访问令牌
@@ -61,12 +142,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     config = get_config()
     to_encode = data.copy()
 
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=config.access_token_expire_minutes)
-
-    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    now = _utcnow()
+    expire = now + (expires_delta or timedelta(minutes=config.access_token_expire_minutes))
+    to_encode.update({"exp": expire, "iat": now})
 
     encoded_jwt = jwt.encode(
         to_encode, config.secret_key, algorithm=ALGORITHM
@@ -86,8 +164,9 @@ def create_refresh_token(data: dict) -> str:
     """
     config = get_config()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=config.refresh_token_expire_days)
-    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "type": "refresh"})
+    now = _utcnow()
+    expire = now + timedelta(days=config.refresh_token_expire_days)
+    to_encode.update({"exp": expire, "iat": now, "type": "refresh"})
 
     encoded_jwt = jwt.encode(
         to_encode, config.secret_key, algorithm=ALGORITHM
@@ -95,10 +174,18 @@ def create_refresh_token(data: dict) -> str:
     return encoded_jwt
 
 
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _decode_cached(token: str, secret_key: str) -> dict:
+    """验证签名并解码令牌；验证失败抛出的异常不会进入缓存"""
+    return jwt.decode(token, secret_key, algorithms=[ALGORITHM])
+
+
 def decode_token(token: str) -> Optional[dict]:
     """
     解码令牌
 
+    同一令牌在有效期内只验证一次签名，缓存命中后仍按 exp 判断是否过期。
+
     Args:
         token: JWT 令牌
 
@@ -106,11 +193,16 @@ def decode_token(token: str) -> Optional[dict]:
         解码后的数据，失败返回 None
     """
     try:
-        payload = jwt.decode(token, get_config().secret_key, algorithms=[ALGORITHM])
-        return payload
+        payload = _decode_cached(token, get_config().secret_key)
     except JWTError:
         return None
 
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        return None
+    # 返回副本，避免调用方修改缓存中的载荷
+    return dict(payload)
+
 
 def generate_api_key() -> tuple[str, str]:
     """
@@ -120,28 +212,33 @@ def generate_api_key() -> tuple[str, str]:
         (完整密钥, 密钥前缀)
     """
     # 生成 32 位随机密钥
-    key = "sk_" + "".join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+    key = API_KEY_PREFIX + "".join(
+        secrets.choice(string.ascii_letters + string.digits)
+        for _ in range(API_KEY_LENGTH - len(API_KEY_PREFIX))
+    )
     # 密钥前缀用于显示
     prefix = key[:12] + "..."
     return key, prefix
 
 
-def hash_api_key(api_key: str) -> str:
+def hash_api_key(api_key: str) -> bytes:
     """
     哈希 API 密钥
 
+    密钥为 190 位熵的随机串，无需加盐慢哈希；确定性的 SHA-256 摘要可直接按索引等值查找。
+
     Args:
         api_key: 原始 API 密钥
 
     Returns:
-        哈希后的密钥
+        32 字节 SHA-256 摘要
     """
-    return bcrypt.hashpw(api_key.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return hashlib.sha256(api_key.encode('utf-8')).digest()
 
 
-def verify_api_key(plain_key: str, hashed_key: str) -> bool:
+def verify_api_key(plain_key: str, hashed_key: bytes) -> bool:
     """
-    验证 API 密钥
+    验证 API 密钥（常量时间比较）
 
     Args:
         plain_key: 原始密钥
@@ -150,7 +247,7 @@ def verify_api_key(plain_key: str, hashed_key: str) -> bool:
     Returns:
         是否匹配
     """
-    return bcrypt.checkpw(plain_key.encode('utf-8'), hashed_key.encode('utf-8'))
+    return hmac.compare_digest(hash_api_key(plain_key), hashed_key)
 
 
 class AuthService:
@@ -182,16 +279,12 @@ class AuthService:
             ValueError: 用户名或邮箱已存在
         """
         # 检查用户名是否存在
-        result = await self.session.execute(
-            select(User).where(User.username == username)
-        )
+        result = await self.session.execute(_STMT_USER_BY_USERNAME, {"username": username})
         if result.scalar_one_or_none():
             raise ValueError("用户名已存在")
 
         # 检查邮箱是否存在
-        result = await self.session.execute(
-            select(User).where(User.email == email)
-        )
+        result = await self.session.execute(_STMT_USER_BY_EMAIL, {"email": email})
         if result.scalar_one_or_none():
             raise ValueError("邮箱已被注册")
 
@@ -199,7 +292,7 @@ class AuthService:
         user = User(
             username=username,
             email=email,
-            password_hash=get_password_hash(password),
+            password_hash=await hash_password_async(password),
             display_name=display_name or username,
             role=UserRole.BASIC.value,
             is_active=True,
@@ -226,21 +319,17 @@ class AuthService:
             用户对象，认证失败返回 None
         """
         # 支持用户名或邮箱登录
-        result = await self.session.execute(
-            select(User).where(
-                (User.username == username) | (User.email == username)
-            )
-        )
+        result = await self.session.execute(_STMT_USER_BY_LOGIN, {"login": username})
         user = result.scalar_one_or_none()
 
-        if not user or not verify_password(password, user.password_hash):
+        if not user or not await verify_password_async(password, user.password_hash):
             return None
 
         if not user.is_active:
             return None
 
         # 更新最后登录时间
-        user.last_login_at = datetime.utcnow()
+        user.last_login_at = _utcnow()
         await self.session.commit()
 
         return user
@@ -255,9 +344,7 @@ class AuthService:
         Returns:
             用户对象，不存在返回 None
         """
-        result = await self.session.execute(
-            select(User).where(User.id == user_id)
-        )
+        result = await self.session.execute(_STMT_USER_BY_ID, {"user_id": user_id})
         return result.scalar_one_or_none()
 
     async def get_user_by_username(self, username: str) -> Optional[User]:
@@ -270,9 +357,7 @@ class AuthService:
         Returns:
             用户对象，不存在返回 None
         """
-        result = await self.session.execute(
-            select(User).where(User.username == username)
-        )
+        result = await self.session.execute(_STMT_USER_BY_USERNAME, {"username": username})
         return result.scalar_one_or_none()
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
@@ -285,9 +370,7 @@ class AuthService:
         Returns:
             用户对象，不存在返回 None
         """
-        result = await self.session.execute(
-            select(User).where(User.email == email)
-        )
+        result = await self.session.execute(_STMT_USER_BY_EMAIL, {"email": email})
         return result.scalar_one_or_none()
 
     async def update_user(
@@ -347,7 +430,7 @@ class AuthService:
         # 计算过期时间
         expires_at = None
         if expires_days:
-            expires_at = datetime.utcnow() + timedelta(days=expires_days)
+            expires_at = _utcnow() + timedelta(days=expires_days)
 
         # 创建 API 密钥记录
         api_key_record = APIKey(
@@ -374,26 +457,29 @@ class AuthService:
         Returns:
             用户对象，验证失败返回 None
         """
-        # 遍历所有活跃的 API 密钥进行验证
+        # 格式不符的密钥不可能存在，无需查询数据库
+        if len(api_key) != API_KEY_LENGTH or not api_key.startswith(API_KEY_PREFIX):
+            return None
+
+        # 按摘要走部分唯一索引等值查找
         result = await self.session.execute(
-            select(APIKey).where(APIKey.is_active == True)
+            _STMT_ACTIVE_API_KEY_BY_HASH, {"key_hash": hash_api_key(api_key)}
         )
-        api_keys = result.scalars().all()
-
-        for key_record in api_keys:
-            if verify_api_key(api_key, key_record.key_hash):
-                # 检查是否过期
-                if key_record.expires_at and key_record.expires_at < datetime.utcnow():
-                    return None
+        key_record = result.scalar_one_or_none()
+        if key_record is None:
+            return None
 
-                # 更新最后使用时间
-                key_record.last_used_at = datetime.utcnow()
-                await self.session.commit()
+        # 检查是否过期
+        now = _utcnow()
+        if key_record.expires_at and key_record.expires_at < now:
+            return None
 
-                # 返回关联用户
-                return await self.get_user_by_id(key_record.user_id)
+        # 更新最后使用时间
+        key_record.last_used_at = now
+        await self.session.commit()
 
-        return None
+        # 关联用户已随密钥一并加载
+        return key_record.user
 
     async def list_api_keys(self, user_id: int) -> list[APIKey]:
         """
@@ -424,18 +510,13 @@ class AuthService:
             是否删除成功
         """
         result = await self.session.execute(
-            select(APIKey).where(
+            delete(APIKey).where(
                 APIKey.id == key_id,
                 APIKey.user_id == user_id
             )
         )
-        api_key = result.scalar_one_or_none()
-        if not api_key:
-            return False
-
-        await self.session.delete(api_key)
         await self.session.commit()
-        return True
+        return result.rowcount > 0
 
     async def create_session(
         self,
@@ -459,10 +540,7 @@ class AuthService:
             会话对象
         """
         config = get_config()
-        if expires_delta:
-            expires_at = datetime.utcnow() + expires_delta
-        else:
-            expires_at = datetime.utcnow() + timedelta(days=config.refresh_token_expire_days)
+        expires_at = _utcnow() + (expires_delta or timedelta(days=config.refresh_token_expire_days))
 
         session = UserSession(
             user_id=user_id,
@@ -489,36 +567,47 @@ class AuthService:
             是否成功
         """
         result = await self.session.execute(
-            select(UserSession).where(UserSession.jti == jti)
+            update(UserSession)
+            .where(
+                UserSession.jti == jti,
+                UserSession.is_valid == True,
+            )
+            .values(is_valid=False)
         )
-        session = result.scalar_one_or_none()
-        if not session:
-            return False
-
-        session.is_valid = False
         await self.session.commit()
-        return True
+        return result.rowcount > 0
 
-    async def cleanup_expired_sessions(self) -> int:
+    async def cleanup_expired_sessions(self, batch_size: int = SESSION_REAP_BATCH) -> int:
         """
-        清理过期会话
+        清理过期与已失效的会话
+
+        以服务端 DELETE 分批删除，每批单独提交，避免长事务与大量行锁。
+
+        Args:
+            batch_size: 每批删除的最大行数
 
         Returns:
             清理的会话数量
         """
-        result = await self.session.execute(
-            select(UserSession).where(
-                UserSession.expires_at < datetime.utcnow()
-            )
+        stale = or_(
+            UserSession.expires_at < _utcnow(),
+            UserSession.is_valid == False,
         )
-        sessions = result.scalars().all()
 
-        count = len(sessions)
-        for session in sessions:
-            await self.session.delete(session)
-
-        await self.session.commit()
-        return count
+        total = 0
+        while True:
+            batch_ids = select(UserSession.id).where(stale).limit(batch_size).scalar_subquery()
+            # 不同步会话内对象：否则 ORM 会以 RETURNING 取回每批全部被删 ID
+            result = await self.session.execute(
+                delete(UserSession)
+                .where(UserSession.id.in_(batch_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            deleted = max(result.rowcount or 0, 0)
+            total += deleted
+            if deleted < batch_size:
+                return total
 
     async def check_quota(self, user_id: int) -> tuple[bool, int, int]:
         """
@@ -530,12 +619,13 @@ class AuthService:
         Returns:
             (是否有配额, 当前已使用, 配额上限)
         """
-        user = await self.get_user_by_id(user_id)
-        if not user:
+        # 只读取两列，不构造 User 实例
+        row = (await self.session.execute(_STMT_USER_QUOTA, {"user_id": user_id})).one_or_none()
+        if row is None:
             return False, 0, 0
 
-        remaining = user.api_quota - user.api_used
-        return remaining > 0, user.api_used, user.api_quota
+        api_used, api_quota = row
+        return api_quota - api_used > 0, api_used, api_quota
 
     async def increment_usage(self, user_id: int, count: int = 1) -> bool:
         """
@@ -548,10 +638,28 @@ class AuthService:
         Returns:
             是否成功
         """
-        user = await self.get_user_by_id(user_id)
-        if not user:
-            return False
-
-        user.api_used += count
+        # 原子自增，不读取用户行，并发请求也不会丢失计数
+        result = await self.session.execute(
+            update(User).where(User.id == user_id).values(api_used=User.api_used + count)
+        )
         await self.session.commit()
-        return True
+        return result.rowcount > 0
+
+
+async def run_session_reaper(interval: Optional[int] = None) -> None:
+    """
+    周期性清理过期与已失效的会话（后台任务，随应用生命周期启动与取消）
+
+    Args:
+        interval: 清理间隔（秒），默认读取配置 session_reap_interval
+    """
+    interval = interval or get_config().session_reap_interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_scope() as session:
+                removed = await AuthService(session).cleanup_expired_sessions()
+            if removed:
+                logger.info(f"Reaped {removed} stale user sessions")
+        except Exception as e:
+            logger.warning(f"Session reaper failed: {e}")
@@ -3,15 +3,28 @@ Redis 缓存服务
 
 提供基于 Redis 的分布式缓存功能，支持：
 - 缓存存储和读取
+- 进程内 L1 短时缓存，热点键不经过网络（或启用 RESP3 客户端缓存，由服务端推送失效）
+- 异步接口（aget / aset_if_absent），协程中不阻塞事件循环
+- 请求内读合并（coalesce_cache），并发的缓存读取合并为一次 MGET
 - 缓存失效策略
 - 连接失败时的降级处理
 """
-import json
+import asyncio
+import inspect
+import threading
 import time
-from typing import Any, Optional, Callable
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Callable, Tuple
 from functools import wraps
+from types import MappingProxyType
 
+import msgspec
 import redis
+import redis.asyncio
 from redis import RedisError
 
 from app.config import get_config
@@ -19,6 +32,65 @@ from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 按模式删除时每次 SCAN 的提示数量与每条 UNLINK 的键数
+DELETE_SCAN_COUNT = 1000
+DELETE_SCAN_BATCH = 500
+
+# 连接健康检查（PING）的最小间隔（秒）
+PING_INTERVAL = 30.0
+
+# 进程内 L1 缓存容量与过期时间（秒）；多进程间最多读到 L1_CACHE_TTL 秒前的值
+L1_CACHE_SIZE = 4096
+L1_CACHE_TTL = 5.0
+
+
+def _enc_hook(obj: Any) -> Any:
+    """msgpack 不支持的类型：NumPy 标量转为 Python 数值，其余转为字符串（与原 json default=str 一致）"""
+    item = getattr(obj, "item", None)
+    if callable(item):
+        return item()
+    return str(obj)
+
+# 缓存值以 msgpack 编码，比 JSON 编解码更快、体积更小
+_encoder = msgspec.msgpack.Encoder(enc_hook=_enc_hook)
+_decoder = msgspec.msgpack.Decoder()
+
+# 未命中哨兵，与缓存的 None 值区分
+_MISS = object()
+
+# 编码后超过该字节数的值压缩存储；首字节标记存储格式
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 3
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+# 调用方已序列化的字节（如响应体）原样存储，读取时原样返回
+_BYTES = b"\x02"
+
+
+def _pack(value: Any) -> bytes:
+    """编码缓存值，大值以 zlib 压缩（K线、技术分析结果等）；字节值跳过编码"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _BYTES + bytes(value)
+    payload = _encoder.encode(value)
+    if len(payload) > COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(payload, COMPRESS_LEVEL)
+    return _RAW + payload
+
+
+def _unpack(data: bytes) -> Any:
+    """解码 _pack 的结果，格式不符时抛出 msgspec.DecodeError"""
+    header, payload = data[:1], memoryview(data)[1:]
+    if header == _RAW:
+        return _decoder.decode(payload)
+    if header == _BYTES:
+        return bytes(payload)
+    if header == _ZLIB:
+        try:
+            return _decoder.decode(zlib.decompress(payload))
+        except zlib.error as e:
+            raise msgspec.DecodeError(f"Invalid compressed cache payload: {e}") from e
+    raise msgspec.DecodeError(f"Unknown cache payload header: {header!r}")
+
 
 class RedisCache:
     """Redis 缓存类"""
@@ -27,21 +99,46 @@ class RedisCache:
         """初始化 Redis 缓存"""
         self._redis_client: Optional[redis.Redis] = None
         self._connected = False
+        self._last_ping = 0.0
+        # 缓存键 -> (过期时刻, 已解码的值)，按最近使用排序
+        self._l1: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._l1_lock = threading.Lock()
+        # 同步读取是否经过 L1（开启客户端缓存时同步客户端自带本地缓存，无需叠加）
+        self._sync_l1 = True
+        # 异步客户端首次在协程中使用时创建
+        self._aio_client: Optional[redis.asyncio.Redis] = None
         self._connect()
 
     def _connect(self) -> None:
         """连接 Redis"""
         try:
             config = get_config()
-            self._redis_client = redis.from_url(
+            tracking_kwargs = {}
+            if config.redis_client_tracking:
+                # 服务端记录本客户端读过的键，键被修改时推送失效消息，
+                # redis-py 据此清除本地缓存的响应，多进程间保持一致；
+                # redis.cache 需 redis-py >= 5.1，仅在开启时导入
+                from redis.cache import CacheConfig
+
+                tracking_kwargs = {"protocol": 3, "cache_config": CacheConfig(max_size=L1_CACHE_SIZE)}
+            # 有界阻塞连接池：连接数封顶，耗尽时等待空闲连接而不是继续新建
+            pool = redis.BlockingConnectionPool.from_url(
                 config.redis_url,
-                decode_responses=True,
+                max_connections=config.redis_cache_max_connections,
+                timeout=config.redis_cache_pool_timeout,
+                decode_responses=False,
                 socket_connect_timeout=5,
-                socket_timeout=5
+                socket_timeout=5,
+                **tracking_kwargs
             )
+            # 客户端缓存只在同步连接池上启用：同步读取由其保证一致，不再叠加 L1；
+            # 异步客户端没有本地缓存，aget/amget 仍使用按时间过期的 L1
+            self._sync_l1 = not config.redis_client_tracking
+            self._redis_client = redis.Redis(connection_pool=pool)
             # 测试连接
             self._redis_client.ping()
             self._connected = True
+            self._last_ping = time.monotonic()
             logger.info("Redis connection established")
         except Exception as e:
             self._connected = False
@@ -49,41 +146,123 @@ class RedisCache:
             logger.warning(f"Redis connection failed, using fallback cache: {e}")
 
     def is_connected(self) -> bool:
-        """检查 Redis 是否连接"""
-        if not self._connected or self._redis_client is None:
+        """
+        检查 Redis 是否连接
+
+        距上次 PING 不足 PING_INTERVAL 时直接返回上次结果，缓存操作不再每次多一次往返；
+        命令执行失败会将状态置为断开，间隔到期后重新 PING 恢复。
+        """
+        if self._redis_client is None:
             return False
+
+        now = time.monotonic()
+        if now - self._last_ping < PING_INTERVAL:
+            return self._connected
+
+        self._last_ping = now
         try:
             self._redis_client.ping()
-            return True
+            self._connected = True
         except Exception:
             self._connected = False
+        return self._connected
+
+    def _get_aio_client(self) -> redis.asyncio.Redis:
+        """获取异步客户端，连接池上限与等待超时与同步客户端一致"""
+        if self._aio_client is None:
+            config = get_config()
+            pool = redis.asyncio.BlockingConnectionPool.from_url(
+                config.redis_url,
+                max_connections=config.redis_cache_max_connections,
+                timeout=config.redis_cache_pool_timeout,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5
+            )
+            self._aio_client = redis.asyncio.Redis(connection_pool=pool)
+        return self._aio_client
+
+    async def ais_connected(self) -> bool:
+        """is_connected 的异步版本，到期的健康检查以异步 PING 执行"""
+        if self._redis_client is None:
             return False
 
-    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        if now - self._last_ping < PING_INTERVAL:
+            return self._connected
+
+        self._last_ping = now
+        try:
+            await self._get_aio_client().ping()
+            self._connected = True
+        except Exception:
+            self._connected = False
+        return self._connected
+
+    def _l1_get(self, key: str) -> Any:
+        """读取 L1 缓存，未命中返回 _MISS（缓存的 None 也算命中），过期条目顺带删除"""
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISS
+            if entry[0] <= time.monotonic():
+                del self._l1[key]
+                return _MISS
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_put(self, key: str, value: Any) -> None:
+        """写入 L1 缓存，超出容量时淘汰最久未使用的条目"""
+        with self._l1_lock:
+            self._l1[key] = (time.monotonic() + L1_CACHE_TTL, value)
+            self._l1.move_to_end(key)
+            if len(self._l1) > L1_CACHE_SIZE:
+                self._l1.popitem(last=False)
+
+    def _l1_discard(self, keys: Iterable[str]) -> None:
+        """从 L1 缓存移除指定键"""
+        with self._l1_lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def get(self, key: str, default: Any = None) -> Any:
         """
         获取缓存值
 
+        先查进程内 L1 缓存，未命中再读 Redis 并回填 L1（开启客户端缓存时不经过 L1）。
+
         Args:
             key: 缓存键
+            default: 未命中时的返回值；传入哨兵可区分未命中与缓存的 None
 
         Returns:
-            缓存值，如果不存在或过期返回 None
+            缓存值，如果不存在或过期返回 default
         """
+        if self._sync_l1:
+            value = self._l1_get(key)
+            if value is not _MISS:
+                return value
+
         if not self.is_connected():
-            return None
+            return default
 
         try:
             value = self._redis_client.get(key)
             if value is not None:
                 logger.debug(f"Redis cache hit: {key}")
-                return json.loads(value)
-            return None
+                decoded = _unpack(value)
+                if self._sync_l1:
+                    self._l1_put(key, decoded)
+                return decoded
+            return default
         except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis get error: {e}")
-            return None
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON decode error: {e}")
-            return None
+            return default
+        except msgspec.DecodeError as e:
+            # 含升级前写入的旧格式值，按未命中处理，随后被新值覆盖
+            logger.warning(f"Msgpack decode error: {e}")
+            return default
 
     def set(self, key: str, value: Any, ttl: int = 300) -> bool:
         """
@@ -97,19 +276,253 @@ class RedisCache:
         Returns:
             是否设置成功
         """
+        # 下次读取时从 Redis 回填，L1 中保存的始终是编解码后的值
+        self._l1_discard((key,))
         if not self.is_connected():
             return False
 
         try:
-            serialized = json.dumps(value, default=str)
-            self._redis_client.setex(key, ttl, serialized)
+            self._redis_client.setex(key, ttl, _pack(value))
             logger.debug(f"Redis cache set: {key} (TTL: {ttl}s)")
             return True
         except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis set error: {e}")
+            return False
+        except (TypeError, ValueError, msgspec.EncodeError) as e:
+            logger.warning(f"Msgpack encode error: {e}")
+            return False
+
+    def set_if_absent(self, key: str, value: Any, ttl: int = 300, default: Any = None) -> Any:
+        """
+        键不存在时写入，已存在时返回现有值（一条 SET ... NX GET，需 Redis 7.0+）
+
+        并发回源时先写入者胜出，其余调用方拿到同一份值，不会互相覆盖。
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒）
+            default: 写入成功、Redis 不可用或出错时的返回值
+
+        Returns:
+            键已存在时返回其当前值，否则返回 default
+        """
+        self._l1_discard((key,))
+        if not self.is_connected():
+            return default
+
+        try:
+            previous = self._redis_client.set(key, _pack(value), ex=ttl, nx=True, get=True)
+            if previous is None:
+                logger.debug(f"Redis cache set: {key} (TTL: {ttl}s)")
+                return default
+            return _unpack(previous)
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis set error: {e}")
+            return default
+        except (TypeError, ValueError, msgspec.EncodeError, msgspec.DecodeError) as e:
+            logger.warning(f"Msgpack error: {e}")
+            return default
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        """
+        异步获取缓存值（语义同 get）
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值；传入哨兵可区分未命中与缓存的 None
+
+        Returns:
+            缓存值，如果不存在或过期返回 default
+        """
+        value = self._l1_get(key)
+        if value is not _MISS:
+            return value
+
+        if not await self.ais_connected():
+            return default
+
+        try:
+            value = await self._get_aio_client().get(key)
+            if value is not None:
+                logger.debug(f"Redis cache hit: {key}")
+                decoded = _unpack(value)
+                self._l1_put(key, decoded)
+                return decoded
+            return default
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis get error: {e}")
+            return default
+        except msgspec.DecodeError as e:
+            logger.warning(f"Msgpack decode error: {e}")
+            return default
+
+    async def aset_if_absent(self, key: str, value: Any, ttl: int = 300, default: Any = None) -> Any:
+        """
+        异步版本的 set_if_absent
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒）
+            default: 写入成功、Redis 不可用或出错时的返回值
+
+        Returns:
+            键已存在时返回其当前值，否则返回 default
+        """
+        self._l1_discard((key,))
+        if not await self.ais_connected():
+            return default
+
+        try:
+            previous = await self._get_aio_client().set(
+                key, _pack(value), ex=ttl, nx=True, get=True
+            )
+            if previous is None:
+                logger.debug(f"Redis cache set: {key} (TTL: {ttl}s)")
+                return default
+            return _unpack(previous)
+        except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis set error: {e}")
+            return default
+        except (TypeError, ValueError, msgspec.EncodeError, msgspec.DecodeError) as e:
+            logger.warning(f"Msgpack error: {e}")
+            return default
+
+    async def amget(self, keys: List[str], default: Any = None) -> List[Any]:
+        """
+        异步批量获取缓存值：先查 L1，其余键一次 MGET 并回填 L1
+
+        Args:
+            keys: 缓存键列表
+            default: 未命中位置的值
+
+        Returns:
+            与 keys 顺序一致的缓存值列表
+        """
+        values = [self._l1_get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is _MISS]
+        for i in missing:
+            values[i] = default
+        if not missing or not await self.ais_connected():
+            return values
+
+        try:
+            raw = await self._get_aio_client().mget([keys[i] for i in missing])
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis mget error: {e}")
+            return values
+
+        for i, value in zip(missing, raw):
+            if value is None:
+                continue
+            try:
+                values[i] = _unpack(value)
+            except msgspec.DecodeError as e:
+                logger.warning(f"Msgpack decode error for {keys[i]}: {e}")
+                continue
+            self._l1_put(keys[i], values[i])
+        return values
+
+    async def amset(self, items: Dict[str, Any], ttl: int = 300) -> bool:
+        """
+        异步批量设置缓存值（SETEX 经异步客户端的同一管道一次发送）
+
+        Args:
+            items: 缓存键到缓存值的映射
+            ttl: 过期时间（秒）
+
+        Returns:
+            是否设置成功
+        """
+        if not items:
+            return True
+        self._l1_discard(items)
+        if not await self.ais_connected():
+            return False
+
+        try:
+            pipe = self._get_aio_client().pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, ttl, _pack(value))
+            await pipe.execute()
+            logger.debug(f"Redis cache mset: {len(items)} keys (TTL: {ttl}s)")
+            return True
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis mset error: {e}")
+            return False
+        except (TypeError, ValueError, msgspec.EncodeError) as e:
+            logger.warning(f"Msgpack encode error: {e}")
+            return False
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        批量获取缓存值（一次 MGET）
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            与 keys 顺序一致的缓存值列表，不存在、过期或无法解码的位置为 None
+        """
+        if not keys or not self.is_connected():
+            return [None] * len(keys)
+
+        try:
+            raw = self._redis_client.mget(keys)
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis mget error: {e}")
+            return [None] * len(keys)
+
+        values: List[Optional[Any]] = []
+        for key, value in zip(keys, raw):
+            if value is None:
+                values.append(None)
+                continue
+            try:
+                values.append(_unpack(value))
+            except msgspec.DecodeError as e:
+                logger.warning(f"Msgpack decode error for {key}: {e}")
+                values.append(None)
+        return values
+
+    def mset(self, items: Dict[str, Any], ttl: int = 300) -> bool:
+        """
+        批量设置缓存值（SETEX 经同一管道一次发送）
+
+        Args:
+            items: 缓存键到缓存值的映射
+            ttl: 过期时间（秒）
+
+        Returns:
+            是否设置成功
+        """
+        if not items:
+            return True
+        self._l1_discard(items)
+        if not self.is_connected():
+            return False
+
+        try:
+            pipe = self._redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, ttl, _pack(value))
+            pipe.execute()
+            logger.debug(f"Redis cache mset: {len(items)} keys (TTL: {ttl}s)")
+            return True
+        except RedisError as e:
+            self._connected = False
+            logger.warning(f"Redis mset error: {e}")
             return False
-        except (TypeError, ValueError) as e:
-            logger.warning(f"JSON encode error: {e}")
+        except (TypeError, ValueError, msgspec.EncodeError) as e:
+            logger.warning(f"Msgpack encode error: {e}")
             return False
 
     def delete(self, key: str) -> bool:
@@ -122,6 +535,7 @@ class RedisCache:
         Returns:
             是否删除成功
         """
+        self._l1_discard((key,))
         if not self.is_connected():
             return False
 
@@ -130,6 +544,7 @@ class RedisCache:
             logger.debug(f"Redis cache deleted: {key}")
             return True
         except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis delete error: {e}")
             return False
 
@@ -137,28 +552,48 @@ class RedisCache:
         """
         根据模式删除缓存
 
+        以 SCAN 增量遍历，期间其他命令可穿插执行；删除过程不是原子的，
+        遍历期间新写入的匹配键可能保留（KEYS + DEL 同样不保证）。
+
         Args:
             pattern: 匹配模式（如 "quote:*"）
 
         Returns:
             删除的键数量
         """
+        # Redis 的 glob 模式与 fnmatch 语义一致
+        with self._l1_lock:
+            stale = [key for key in self._l1 if fnmatchcase(key, pattern)]
+        self._l1_discard(stale)
         if not self.is_connected():
             return 0
 
         try:
-            keys = self._redis_client.keys(pattern)
-            if keys:
-                deleted = self._redis_client.delete(*keys)
+            # SCAN 增量遍历代替阻塞的 KEYS，UNLINK 在服务端异步释放内存；
+            # 每批一条 UNLINK，全部批次经同一管道一次发送
+            pipe = self._redis_client.pipeline(transaction=False)
+            batch = []
+            for key in self._redis_client.scan_iter(match=pattern, count=DELETE_SCAN_COUNT):
+                batch.append(key)
+                if len(batch) >= DELETE_SCAN_BATCH:
+                    pipe.unlink(*batch)
+                    batch = []
+            if batch:
+                pipe.unlink(*batch)
+
+            deleted = sum(pipe.execute())
+            if deleted:
                 logger.info(f"Redis cache cleared: {pattern} ({deleted} keys)")
-                return deleted
-            return 0
+            return deleted
         except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis delete pattern error: {e}")
             return 0
 
     def clear_all(self) -> bool:
         """清空所有缓存"""
+        with self._l1_lock:
+            self._l1.clear()
         if not self.is_connected():
             return False
 
@@ -167,6 +602,7 @@ class RedisCache:
             logger.info("Redis cache cleared: all")
             return True
         except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis flushdb error: {e}")
             return False
 
@@ -186,33 +622,189 @@ class RedisCache:
         try:
             return self._redis_client.ttl(key)
         except RedisError as e:
+            self._connected = False
             logger.warning(f"Redis ttl error: {e}")
             return -2
 
 
 # 全局缓存实例
 _cache: Optional[RedisCache] = None
+_cache_lock = threading.Lock()
 
 
 def get_cache() -> RedisCache:
-    """获取全局缓存实例"""
+    """
+    获取全局缓存实例
+
+    已创建时无锁返回；首次创建在锁内双重检查，多线程并发调用也只建立一个实例与连接池
+    （lru_cache 不阻止并发的首次调用各自执行一次）。
+    """
     global _cache
-    if _cache is None:
-        _cache = RedisCache()
-    return _cache
+    cache = _cache
+    if cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RedisCache()
+            cache = _cache
+    return cache
 
 
 def reset_cache() -> None:
     """重置缓存实例（用于测试）"""
     global _cache
-    _cache = None
+    with _cache_lock:
+        _cache = None
 
 
 # ============================================
 # 缓存装饰器
 # ============================================
 
-def cached(key_prefix: str, ttl: int = 300, get_key_params: bool = True):
+class _CoalescingReader:
+    """
+    请求内缓存读合并器
+
+    同一轮事件循环中登记的键在下一轮一次 amget 取回，相同键共享一个 Future。
+    只有并发发起的读取（如 asyncio.gather）能被合并，逐个 await 的循环仍是逐次往返。
+    """
+
+    def __init__(self, cache: RedisCache):
+        self._cache = cache
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._scheduled = False
+
+    def get(self, key: str) -> Awaitable[Any]:
+        """登记待读取的键，返回结果（未命中为 _MISS）"""
+        loop = asyncio.get_running_loop()
+        future = self._pending.get(key)
+        if future is None:
+            future = loop.create_future()
+            self._pending[key] = future
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._start_flush)
+        # 某个调用方被取消时不影响共享同一 Future 的其他调用方
+        return asyncio.shield(future)
+
+    def _start_flush(self) -> None:
+        self._scheduled = False
+        pending, self._pending = self._pending, {}
+        asyncio.ensure_future(self._flush(pending))
+
+    async def _flush(self, pending: Dict[str, asyncio.Future]) -> None:
+        try:
+            values = await self._cache.amget(list(pending), _MISS)
+        except Exception as e:
+            logger.warning(f"Coalesced cache read failed: {e}")
+            values = [_MISS] * len(pending)
+        for future, value in zip(pending.values(), values):
+            if not future.done():
+                future.set_result(value)
+
+
+# 当前上下文的读合并器（coalesce_cache 内有效，子任务继承）
+_coalescer: ContextVar[Optional[_CoalescingReader]] = ContextVar("cache_coalescer", default=None)
+
+
+@asynccontextmanager
+async def coalesce_cache() -> AsyncIterator[None]:
+    """
+    在上下文内合并 @cached 异步函数的缓存读取
+
+    Example:
+        async with coalesce_cache():
+            quotes = await asyncio.gather(*(get_stock_quote(code) for code in codes))
+    """
+    token = _coalescer.set(_CoalescingReader(get_cache()))
+    try:
+        yield
+    finally:
+        _coalescer.reset(token)
+
+
+# 参与生成缓存键的参数类型
+_KEY_TYPES = (str, int, float)
+
+
+def _make_key_builder(key_prefix: str, get_key_params: bool) -> Callable[..., str]:
+    """
+    在装饰时生成通用缓存键构造函数
+
+    键格式保持为 前缀:位置参数:名称=关键字参数，按前缀失效（invalidate_cache）不受影响；
+    不带参数的键直接返回常量，无关键字参数时跳过排序。
+
+    Args:
+        key_prefix: 缓存键前缀
+        get_key_params: 是否从函数参数生成缓存键
+
+    Returns:
+        以被装饰函数的实参调用、返回缓存键的函数
+    """
+    if not get_key_params:
+        return lambda *args, **kwargs: key_prefix
+
+    def build(*args, **kwargs) -> str:
+        # 跳过 self/cls 参数
+        if args and callable(args[0]):
+            args = args[1:]
+        parts = [key_prefix]
+        parts.extend(str(arg) for arg in args if isinstance(arg, _KEY_TYPES))
+        if kwargs:
+            parts.extend(f"{k}={v}" for k, v in sorted(kwargs.items()) if isinstance(v, _KEY_TYPES))
+        return ":".join(parts)
+
+    return build
+
+
+def _compile_key_builder(func: Callable, key_prefix: str) -> Optional[Callable[..., str]]:
+    """
+    按函数签名生成专用的缓存键构造函数
+
+    参数（self/cls 除外）全部标注为 str / int / float 时，生成与原函数同签名、
+    直接返回 f"前缀:{参数1}:{参数2}" 的函数，调用时无循环与类型判断；
+    无论实参按位置还是按名称传入，键均按签名顺序拼接。
+
+    Args:
+        func: 被装饰函数
+        key_prefix: 缓存键前缀
+
+    Returns:
+        专用构造函数，签名不满足条件时返回 None（使用通用构造函数）
+    """
+    try:
+        signature = inspect.signature(func, eval_str=True)
+    except (NameError, TypeError, ValueError):
+        return None
+
+    params = list(signature.parameters.values())
+    if params and params[0].name in ("self", "cls") and params[0].annotation is inspect.Parameter.empty:
+        skipped, params = params[:1], params[1:]
+    else:
+        skipped = []
+
+    namespace: Dict[str, Any] = {"__key_prefix": key_prefix}
+    sources = [p.name for p in skipped]
+    for i, param in enumerate(params):
+        if param.kind not in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY):
+            return None
+        if param.annotation not in _KEY_TYPES or param.name.startswith("__"):
+            return None
+        if param.kind is inspect.Parameter.KEYWORD_ONLY and "*" not in sources:
+            sources.append("*")
+        if param.default is inspect.Parameter.empty:
+            sources.append(param.name)
+        else:
+            namespace[f"__default_{i}"] = param.default
+            sources.append(f"{param.name}=__default_{i}")
+
+    fields = "".join(f":{{{param.name}}}" for param in params)
+    source = f"def __key({', '.join(sources)}):\n    return f\"{{__key_prefix}}{fields}\"\n"
+    # 源码只含签名中的合法标识符，前缀与默认值经命名空间传入
+    exec(source, namespace)
+    return namespace["__key"]
+
+
+def cached(key_prefix: str, ttl: int = 300, get_key_params: bool = True, cache_none: bool = False):
     """
     缓存装饰器
 
@@ -220,6 +812,7 @@ def cached(key_prefix: str, ttl: int = 300, get_key_params: bool = True):
         key_prefix: 缓存键前缀
         ttl: 过期时间（秒）
         get_key_params: 是否从函数参数生成缓存键
+        cache_none: 是否缓存返回的 None；默认不缓存，以免把上游失败（多数服务以 None 表示）缓存下来
 
     Example:
         @cached("quote", ttl=30)
@@ -227,76 +820,122 @@ def cached(key_prefix: str, ttl: int = 300, get_key_params: bool = True):
             ...
     """
     def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # 生成缓存键
-            if get_key_params:
-                # 从参数生成缓存键
-                key_parts = [key_prefix]
-                # 跳过 self/cls 参数
-                start_idx = 1 if len(args) > 0 and callable(args[0]) else 0
-                for arg in args[start_idx:]:
-                    if isinstance(arg, (str, int, float)):
-                        key_parts.append(str(arg))
-                for k, v in sorted(kwargs.items()):
-                    if isinstance(v, (str, int, float)):
-                        key_parts.append(f"{k}={v}")
-                cache_key = ":".join(key_parts)
-            else:
-                cache_key = key_prefix
+        build_key = (get_key_params and _compile_key_builder(func, key_prefix)) or _make_key_builder(
+            key_prefix, get_key_params
+        )
 
-            # 尝试从缓存获取
-            cache = get_cache()
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                logger.info(f"Cache hit: {cache_key}")
-                return cached_value
-
-            # 执行函数
-            result = await func(*args, **kwargs)
-
-            # 存储到缓存
-            if result is not None:
-                cache.set(cache_key, result, ttl)
+        # 装饰时确定函数类型，只生成所需的一种包装器
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # 尝试从缓存获取
+                cache_key = build_key(*args, **kwargs)
+                cache = get_cache()
+                coalescer = _coalescer.get()
+                if coalescer is not None:
+                    cached_value = await coalescer.get(cache_key)
+                else:
+                    cached_value = await cache.aget(cache_key, _MISS)
+                if cached_value is not _MISS:
+                    logger.debug(f"Cache hit: {cache_key}")
+                    return cached_value
+
+                # 执行函数并存储到缓存；并发回源时以先写入的值为准
+                result = await func(*args, **kwargs)
+                if result is not None or cache_none:
+                    existing = await cache.aset_if_absent(cache_key, result, ttl, _MISS)
+                    if existing is not _MISS:
+                        return existing
+                return result
 
-            return result
+            return async_wrapper
 
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            # 生成缓存键
-            if get_key_params:
-                key_parts = [key_prefix]
-                start_idx = 1 if len(args) > 0 and callable(args[0]) else 0
-                for arg in args[start_idx:]:
-                    if isinstance(arg, (str, int, float)):
-                        key_parts.append(str(arg))
-                for k, v in sorted(kwargs.items()):
-                    if isinstance(v, (str, int, float)):
-                        key_parts.append(f"{k}={v}")
-                cache_key = ":".join(key_parts)
-            else:
-                cache_key = key_prefix
-
             # 尝试从缓存获取
+            cache_key = build_key(*args, **kwargs)
             cache = get_cache()
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                logger.info(f"Cache hit: {cache_key}")
+            cached_value = cache.get(cache_key, _MISS)
+            if cached_value is not _MISS:
+                logger.debug(f"Cache hit: {cache_key}")
                 return cached_value
 
-            # 执行函数
+            # 执行函数并存储到缓存；并发回源时以先写入的值为准
             result = func(*args, **kwargs)
+            if result is not None or cache_none:
+                existing = cache.set_if_absent(cache_key, result, ttl, _MISS)
+                if existing is not _MISS:
+                    return existing
+            return result
+
+        return sync_wrapper
 
-            # 存储到缓存
-            if result is not None:
-                cache.set(cache_key, result, ttl)
+    return decorator
 
-            return result
 
-        # 返回正确的包装器
-        import asyncio
+def cached_batch(key_prefix: str, ttl: int = 300):
+    """
+    批量缓存装饰器
+
+    被装饰函数的第一个参数（跳过 self/cls）为键列表，返回 {键: 值} 字典。
+    一次 MGET 取出已缓存的键，只将未命中的键传给原函数，结果一次管道写回。
+
+    Args:
+        key_prefix: 缓存键前缀
+        ttl: 过期时间（秒）
+
+    Example:
+        @cached_batch("quote", ttl=30)
+        async def get_stock_quotes(codes: List[str]) -> Dict[str, dict]:
+            ...
+    """
+    def decorator(func: Callable) -> Callable:
+        def split_args(args):
+            # 跳过 self/cls 参数，与 cached 的判断一致
+            start_idx = 1 if len(args) > 0 and callable(args[0]) else 0
+            return args[:start_idx], list(args[start_idx]), args[start_idx + 1:]
+
+        def cache_keys(keys: List[str]) -> List[str]:
+            return [f"{key_prefix}:{key}" for key in keys]
+
+        def partition(keys: List[str], values: List[Any]):
+            hits = {key: value for key, value in zip(keys, values) if value is not None}
+            misses = [key for key in keys if key not in hits]
+            if hits:
+                logger.debug(f"Cache hit: {key_prefix} ({len(hits)}/{len(keys)} keys)")
+            return hits, misses
+
+        def to_store(fetched: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            return {key: value for key, value in (fetched or {}).items() if value is not None}
+
         if asyncio.iscoroutinefunction(func):
+            # 异步路径全程使用异步客户端，不在事件循环中执行阻塞的 Redis 调用
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                head, keys, tail = split_args(args)
+                keys = list(dict.fromkeys(keys))
+                cache = get_cache()
+                hits, misses = partition(keys, await cache.amget(cache_keys(keys)))
+                if not misses:
+                    return hits
+                fetched = to_store(await func(*head, misses, *tail, **kwargs))
+                await cache.amset(dict(zip(cache_keys(list(fetched)), fetched.values())), ttl)
+                return {**hits, **fetched}
+
             return async_wrapper
+
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            head, keys, tail = split_args(args)
+            keys = list(dict.fromkeys(keys))
+            cache = get_cache()
+            hits, misses = partition(keys, cache.mget(cache_keys(keys)))
+            if not misses:
+                return hits
+            fetched = to_store(func(*head, misses, *tail, **kwargs))
+            cache.mset(dict(zip(cache_keys(list(fetched)), fetched.values())), ttl)
+            return {**hits, **fetched}
+
         return sync_wrapper
 
     return decorator
@@ -314,32 +953,28 @@ def invalidate_cache(prefix: str):
         async def update_stock_quote(code: str):
             ...
     """
-    def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            result = await func(*args, **kwargs)
+    pattern = f"{prefix}:*"
 
-            # 清除缓存
-            cache = get_cache()
-            cache.delete_pattern(f"{prefix}:*")
-            logger.info(f"Cache invalidated: {prefix}:*")
+    def invalidate() -> None:
+        get_cache().delete_pattern(pattern)
+        logger.info(f"Cache invalidated: {pattern}")
 
-            return result
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                invalidate()
+                return result
+
+            return async_wrapper
 
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
             result = func(*args, **kwargs)
-
-            # 清除缓存
-            cache = get_cache()
-            cache.delete_pattern(f"{prefix}:*")
-            logger.info(f"Cache invalidated: {prefix}:*")
-
+            invalidate()
             return result
 
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
         return sync_wrapper
 
     return decorator
@@ -349,8 +984,11 @@ def invalidate_cache(prefix: str):
 # 缓存配置常量
 # ============================================
 
+# 未配置类型的默认缓存 TTL（秒）
+DEFAULT_CACHE_TTL = 300
+
 # 缓存 TTL 配置（秒）
-CACHE_TTL = {
+_CACHE_TTL = {
     "quote": 30,        # 实时行情 - 30秒
     "kline": 300,       # K线数据 - 5分钟
     "technical": 900,   # 技术分析 - 15分钟
@@ -360,7 +998,13 @@ CACHE_TTL = {
     "stock_info": 300,  # 股票信息 - 5分钟
 }
 
+# 对外只读，防止运行期被修改
+CACHE_TTL = MappingProxyType(_CACHE_TTL)
+
+# 预先绑定底层字典的 get，查询时少一次属性查找与代理转发
+_cache_ttl_get = _CACHE_TTL.get
+
 
 def get_cache_ttl(cache_type: str) -> int:
     """获取指定类型的缓存 TTL"""
-    return CACHE_TTL.get(cache_type, 300)
+    return _cache_ttl_get(cache_type, DEFAULT_CACHE_TTL)
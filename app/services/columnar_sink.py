@@ -0,0 +1,209 @@
+"""
+列式分析存储模块
+
+将行情与K线（OHLCV）镜像为 Parquet 文件，通过 DuckDB 做列式分析扫描：
+- 写入缓冲，按 数据集/股票代码/年份 分区批量落盘（zstd 压缩）
+- DuckDB 视图注册与 SQL 查询
+- 从数据库分块回填
+
+数据库表仍负责 OLTP 写入；全市场指标计算、横截面排序等分析查询改走本模块。
+镜像目前由 backfill 从数据库重建，行情/K线写入路径不会实时追加。
+pyarrow 与 duckdb 为可选依赖，仅在落盘或查询时导入。
+"""
+
+import os
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.config import get_config
+from app.db.database import session_scope
+from app.models.stock import KLineData, Stock, StockQuote
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 数据集名称 -> (模型, 镜像列)；股票代码与年份作为 hive 分区目录，不写入文件
+DATASETS: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    "quotes": (
+        StockQuote,
+        ("trade_date", "open", "high", "low", "close", "volume", "amount", "change_pct", "turnover_rate"),
+    ),
+    "klines": (
+        KLineData,
+        ("period", "trade_date", "open", "high", "low", "close", "volume", "amount", "change_pct", "turnover_rate"),
+    ),
+}
+
+
+class ColumnarSink:
+    """Parquet 列式镜像写入与 DuckDB 查询"""
+
+    def __init__(self, root: Optional[str] = None, flush_rows: Optional[int] = None):
+        """
+        初始化列式存储
+
+        Args:
+            root: Parquet 根目录，默认读取配置 columnar_dir
+            flush_rows: 缓冲达到该行数后自动落盘，默认读取配置 columnar_flush_rows
+        """
+        config = get_config()
+        self.root = root or config.columnar_dir
+        self.flush_rows = flush_rows or config.columnar_flush_rows
+        self._buffers: Dict[Tuple[str, str, int], List[Dict[str, Any]]] = defaultdict(list)
+        self._pending = 0
+        self._conn = None
+        self._views_stale = True
+
+    def append(self, dataset: str, stock_code: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        追加一只股票的行情/K线行到缓冲区
+
+        Args:
+            dataset: 数据集名称（quotes 或 klines）
+            stock_code: 股票代码
+            rows: 行字典，trade_date 须为 date 对象
+        """
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown columnar dataset: {dataset}")
+
+        columns = DATASETS[dataset][1]
+        for row in rows:
+            key = (dataset, stock_code, row["trade_date"].year)
+            self._buffers[key].append({col: row.get(col) for col in columns})
+            self._pending += 1
+
+        if self._pending >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        将缓冲区写出为 Parquet 文件
+
+        每个分区写一个新的 part 文件，已有文件不做改写。
+
+        Returns:
+            写出的行数
+        """
+        if not self._pending:
+            return 0
+
+        written = 0
+        for (dataset, stock_code, year), rows in self._buffers.items():
+            directory = os.path.join(self.root, dataset, f"stock_code={stock_code}", f"year={year}")
+            self._write_table(os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"), rows)
+            written += len(rows)
+
+        self._buffers.clear()
+        self._pending = 0
+        self._views_stale = True
+        logger.info(f"Flushed {written} rows to columnar store {self.root}")
+        return written
+
+    def _write_table(self, path: str, rows: List[Dict[str, Any]]) -> None:
+        """用 pyarrow 写出单个 Parquet 文件"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Please install pyarrow package: pip install pyarrow")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(pa.Table.from_pylist(rows), path, compression="zstd")
+
+    def _connection(self):
+        """获取 DuckDB 连接，并为已有数据的数据集注册视图"""
+        if self._conn is None:
+            try:
+                import duckdb
+            except ImportError:
+                raise ImportError("Please install duckdb package: pip install duckdb")
+            self._conn = duckdb.connect()
+
+        if self._views_stale:
+            for dataset in DATASETS:
+                directory = os.path.join(self.root, dataset)
+                if not os.path.isdir(directory):
+                    continue
+                pattern = os.path.join(directory, "**", "*.parquet").replace("'", "''")
+                # 分区值默认会被自动推断类型，股票代码须固定为 VARCHAR 以保留前导零
+                self._conn.execute(
+                    f"CREATE OR REPLACE VIEW {dataset} AS "
+                    f"SELECT * FROM read_parquet('{pattern}', hive_partitioning = 1, "
+                    f"hive_types = {{'stock_code': VARCHAR, 'year': INTEGER}})"
+                )
+            self._views_stale = False
+
+        return self._conn
+
+    def query(self, sql: str, params: Optional[List[Any]] = None):
+        """
+        在列式镜像上执行分析查询
+
+        可直接引用视图 quotes / klines，分区列为 stock_code 与 year。
+
+        Args:
+            sql: DuckDB SQL
+            params: 位置参数
+
+        Returns:
+            查询结果 DataFrame
+        """
+        return self._connection().execute(sql, params or []).fetchdf()
+
+    async def backfill(self, dataset: str = "quotes", chunk_size: int = 10_000) -> int:
+        """
+        从数据库分块流式读取并回填列式镜像
+
+        Args:
+            dataset: 数据集名称（quotes 或 klines）
+            chunk_size: 每次从服务端游标读取的行数
+
+        Returns:
+            回填的行数
+        """
+        model, columns = DATASETS[dataset]
+        stmt = (
+            select(Stock.code, *(getattr(model, col) for col in columns))
+            .join(Stock, Stock.id == model.stock_id)
+            .execution_options(yield_per=chunk_size)
+        )
+
+        total = 0
+        async with session_scope() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                for row in partition:
+                    self.append(dataset, row.code, (row._mapping,))
+                total += len(partition)
+
+        self.flush()
+        logger.info(f"Backfilled {total} {dataset} rows into columnar store")
+        return total
+
+    def close(self) -> None:
+        """落盘剩余缓冲并关闭 DuckDB 连接"""
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._views_stale = True
+
+
+# 全局列式存储实例
+_columnar_sink: Optional[ColumnarSink] = None
+
+
+def get_columnar_sink() -> ColumnarSink:
+    """
+    获取全局列式存储实例
+
+    Returns:
+        ColumnarSink 实例
+    """
+    global _columnar_sink
+    if _columnar_sink is None:
+        _columnar_sink = ColumnarSink()
+    return _columnar_sink
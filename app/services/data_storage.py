@@ -9,26 +9,136 @@
 - 数据完整性验证
 """
 
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Tuple, Union
 
 from sqlalchemy import select, and_, func, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer_group
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db.database import get_engine, session_scope
-from app.models.stock import Stock, StockQuote, KLineData, StockAnalysis, Base, MarketType
+from app.models.stock import (
+    HEAVY_GROUP,
+    Base,
+    KLineData,
+    KLineIndicators,
+    MarketType,
+    Stock,
+    StockAnalysis,
+    StockQuote,
+    upsert_rows,
+)
+from app.services.indicators import refresh_kline_indicators
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 股票代码 -> ID 缓存容量
+STOCK_ID_CACHE_SIZE = 8192
+
+
+def _to_date(value: Union[str, date, None]) -> Optional[date]:
+    """将 YYYY-MM-DD 或 YYYYMMDD 字符串转换为 date（date 与 None 原样返回）"""
+    if isinstance(value, str):
+        if len(value) == 8 and value.isdigit():
+            return datetime.strptime(value, "%Y%m%d").date()
+        return date.fromisoformat(value)
+    return value
+
+
+# 批量 upsert 的 ON CONFLICT 子句（VALUES 与 COPY 暂存表两条路径共用）
+_STOCK_UPDATE_COLUMNS = (
+    "name", "market", "exchange", "stock_type", "is_listed",
+    "list_date", "industry", "sector", "extra_data",
+)
+_QUOTE_UPDATE_COLUMNS = (
+    "open", "high", "low", "close", "volume", "amount", "change_pct", "change",
+    "turnover_rate", "pe", "pb", "total_market_cap", "float_market_cap",
+)
+_KLINE_UPDATE_COLUMNS = (
+    "open", "high", "low", "close", "volume", "amount", "change_pct", "change",
+    "turnover_rate", "amplitude", "pre_close",
+)
+
+
+def _stock_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """将股票字典整理为 stocks 列（市场、交易所等取默认值）"""
+    return {
+        "code": data.get("code"),
+        "name": data.get("name"),
+        "market": data.get("market", MarketType.SZ.value),
+        "exchange": data.get("exchange", "SZSE"),
+        "stock_type": data.get("stock_type", "A股"),
+        "is_listed": data.get("is_listed", True),
+        "list_date": data.get("list_date"),
+        "industry": data.get("industry"),
+        "sector": data.get("sector"),
+        "extra_data": data.get("extra_data"),
+    }
+
+
+def _quote_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """将行情字典整理为 stock_quotes 列"""
+    return {
+        "stock_id": data.get("stock_id"),
+        "trade_date": _to_date(data.get("trade_date")),
+        **{col: data.get(col) for col in _QUOTE_UPDATE_COLUMNS},
+    }
+
+
+def _kline_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """将K线字典整理为 kline_data 列（period 缺省为 1d）"""
+    return {
+        "stock_id": data.get("stock_id"),
+        "period": data.get("period", "1d"),
+        "trade_date": _to_date(data.get("trade_date")),
+        **{col: data.get(col) for col in _KLINE_UPDATE_COLUMNS},
+    }
+
+
+def _stock_on_conflict(insert_stmt):
+    """股票按 code 冲突时更新基本信息并刷新 updated_at"""
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["code"],
+        set_={
+            **{col: insert_stmt.excluded[col] for col in _STOCK_UPDATE_COLUMNS},
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _quote_on_conflict(insert_stmt):
+    """行情按 (stock_id, trade_date) 冲突时覆盖价格与指标列"""
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["stock_id", "trade_date"],
+        set_={col: insert_stmt.excluded[col] for col in _QUOTE_UPDATE_COLUMNS},
+    )
+
+
+def _kline_on_conflict(insert_stmt):
+    """K线按 (stock_id, period, trade_date) 冲突时覆盖价格列"""
+    return insert_stmt.on_conflict_do_update(
+        index_elements=["stock_id", "period", "trade_date"],
+        set_={col: insert_stmt.excluded[col] for col in _KLINE_UPDATE_COLUMNS},
+    )
+
 
 class DataStorageService:
-    """数据存储服务类"""
+    """
+    数据存储服务类
+
+    写入方法只执行语句、不提交事务，由调用方统一提交：
+    使用 session_scope()（正常退出时提交）或 async with session.begin()，
+    逐条写入时避免每行一次提交。
+    """
 
     def __init__(self):
         """初始化数据存储服务"""
         self.engine = get_engine()
+        # 代码到 ID 的 LRU 缓存：ID 在股票生命周期内不变，入库写行情前解析 stock_id 无需查库
+        self._stock_ids: "OrderedDict[str, int]" = OrderedDict()
 
     async def init_tables(self) -> None:
         """
@@ -48,6 +158,7 @@ class DataStorageService:
         """
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
+        self._stock_ids.clear()
         logger.warning("Database tables dropped")
 
     # ==================== 股票基本信息操作 ====================
@@ -67,7 +178,7 @@ class DataStorageService:
         extra_data: Optional[Dict] = None,
     ) -> Stock:
         """
-        插入股票基本信息
+        插入股票基本信息（不提交事务）
 
         Args:
             session: 数据库会话
@@ -97,7 +208,6 @@ class DataStorageService:
             industry=industry,
             sector=sector,
             extra_data=extra_data,
-            updated_at=datetime.utcnow(),
         ).on_conflict_do_update(
             index_elements=["code"],
             set_={
@@ -110,12 +220,11 @@ class DataStorageService:
                 "industry": industry,
                 "sector": sector,
                 "extra_data": extra_data,
-                "updated_at": datetime.utcnow(),
+                "updated_at": func.now(),
             },
         ).returning(Stock)
 
         result = await session.execute(stmt)
-        await session.commit()
         stock = result.scalar_one()
         logger.debug(f"Stock upserted: {stock.code} - {stock.name}")
         return stock
@@ -126,7 +235,7 @@ class DataStorageService:
         stocks_data: List[Dict[str, Any]],
     ) -> int:
         """
-        批量插入股票信息
+        批量插入股票信息（不提交事务）
 
         Args:
             session: 数据库会话
@@ -138,44 +247,9 @@ class DataStorageService:
         if not stocks_data:
             return 0
 
-        # 准备批量数据
-        now = datetime.utcnow()
-        values = []
-        for data in stocks_data:
-            values.append({
-                "code": data.get("code"),
-                "name": data.get("name"),
-                "market": data.get("market", MarketType.SZ.value),
-                "exchange": data.get("exchange", "SZSE"),
-                "stock_type": data.get("stock_type", "A股"),
-                "is_listed": data.get("is_listed", True),
-                "list_date": data.get("list_date"),
-                "industry": data.get("industry"),
-                "sector": data.get("sector"),
-                "extra_data": data.get("extra_data"),
-                "updated_at": now,
-            })
-
-        # 使用 PostgreSQL upsert
-        insert_stmt = pg_insert(Stock).values(values)
-        stmt = insert_stmt.on_conflict_do_update(
-            index_elements=["code"],
-            set_={
-                "name": insert_stmt.excluded.name,
-                "market": insert_stmt.excluded.market,
-                "exchange": insert_stmt.excluded.exchange,
-                "stock_type": insert_stmt.excluded.stock_type,
-                "is_listed": insert_stmt.excluded.is_listed,
-                "list_date": insert_stmt.excluded.list_date,
-                "industry": insert_stmt.excluded.industry,
-                "sector": insert_stmt.excluded.sector,
-                "extra_data": insert_stmt.excluded.extra_data,
-                "updated_at": insert_stmt.excluded.updated_at,
-            },
-        )
-
-        await session.execute(stmt)
-        await session.commit()
+        # 以生成器逐行整理，不额外构建一份列表
+        rows = (_stock_row(data) for data in stocks_data)
+        await upsert_rows(session, Stock.__table__, rows, _stock_on_conflict, row_count=len(stocks_data))
         logger.info(f"Bulk upserted {len(stocks_data)} stocks")
         return len(stocks_data)
 
@@ -194,10 +268,40 @@ class DataStorageService:
         Returns:
             Stock 对象或 None
         """
-        stmt = select(Stock).where(Stock.code == code)
+        # 详情查询一并取回延迟加载的备注与扩展数据
+        stmt = select(Stock).where(Stock.code == code).options(undefer_group(HEAVY_GROUP))
         result = await session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_stock_id(
+        self,
+        session: AsyncSession,
+        code: str,
+    ) -> Optional[int]:
+        """
+        根据股票代码获取股票 ID（带 LRU 缓存）
+
+        只缓存查询到的已有股票，未找到的代码不缓存，新股入库后即可查到。
+
+        Args:
+            session: 数据库会话
+            code: 股票代码
+
+        Returns:
+            股票 ID 或 None
+        """
+        stock_id = self._stock_ids.get(code)
+        if stock_id is not None:
+            self._stock_ids.move_to_end(code)
+            return stock_id
+
+        stock_id = await session.scalar(select(Stock.id).where(Stock.code == code))
+        if stock_id is not None:
+            self._stock_ids[code] = stock_id
+            if len(self._stock_ids) > STOCK_ID_CACHE_SIZE:
+                self._stock_ids.popitem(last=False)
+        return stock_id
+
     async def get_all_stocks(
         self,
         session: AsyncSession,
@@ -240,7 +344,7 @@ class DataStorageService:
         self,
         session: AsyncSession,
         stock_id: int,
-        trade_date: str,
+        trade_date: Union[str, date],
         open: float,
         high: float,
         low: float,
@@ -256,7 +360,7 @@ class DataStorageService:
         float_market_cap: Optional[float] = None,
     ) -> StockQuote:
         """
-        插入股票行情数据
+        插入股票行情数据（不提交事务）
 
         Args:
             session: 数据库会话
@@ -279,9 +383,9 @@ class DataStorageService:
         Returns:
             StockQuote 对象
         """
-        stmt = pg_insert(StockQuote).values(
+        stmt = _quote_on_conflict(pg_insert(StockQuote).values(
             stock_id=stock_id,
-            trade_date=trade_date,
+            trade_date=_to_date(trade_date),
             open=open,
             high=high,
             low=low,
@@ -295,36 +399,35 @@ class DataStorageService:
             pb=pb,
             total_market_cap=total_market_cap,
             float_market_cap=float_market_cap,
-        ).on_conflict_do_update(
-            index_elements=["stock_id", "trade_date"],
-            set_={
-                "open": open,
-                "high": high,
-                "low": low,
-                "close": close,
-                "volume": volume,
-                "amount": amount,
-                "change_pct": change_pct,
-                "change": change,
-                "turnover_rate": turnover_rate,
-                "pe": pe,
-                "pb": pb,
-                "total_market_cap": total_market_cap,
-                "float_market_cap": float_market_cap,
-            },
-        ).returning(StockQuote)
+        )).returning(StockQuote)
 
         result = await session.execute(stmt)
-        await session.commit()
         return result.scalar_one()
 
+    async def upsert_quote(self, session: AsyncSession, quote: Dict[str, Any]) -> int:
+        """
+        写入单条行情，不带 RETURNING（不提交事务）
+
+        逐条写入且不需要返回对象时使用，省去整行回传。
+
+        Args:
+            session: 数据库会话
+            quote: 行情数据，键同 insert_quotes_bulk
+
+        Returns:
+            受影响的行数
+        """
+        stmt = _quote_on_conflict(pg_insert(StockQuote).values(_quote_row(quote)))
+        result = await session.execute(stmt)
+        return result.rowcount
+
     async def insert_quotes_bulk(
         self,
         session: AsyncSession,
         quotes_data: List[Dict[str, Any]],
     ) -> int:
         """
-        批量插入行情数据
+        批量插入行情数据（不提交事务）
 
         Args:
             session: 数据库会话
@@ -336,48 +439,8 @@ class DataStorageService:
         if not quotes_data:
             return 0
 
-        values = []
-        for data in quotes_data:
-            values.append({
-                "stock_id": data.get("stock_id"),
-                "trade_date": data.get("trade_date"),
-                "open": data.get("open"),
-                "high": data.get("high"),
-                "low": data.get("low"),
-                "close": data.get("close"),
-                "volume": data.get("volume"),
-                "amount": data.get("amount"),
-                "change_pct": data.get("change_pct"),
-                "change": data.get("change"),
-                "turnover_rate": data.get("turnover_rate"),
-                "pe": data.get("pe"),
-                "pb": data.get("pb"),
-                "total_market_cap": data.get("total_market_cap"),
-                "float_market_cap": data.get("float_market_cap"),
-            })
-
-        insert_stmt = pg_insert(StockQuote).values(values)
-        stmt = insert_stmt.on_conflict_do_update(
-            index_elements=["stock_id", "trade_date"],
-            set_={
-                "open": insert_stmt.excluded.open,
-                "high": insert_stmt.excluded.high,
-                "low": insert_stmt.excluded.low,
-                "close": insert_stmt.excluded.close,
-                "volume": insert_stmt.excluded.volume,
-                "amount": insert_stmt.excluded.amount,
-                "change_pct": insert_stmt.excluded.change_pct,
-                "change": insert_stmt.excluded.change,
-                "turnover_rate": insert_stmt.excluded.turnover_rate,
-                "pe": insert_stmt.excluded.pe,
-                "pb": insert_stmt.excluded.pb,
-                "total_market_cap": insert_stmt.excluded.total_market_cap,
-                "float_market_cap": insert_stmt.excluded.float_market_cap,
-            },
-        )
-
-        await session.execute(stmt)
-        await session.commit()
+        rows = (_quote_row(data) for data in quotes_data)
+        await upsert_rows(session, StockQuote.__table__, rows, _quote_on_conflict, row_count=len(quotes_data))
         logger.info(f"Bulk upserted {len(quotes_data)} quotes")
         return len(quotes_data)
 
@@ -385,8 +448,8 @@ class DataStorageService:
         self,
         session: AsyncSession,
         stock_id: int,
-        start_date: Optional[str] = None,
-        end_date: Optional[str] = None,
+        start_date: Optional[Union[str, date]] = None,
+        end_date: Optional[Union[str, date]] = None,
         limit: int = 1000,
     ) -> List[StockQuote]:
         """
@@ -405,9 +468,9 @@ class DataStorageService:
         stmt = select(StockQuote).where(StockQuote.stock_id == stock_id)
 
         if start_date:
-            stmt = stmt.where(StockQuote.trade_date >= start_date)
+            stmt = stmt.where(StockQuote.trade_date >= _to_date(start_date))
         if end_date:
-            stmt = stmt.where(StockQuote.trade_date <= end_date)
+            stmt = stmt.where(StockQuote.trade_date <= _to_date(end_date))
 
         stmt = stmt.order_by(StockQuote.trade_date.desc()).limit(limit)
         result = await session.execute(stmt)
@@ -420,7 +483,7 @@ class DataStorageService:
         session: AsyncSession,
         stock_id: int,
         period: str,
-        trade_date: str,
+        trade_date: Union[str, date],
         open: float,
         high: float,
         low: float,
@@ -434,7 +497,7 @@ class DataStorageService:
         pre_close: Optional[float] = None,
     ) -> KLineData:
         """
-        插入K线数据
+        插入K线数据（不提交事务）
 
         Args:
             session: 数据库会话
@@ -456,10 +519,10 @@ class DataStorageService:
         Returns:
             KLineData 对象
         """
-        stmt = pg_insert(KLineData).values(
+        stmt = _kline_on_conflict(pg_insert(KLineData).values(
             stock_id=stock_id,
             period=period,
-            trade_date=trade_date,
+            trade_date=_to_date(trade_date),
             open=open,
             high=high,
             low=low,
@@ -471,38 +534,41 @@ class DataStorageService:
             turnover_rate=turnover_rate,
             amplitude=amplitude,
             pre_close=pre_close,
-        ).on_conflict_do_update(
-            index_elements=["stock_id", "period", "trade_date"],
-            set_={
-                "open": open,
-                "high": high,
-                "low": low,
-                "close": close,
-                "volume": volume,
-                "amount": amount,
-                "change_pct": change_pct,
-                "change": change,
-                "turnover_rate": turnover_rate,
-                "amplitude": amplitude,
-                "pre_close": pre_close,
-            },
-        ).returning(KLineData)
+        )).returning(KLineData)
 
         result = await session.execute(stmt)
-        await session.commit()
         return result.scalar_one()
 
+    async def upsert_kline(self, session: AsyncSession, kline: Dict[str, Any]) -> int:
+        """
+        写入单条K线，不带 RETURNING（不提交事务）
+
+        逐条写入且不需要返回对象时使用，省去整行回传。
+
+        Args:
+            session: 数据库会话
+            kline: K线数据，键同 insert_klines_bulk
+
+        Returns:
+            受影响的行数
+        """
+        stmt = _kline_on_conflict(pg_insert(KLineData).values(_kline_row(kline)))
+        result = await session.execute(stmt)
+        return result.rowcount
+
     async def insert_klines_bulk(
         self,
         session: AsyncSession,
         klines_data: List[Dict[str, Any]],
+        refresh_indicators: bool = False,
     ) -> int:
         """
-        批量插入K线数据
+        批量插入K线数据（不提交事务）
 
         Args:
             session: 数据库会话
             klines_data: K线数据列表
+            refresh_indicators: 写入后是否重算涉及股票的 kline_indicators
 
         Returns:
             插入/更新的K线数量
@@ -510,45 +576,13 @@ class DataStorageService:
         if not klines_data:
             return 0
 
-        values = []
-        for data in klines_data:
-            values.append({
-                "stock_id": data.get("stock_id"),
-                "period": data.get("period", "1d"),
-                "trade_date": data.get("trade_date"),
-                "open": data.get("open"),
-                "high": data.get("high"),
-                "low": data.get("low"),
-                "close": data.get("close"),
-                "volume": data.get("volume"),
-                "amount": data.get("amount"),
-                "change_pct": data.get("change_pct"),
-                "change": data.get("change"),
-                "turnover_rate": data.get("turnover_rate"),
-                "amplitude": data.get("amplitude"),
-                "pre_close": data.get("pre_close"),
-            })
-
-        insert_stmt = pg_insert(KLineData).values(values)
-        stmt = insert_stmt.on_conflict_do_update(
-            index_elements=["stock_id", "period", "trade_date"],
-            set_={
-                "open": insert_stmt.excluded.open,
-                "high": insert_stmt.excluded.high,
-                "low": insert_stmt.excluded.low,
-                "close": insert_stmt.excluded.close,
-                "volume": insert_stmt.excluded.volume,
-                "amount": insert_stmt.excluded.amount,
-                "change_pct": insert_stmt.excluded.change_pct,
-                "change": insert_stmt.excluded.change,
-                "turnover_rate": insert_stmt.excluded.turnover_rate,
-                "amplitude": insert_stmt.excluded.amplitude,
-                "pre_close": insert_stmt.excluded.pre_close,
-            },
-        )
+        rows = (_kline_row(data) for data in klines_data)
+        await upsert_rows(session, KLineData.__table__, rows, _kline_on_conflict, row_count=len(klines_data))
+
+        if refresh_indicators:
+            for stock_id, period in {(d.get("stock_id"), d.get("period", "1d")) for d in klines_data}:
+                await refresh_kline_indicators(session, stock_id, period)
 
-        await session.execute(stmt)
-        await session.commit()
         logger.info(f"Bulk upserted {len(klines_data)} klines")
         return len(klines_data)
 
@@ -557,8 +591,8 @@ class DataStorageService:
         session: AsyncSession,
         stock_id: int,
         period: str = "1d",
-        start_date: Optional[str] = None,
-        end_date: Optional[str] = None,
+        start_date: Optional[Union[str, date]] = None,
+        end_date: Optional[Union[str, date]] = None,
         limit: int = 1000,
     ) -> List[KLineData]:
         """
@@ -583,21 +617,60 @@ class DataStorageService:
         )
 
         if start_date:
-            stmt = stmt.where(KLineData.trade_date >= start_date)
+            stmt = stmt.where(KLineData.trade_date >= _to_date(start_date))
         if end_date:
-            stmt = stmt.where(KLineData.trade_date <= end_date)
+            stmt = stmt.where(KLineData.trade_date <= _to_date(end_date))
 
         stmt = stmt.order_by(KLineData.trade_date.desc()).limit(limit)
         result = await session.execute(stmt)
         return list(result.scalars().all())
 
+    async def get_kline_indicators(
+        self,
+        session: AsyncSession,
+        stock_id: int,
+        period: str = "1d",
+        start_date: Optional[Union[str, date]] = None,
+        end_date: Optional[Union[str, date]] = None,
+        limit: int = 1000,
+    ) -> List[KLineIndicators]:
+        """
+        获取指定股票的预计算指标
+
+        Args:
+            session: 数据库会话
+            stock_id: 股票 ID
+            period: K线周期
+            start_date: 开始日期
+            end_date: 结束日期
+            limit: 返回数量限制
+
+        Returns:
+            KLineIndicators 列表
+        """
+        stmt = select(KLineIndicators).where(
+            and_(
+                KLineIndicators.stock_id == stock_id,
+                KLineIndicators.period == period,
+            )
+        )
+
+        if start_date:
+            stmt = stmt.where(KLineIndicators.trade_date >= _to_date(start_date))
+        if end_date:
+            stmt = stmt.where(KLineIndicators.trade_date <= _to_date(end_date))
+
+        stmt = stmt.order_by(KLineIndicators.trade_date.desc()).limit(limit)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
     # ==================== 增量更新逻辑 ====================
 
     async def get_latest_quote_date(
         self,
         session: AsyncSession,
         stock_id: int,
-    ) -> Optional[str]:
+    ) -> Optional[date]:
         """
         获取指定股票的最新行情日期
 
@@ -608,12 +681,8 @@ class DataStorageService:
         Returns:
             最新交易日期或 None
         """
-        stmt = (
-            select(StockQuote.trade_date)
-            .where(StockQuote.stock_id == stock_id)
-            .order_by(StockQuote.trade_date.desc())
-            .limit(1)
-        )
+        # MAX 聚合由 ix_stock_quote_stock_date 反向扫描取首个索引项，无需回表
+        stmt = select(func.max(StockQuote.trade_date)).where(StockQuote.stock_id == stock_id)
         result = await session.execute(stmt)
         return result.scalar_one_or_none()
 
@@ -622,7 +691,7 @@ class DataStorageService:
         session: AsyncSession,
         stock_id: int,
         period: str = "1d",
-    ) -> Optional[str]:
+    ) -> Optional[date]:
         """
         获取指定股票的最新K线日期
 
@@ -634,16 +703,9 @@ class DataStorageService:
         Returns:
             最新交易日期或 None
         """
-        stmt = (
-            select(KLineData.trade_date)
-            .where(
-                and_(
-                    KLineData.stock_id == stock_id,
-                    KLineData.period == period,
-                )
-            )
-            .order_by(KLineData.trade_date.desc())
-            .limit(1)
+        # MAX 聚合由 ix_kline_stock_period_date 反向扫描取首个索引项，无需回表
+        stmt = select(func.max(KLineData.trade_date)).where(
+            and_(KLineData.stock_id == stock_id, KLineData.period == period)
         )
         result = await session.execute(stmt)
         return result.scalar_one_or_none()
@@ -0,0 +1,282 @@
+"""
+向量化指标计算模块
+
+基于 NumPy 数组计算 EMA、RSI、ATR 等指标：
+- 递归平滑（EMA / Wilder）使用 numba 编译的循环内核，未安装 numba 时回退到 pandas ewm
+- 其余部分（涨跌分离、真实波幅）为纯 NumPy 向量运算
+- 从数据库一次性读取K线为数组，结果按 (stock_id, period, 最新交易日) 缓存
+- 预计算结果持久化到 kline_indicators 表，供分析与回测直接读取
+"""
+
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import get_engine
+from app.models.stock import KLineData, KLineIndicators, bulk_insert_kline_indicators
+from app.utils._njit import NUMBA_AVAILABLE, njit
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# K线数组列
+KLINE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# 持久化到 kline_indicators 的指标列
+INDICATOR_COLUMNS = ("ema_12", "ema_26", "macd", "rsi_14", "atr_14", "bb_upper_20", "ma_50", "ma_200")
+
+# 指标结果缓存容量（按股票与周期计）
+INDICATOR_CACHE_SIZE = 512
+
+_indicator_cache: "OrderedDict[Tuple[int, str, Optional[date]], Dict[str, np.ndarray]]" = OrderedDict()
+
+
+@njit(cache=True)
+def _ema_loop(values: np.ndarray, alpha: float, first: float) -> np.ndarray:
+    """递归指数平滑：out[0] = first，out[i] = (1 - alpha) * out[i-1] + alpha * values[i]"""
+    out = np.empty(values.shape[0])
+    if values.shape[0] == 0:
+        return out
+    out[0] = first
+    for i in range(1, values.shape[0]):
+        out[i] = (1.0 - alpha) * out[i - 1] + alpha * values[i]
+    return out
+
+
+def smooth(values: np.ndarray, alpha: float, first: Optional[float] = None) -> np.ndarray:
+    """
+    指数平滑（等价于 pandas ewm(alpha=alpha, adjust=False)，可指定初值）
+
+    Args:
+        values: 输入序列
+        alpha: 平滑系数
+        first: 初值，默认取 values[0]
+
+    Returns:
+        平滑后的数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    first = values[0] if first is None else first
+
+    if NUMBA_AVAILABLE:
+        return _ema_loop(values, alpha, float(first))
+
+    seeded = values.copy()
+    seeded[0] = first
+    return pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def ema(close: np.ndarray, window: int) -> np.ndarray:
+    """
+    计算指数移动平均（span 口径，与 technical_analysis.calculate_ema 一致）
+
+    Args:
+        close: 收盘价数组
+        window: 周期
+
+    Returns:
+        EMA 数组
+    """
+    return smooth(close, 2.0 / (window + 1))
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """
+    计算 RSI（EMA 平滑口径，与 technical_analysis.calculate_rsi 一致）
+
+    Args:
+        close: 收盘价数组
+        window: 周期
+
+    Returns:
+        RSI 数组，无波动时为 50
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.size == 0:
+        return close.copy()
+    delta = np.diff(close, prepend=np.nan)
+    delta[0] = 0.0
+
+    alpha = 2.0 / (window + 1)
+    avg_gain = smooth(np.where(delta > 0, delta, 0.0), alpha)
+    avg_loss = smooth(np.where(delta < 0, -delta, 0.0), alpha)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return np.where(np.isnan(result), 50.0, result)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """
+    计算平均真实波幅 ATR（Wilder 平滑）
+
+    Args:
+        high: 最高价数组
+        low: 最低价数组
+        close: 收盘价数组
+        window: 周期
+
+    Returns:
+        ATR 数组
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    if close.size == 0:
+        return close.copy()
+
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return smooth(true_range, 1.0 / window)
+
+
+async def load_kline_arrays(
+    stock_id: int,
+    period: str = "1d",
+    start_date: Optional[date] = None,
+    session: Optional[AsyncSession] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    一次查询读取K线并转换为按日期升序的 NumPy 数组
+
+    Args:
+        stock_id: 股票 ID
+        period: K线周期
+        start_date: 开始日期，默认读取全部
+        session: 数据库会话，传入时在该会话的事务内读取，否则使用独立连接
+
+    Returns:
+        列名到数组的字典（含 trade_date）
+    """
+    stmt = select(KLineData.trade_date, *(getattr(KLineData, col) for col in KLINE_COLUMNS)).where(
+        and_(KLineData.stock_id == stock_id, KLineData.period == period)
+    )
+    if start_date is not None:
+        stmt = stmt.where(KLineData.trade_date >= start_date)
+    stmt = stmt.order_by(KLineData.trade_date)
+
+    if session is not None:
+        df = await session.run_sync(lambda sync_session: pd.read_sql(stmt, sync_session.connection()))
+    else:
+        async with get_engine().connect() as conn:
+            df = await conn.run_sync(lambda sync_conn: pd.read_sql(stmt, sync_conn))
+
+    arrays = {col: df[col].to_numpy(dtype=np.float64) for col in KLINE_COLUMNS}
+    arrays["trade_date"] = df["trade_date"].to_numpy()
+    return arrays
+
+
+def compute_indicators(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    基于K线数组计算常用指标
+
+    Args:
+        arrays: load_kline_arrays 返回的数组字典
+
+    Returns:
+        指标名到数组的字典
+    """
+    close = arrays["close"]
+    close_series = pd.Series(close)
+    ema_12 = ema(close, 12)
+    ema_26 = ema(close, 26)
+
+    # 均线与布林带口径与 technical_analysis 一致（min_periods=1）
+    bb_window = close_series.rolling(window=20, min_periods=1)
+    return {
+        "ema_12": ema_12,
+        "ema_26": ema_26,
+        "macd": ema_12 - ema_26,
+        "rsi_14": rsi(close, 14),
+        "atr_14": atr(arrays["high"], arrays["low"], close, 14),
+        "bb_upper_20": (bb_window.mean() + 2.0 * bb_window.std()).to_numpy(),
+        "ma_50": close_series.rolling(window=50, min_periods=1).mean().to_numpy(),
+        "ma_200": close_series.rolling(window=200, min_periods=1).mean().to_numpy(),
+    }
+
+
+async def get_indicators(stock_id: int, period: str = "1d") -> Dict[str, np.ndarray]:
+    """
+    获取指定股票的指标数组（带缓存）
+
+    先查询最新交易日作为缓存键，新K线写入后自动失效；命中时不再读取整段K线。
+
+    Args:
+        stock_id: 股票 ID
+        period: K线周期
+
+    Returns:
+        指标名到数组的字典，另含 trade_date
+    """
+    latest_stmt = (
+        select(KLineData.trade_date)
+        .where(and_(KLineData.stock_id == stock_id, KLineData.period == period))
+        .order_by(KLineData.trade_date.desc())
+        .limit(1)
+    )
+    async with get_engine().connect() as conn:
+        latest = await conn.scalar(latest_stmt)
+
+    key = (stock_id, period, latest)
+    cached = _indicator_cache.get(key)
+    if cached is not None:
+        _indicator_cache.move_to_end(key)
+        return cached
+
+    arrays = await load_kline_arrays(stock_id, period)
+    result = compute_indicators(arrays)
+    result["trade_date"] = arrays["trade_date"]
+
+    _indicator_cache[key] = result
+    if len(_indicator_cache) > INDICATOR_CACHE_SIZE:
+        _indicator_cache.popitem(last=False)
+
+    logger.info(f"Computed indicators for stock {stock_id} ({period}), {len(arrays['close'])} bars")
+    return result
+
+
+async def refresh_kline_indicators(session: AsyncSession, stock_id: int, period: str = "1d") -> int:
+    """
+    重算并持久化指定股票某周期的全部指标（不提交事务）
+
+    先删除旧指标行，再以 Core 批量写入，K线更新后调用即可使预计算结果失效重建。
+
+    Args:
+        session: 数据库会话
+        stock_id: 股票 ID
+        period: K线周期
+
+    Returns:
+        写入的指标行数
+    """
+    arrays = await load_kline_arrays(stock_id, period, session=session)
+    values = compute_indicators(arrays)
+
+    await session.execute(
+        delete(KLineIndicators).where(
+            and_(KLineIndicators.stock_id == stock_id, KLineIndicators.period == period)
+        )
+    )
+
+    # NaN（如首根K线的标准差）存为 NULL
+    columns = {
+        col: [None if v != v else v for v in values[col].tolist()]
+        for col in INDICATOR_COLUMNS
+    }
+    rows = (
+        {
+            "stock_id": stock_id,
+            "period": period,
+            "trade_date": trade_date,
+            **{col: columns[col][i] for col in INDICATOR_COLUMNS},
+        }
+        for i, trade_date in enumerate(arrays["trade_date"])
+    )
+    return await bulk_insert_kline_indicators(session, rows)
@@ -36,7 +36,7 @@ class LLMProviderType(Enum):
     OPENAI = "openai"
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """对话消息"""
     role: str  # "system", "user", "assistant"
@@ -51,7 +51,7 @@ class Message:
         return result
 
 
-@dataclass
+@dataclass(slots=True)
 class LLMResponse:
     """LLM 响应"""
     content: str
@@ -72,7 +72,7 @@ class LLMResponse:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamChunk:
     """流式响应块"""
     content: str
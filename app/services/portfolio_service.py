@@ -9,9 +9,9 @@
 - 历史记录追踪
 """
 from datetime import datetime, date
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import case, select, func, and_, update
 from sqlalchemy.orm import selectinload
 
 from app.models.portfolio import (
@@ -28,6 +28,13 @@ from app.utils.logger import get_logger
 logger = get_logger(__name__)
 
 
+def _to_date(value: Union[str, date, None]) -> Optional[date]:
+    """将 YYYY-MM-DD 字符串转换为 date（date 与 None 原样返回）"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
 class PortfolioService:
     """投资组合服务类"""
 
@@ -277,6 +284,35 @@ class PortfolioService:
         await self.db.commit()
         return True
 
+    async def update_position_prices(self, prices: Dict[str, float]) -> int:
+        """
+        批量更新持仓的当前价格（行情推送使用）
+
+        只写 current_price，市值与盈亏由数据库生成列计算；
+        所有股票在一条 UPDATE ... SET current_price = CASE stock_code ... 中完成，
+        以 RETURNING 计数（asyncpg 的 executemany 不提供 rowcount）。
+
+        Args:
+            prices: 股票代码 -> 最新价格
+
+        Returns:
+            更新的持仓行数
+        """
+        if not prices:
+            return 0
+
+        table = Position.__table__
+        stmt = (
+            update(table)
+            .where(table.c.stock_code.in_(list(prices)))
+            .values(current_price=case(prices, value=table.c.stock_code), updated_at=func.now())
+            .returning(table.c.id)
+        )
+        result = await self.db.execute(stmt)
+        updated = len(result.all())
+        await self.db.commit()
+        return updated
+
     # ============================================
     # 交易操作
     # ============================================
@@ -288,7 +324,7 @@ class PortfolioService:
         transaction_type: str,
         quantity: float,
         price: float,
-        trade_date: str,
+        trade_date: Union[str, date],
         stock_name: Optional[str] = None,
         commission: float = 0.0,
         notes: Optional[str] = None,
@@ -302,7 +338,7 @@ class PortfolioService:
             transaction_type: 交易类型
             quantity: 交易数量
             price: 交易价格
-            trade_date: 交易日期
+            trade_date: 交易日期（date 或 YYYY-MM-DD 字符串）
             stock_name: 股票名称
             commission: 手续费
             notes: 备注
@@ -320,7 +356,7 @@ class PortfolioService:
             price=price,
             amount=amount,
             commission=commission,
-            trade_date=trade_date,
+            trade_date=_to_date(trade_date),
             notes=notes,
         )
         self.db.add(transaction)
@@ -370,8 +406,8 @@ class PortfolioService:
         self,
         portfolio_id: int,
         stock_code: Optional[str] = None,
-        start_date: Optional[str] = None,
-        end_date: Optional[str] = None,
+        start_date: Union[str, date, None] = None,
+        end_date: Union[str, date, None] = None,
     ) -> List[Transaction]:
         """
         获取交易记录
@@ -390,9 +426,9 @@ class PortfolioService:
         if stock_code:
             stmt = stmt.where(Transaction.stock_code == stock_code)
         if start_date:
-            stmt = stmt.where(Transaction.trade_date >= start_date)
+            stmt = stmt.where(Transaction.trade_date >= _to_date(start_date))
         if end_date:
-            stmt = stmt.where(Transaction.trade_date <= end_date)
+            stmt = stmt.where(Transaction.trade_date <= _to_date(end_date))
 
         stmt = stmt.order_by(Transaction.trade_date.desc())
 
@@ -462,13 +498,10 @@ class PortfolioService:
 
         positions = await self.get_portfolio_positions(portfolio_id)
 
-        total_market_value = 0.0
-        for position in positions:
-            if position.current_price and position.quantity > 0:
-                position.market_value = position.current_price * position.quantity
-                position.profit_loss = position.market_value - position.total_cost
-                position.profit_loss_pct = (position.profit_loss / position.total_cost * 100) if position.total_cost > 0 else 0
-                total_market_value += position.market_value
+        # market_value 为数据库生成列，读取即为最新值
+        total_market_value = sum(
+            p.market_value for p in positions if p.market_value and p.quantity > 0
+        )
 
         # 假设现金余额 = 当前价值 - 持仓成本
         cash_balance = portfolio.current_value - sum(p.total_cost for p in positions)
@@ -491,7 +524,7 @@ class PortfolioService:
         total_cost: float,
         profit_loss: float,
         profit_loss_pct: float,
-        record_date: Optional[str] = None,
+        record_date: Union[str, date, None] = None,
     ) -> PortfolioHistory:
         """
         添加历史记录
@@ -509,8 +542,7 @@ class PortfolioService:
         Returns:
             历史记录
         """
-        if record_date is None:
-            record_date = date.today().strftime("%Y-%m-%d")
+        record_date = _to_date(record_date) or date.today()
 
         history = PortfolioHistory(
             portfolio_id=portfolio_id,
@@ -530,8 +562,8 @@ class PortfolioService:
     async def get_portfolio_history(
         self,
         portfolio_id: int,
-        start_date: Optional[str] = None,
-        end_date: Optional[str] = None,
+        start_date: Union[str, date, None] = None,
+        end_date: Union[str, date, None] = None,
     ) -> List[PortfolioHistory]:
         """
         获取历史记录
@@ -547,9 +579,9 @@ class PortfolioService:
         stmt = select(PortfolioHistory).where(PortfolioHistory.portfolio_id == portfolio_id)
 
         if start_date:
-            stmt = stmt.where(PortfolioHistory.record_date >= start_date)
+            stmt = stmt.where(PortfolioHistory.record_date >= _to_date(start_date))
         if end_date:
-            stmt = stmt.where(PortfolioHistory.record_date <= end_date)
+            stmt = stmt.where(PortfolioHistory.record_date <= _to_date(end_date))
 
         stmt = stmt.order_by(PortfolioHistory.record_date.desc())
 
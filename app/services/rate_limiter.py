@@ -7,6 +7,7 @@
 - 连接失败时的内存降级
 """
 import time
+from functools import lru_cache
 from typing import Optional, Dict, List
 from threading import Lock
 
@@ -48,9 +49,10 @@ class RedisRateLimiter:
         """连接 Redis"""
         try:
             config = get_config()
+            # 限流只读取计数（整数回复），无需将回复解码为字符串
             self._redis_client = redis.from_url(
                 config.redis_url,
-                decode_responses=True,
+                decode_responses=False,
                 socket_connect_timeout=5,
                 socket_timeout=5
             )
@@ -275,8 +277,9 @@ RATE_LIMIT_CONFIG = {
 }
 
 
+@lru_cache(maxsize=128)
 def get_rate_limit_for_endpoint(endpoint: str) -> Dict[str, int]:
-    """获取端点的限流配置"""
+    """获取端点的限流配置（按端点名缓存匹配结果）"""
     # 匹配端点类型
     for key, config in RATE_LIMIT_CONFIG.items():
         if key in endpoint.lower():
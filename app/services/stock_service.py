@@ -12,6 +12,7 @@ import time
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any, Union
 from functools import lru_cache
+import numpy as np
 import pandas as pd
 
 import akshare as ak
@@ -65,6 +66,146 @@ class StockCache:
             logger.debug(f"Cache removed: {key}")
 
 
+class BarBuffer:
+    """
+    列式（SoA）K线缓冲
+
+    每个字段一段连续的 NumPy 数组，交易日为 datetime64[D] 并保持升序。
+    追加时按 2 倍扩容；按日期区间取数返回视图，不复制数据。
+    """
+
+    FIELDS = ("open", "high", "low", "close", "volume", "amount")
+
+    # AkShare 中文列名 -> 字段名
+    AKSHARE_COLUMNS = {
+        "开盘": "open",
+        "最高": "high",
+        "最低": "low",
+        "收盘": "close",
+        "成交量": "volume",
+        "成交额": "amount",
+    }
+
+    def __init__(self, capacity: int = 256):
+        """
+        初始化缓冲
+
+        Args:
+            capacity: 初始容量（K线根数）
+        """
+        self._size = 0
+        self._dates = np.empty(capacity, dtype="datetime64[D]")
+        self._columns = {field: np.empty(capacity, dtype=np.float64) for field in self.FIELDS}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "BarBuffer":
+        """
+        由 AkShare K线 DataFrame 构建（整列转换，不逐行遍历）
+
+        Args:
+            df: 含 日期/开盘/最高/最低/收盘/成交量/成交额 列的 DataFrame
+
+        Returns:
+            BarBuffer 实例
+        """
+        buffer = cls(capacity=max(len(df), 1))
+        columns = {
+            field: df[name].fillna(0).to_numpy(dtype=np.float64) if name in df else np.zeros(len(df))
+            for name, field in cls.AKSHARE_COLUMNS.items()
+        }
+        buffer.append(pd.to_datetime(df["日期"]).to_numpy(dtype="datetime64[D]"), **columns)
+        return buffer
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, capacity: int) -> None:
+        """容量不足时按 2 倍扩容"""
+        if capacity <= self._dates.shape[0]:
+            return
+        new_capacity = max(capacity, self._dates.shape[0] * 2)
+        dates = np.empty(new_capacity, dtype="datetime64[D]")
+        dates[:self._size] = self._dates[:self._size]
+        self._dates = dates
+        for field, values in self._columns.items():
+            grown = np.empty(new_capacity, dtype=np.float64)
+            grown[:self._size] = values[:self._size]
+            self._columns[field] = grown
+
+    def append(self, dates: np.ndarray, **columns: np.ndarray) -> None:
+        """
+        追加一批按日期升序、且晚于已有数据的K线
+
+        Args:
+            dates: 交易日数组
+            **columns: 各字段数组，缺省字段填 0
+        """
+        count = len(dates)
+        self._reserve(self._size + count)
+        end = self._size + count
+        self._dates[self._size:end] = dates
+        for field, values in self._columns.items():
+            values[self._size:end] = columns.get(field, 0.0)
+        self._size = end
+
+    def view(
+        self,
+        start: Optional[Union[str, np.datetime64]] = None,
+        end: Optional[Union[str, np.datetime64]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        按日期闭区间取数（二分定位，返回只读数组视图）
+
+        缓冲可能被多个调用方共享（如 StockService 的缓存），视图设为只读，
+        需要修改时由调用方自行 copy()。
+
+        Args:
+            start: 开始日期，默认最早
+            end: 结束日期，默认最新
+
+        Returns:
+            字段名到数组视图的字典，含 date
+        """
+        dates = self._dates[:self._size]
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = self._size if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        result = {"date": dates[lo:hi]}
+        for field, values in self._columns.items():
+            result[field] = values[lo:hi]
+        for array in result.values():
+            array.flags.writeable = False
+        return result
+
+    def to_records(self, code: str) -> List[Dict[str, Any]]:
+        """
+        转换为字典列表（仅在 API 输出或写库的批次边界调用）
+
+        Args:
+            code: 股票代码
+
+        Returns:
+            K线字典列表
+        """
+        data = self.view()
+        dates = np.datetime_as_string(data["date"], unit="D").tolist()
+        opens, highs, lows, closes = (data[field].tolist() for field in ("open", "high", "low", "close"))
+        volumes = data["volume"].astype(np.int64).tolist()
+        amounts = data["amount"].tolist()
+        return [
+            {
+                "code": code,
+                "date": d,
+                "open": o,
+                "high": h,
+                "low": lo,
+                "close": c,
+                "volume": v,
+                "amount": a,
+            }
+            for d, o, h, lo, c, v, a in zip(dates, opens, highs, lows, closes, volumes, amounts)
+        ]
+
+
 # 全局缓存实例
 _stock_cache = StockCache(ttl=300)
 
@@ -273,15 +414,46 @@ class StockService:
         Returns:
             K线数据列表
         """
+        # 只缓存列式缓冲（get_kline_bars），字典列表每次由缓冲生成，不重复占用缓存
+        bars = self.get_kline_bars(symbol, period, start_date, end_date, adjust)
+        if bars is None:
+            return None
+
+        # 仅在对外返回时把列数组拼成字典列表
+        return bars.to_records(self._normalize_symbol(symbol))
+
+    def get_kline_bars(
+        self,
+        symbol: str,
+        period: str = "daily",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        adjust: str = "qfq"
+    ) -> Optional[BarBuffer]:
+        """
+        获取股票历史K线的列式缓冲，供指标计算直接使用数组
+
+        Args:
+            symbol: 股票代码
+            period: 周期类型，可选 'daily', 'weekly', 'monthly'
+            start_date: 开始日期，格式 YYYYMMDD
+            end_date: 结束日期，格式 YYYYMMDD
+            adjust: 复权类型，可选 'qfq' (前复权), 'hfq' (后复权), '' (不复权)
+
+        Returns:
+            BarBuffer 或 None
+        """
         cache_key = self._get_cache_key(
-            "kline", symbol=symbol, period=period, start_date=start_date, end_date=end_date, adjust=adjust
+            "bars", symbol=symbol, period=period, start_date=start_date, end_date=end_date, adjust=adjust
         )
 
-        # 尝试从缓存获取
         if self.use_cache:
-            cached_data = self.cache.get(cache_key)
-            if cached_data:
-                return cached_data
+            cached_bars = self.cache.get(cache_key)
+            if cached_bars is not None:
+                return cached_bars
+
+        if period not in ("daily", "weekly", "monthly"):
+            raise ValueError(f"不支持的周期类型: {period}")
 
         try:
             symbol_normalized = self._normalize_symbol(symbol)
@@ -292,54 +464,21 @@ class StockService:
             if not start_date:
                 start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
 
-            # 根据周期选择接口
-            if period == "daily":
-                df = ak.stock_zh_a_hist(
-                    symbol=symbol_normalized,
-                    period="daily",
-                    start_date=start_date,
-                    end_date=end_date,
-                    adjust=adjust
-                )
-            elif period == "weekly":
-                df = ak.stock_zh_a_hist(
-                    symbol=symbol_normalized,
-                    period="weekly",
-                    start_date=start_date,
-                    end_date=end_date,
-                    adjust=adjust
-                )
-            elif period == "monthly":
-                df = ak.stock_zh_a_hist(
-                    symbol=symbol_normalized,
-                    period="monthly",
-                    start_date=start_date,
-                    end_date=end_date,
-                    adjust=adjust
-                )
-            else:
-                raise ValueError(f"不支持的周期类型: {period}")
+            df = ak.stock_zh_a_hist(
+                symbol=symbol_normalized,
+                period=period,
+                start_date=start_date,
+                end_date=end_date,
+                adjust=adjust
+            )
 
             if df is not None and not df.empty:
-                # 转换为字典列表
-                result = []
-                for _, row in df.iterrows():
-                    result.append({
-                        "code": symbol_normalized,
-                        "date": row.get("日期", "").strftime("%Y-%m-%d") if isinstance(row.get("日期"), datetime) else str(row.get("日期", "")),
-                        "open": float(row.get("开盘", 0) or 0),
-                        "high": float(row.get("最高", 0) or 0),
-                        "low": float(row.get("最低", 0) or 0),
-                        "close": float(row.get("收盘", 0) or 0),
-                        "volume": int(row.get("成交量", 0) or 0),
-                        "amount": float(row.get("成交额", 0) or 0),
-                    })
+                bars = BarBuffer.from_frame(df)
 
-                # 设置缓存
                 if self.use_cache:
-                    self.cache.set(cache_key, result)
+                    self.cache.set(cache_key, bars)
 
-                return result
+                return bars
 
         except Exception as e:
             logger.error(f"获取K线数据失败 {symbol}: {e}")
@@ -393,13 +532,7 @@ class StockService:
             raise
 
 
-# 创建全局服务实例
-_default_service: Optional[StockService] = None
-
-
+@lru_cache(maxsize=1)
 def get_stock_service() -> StockService:
-    """获取默认的股票服务实例"""
-    global _default_service
-    if _default_service is None:
-        _default_service = StockService(use_cache=True)
-    return _default_service
+    """获取默认的股票服务实例（进程内单例）"""
+    return StockService(use_cache=True)
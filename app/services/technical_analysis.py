@@ -13,6 +13,7 @@ from typing import Optional, Dict, Any
 import pandas as pd
 import numpy as np
 
+from app.services.indicators import smooth
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -215,17 +216,9 @@ def calculate_kdj(df: pd.DataFrame, n: int = 9, m1: int = 3, m2: int = 3) -> pd.
     # D = (m2-1)/m2 * 前一日D + 1/m2 * K
     # J = 3*K - 2*D
 
-    k = pd.Series(index=df.index, dtype=float)
-    d = pd.Series(index=df.index, dtype=float)
-
-    # 初始化
-    k.iloc[0] = 50
-    d.iloc[0] = 50
-
-    # 递归计算 K 和 D
-    for i in range(1, len(df)):
-        k.iloc[i] = (m1 - 1) / m1 * k.iloc[i - 1] + 1 / m1 * rsv.iloc[i]
-        d.iloc[i] = (m2 - 1) / m2 * d.iloc[i - 1] + 1 / m2 * k.iloc[i]
+    # 递归部分即初值为 50 的指数平滑，交给编译内核在数组上计算
+    k = pd.Series(smooth(rsv.to_numpy(), 1 / m1, first=50.0), index=df.index)
+    d = pd.Series(smooth(k.to_numpy(), 1 / m2, first=50.0), index=df.index)
 
     # J = 3*K - 2*D
     j = 3 * k - 2 * d
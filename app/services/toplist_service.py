@@ -7,6 +7,7 @@
 
 import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 import pandas as pd
 
@@ -630,13 +631,7 @@ class TopListService:
         return symbol
 
 
-# 创建全局服务实例
-_default_service: Optional[TopListService] = None
-
-
+@lru_cache(maxsize=1)
 def get_toplist_service() -> TopListService:
-    """获取默认的龙虎榜服务实例"""
-    global _default_service
-    if _default_service is None:
-        _default_service = TopListService(use_cache=True)
-    return _default_service
+    """获取默认的龙虎榜服务实例（进程内单例）"""
+    return TopListService(use_cache=True)
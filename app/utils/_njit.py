@@ -0,0 +1,22 @@
+"""
+Numba JIT 兼容层
+
+安装了 numba 时导出真正的 njit；未安装时 njit 退化为原样返回函数的装饰器，
+调用方可通过 NUMBA_AVAILABLE 选择向量化的回退实现。
+"""
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """numba 未安装时的空装饰器，支持 @njit 与 @njit(cache=True) 两种写法"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+__all__ = ["njit", "NUMBA_AVAILABLE"]
@@ -5,12 +5,16 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from starlette.middleware.base import BaseHTTPMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import logging
 from app.utils.logger import setup_logger
 from app.api import router as api_router
 from app.api import health, stocks, chat, analysis, export, websocket, auth, alert, metrics, news, toplist, portfolio
 from app.api.metrics import track_request
+from app.db.database import close_connections, get_pubsub
+from app.services.alert_service import get_alert_service
+from app.services.auth_service import run_session_reaper
 
 # 配置日志
 logger = setup_logger("stock_analyzer", level=logging.INFO)
@@ -21,9 +25,27 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时
     logger.info("Starting LLM Stock Analyzer...")
+
+    # 接入共享的 Redis 行情订阅（Redis 不可用时仅支持进程内广播）
+    try:
+        websocket.manager.attach_pubsub(await get_pubsub())
+    except Exception as e:
+        logger.warning(f"Quote pubsub unavailable: {e}")
+
+    # 后台定期清理过期会话
+    reaper = asyncio.create_task(run_session_reaper())
+
     yield
     # 关闭时
     logger.info("Shutting down LLM Stock Analyzer...")
+    # 等待清理任务退出，避免进行中的批量删除在引擎释放时被中断
+    reaper.cancel()
+    with suppress(asyncio.CancelledError):
+        await reaper
+    # 分发合并窗口内尚未发出的预警通知
+    await get_alert_service().close()
+    # 关闭共享订阅（含读取任务）、数据库引擎与 Redis 连接
+    await close_connections()
 
 
 # 创建 FastAPI 应用
@@ -120,4 +142,14 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.config import get_config
+
+    config = get_config()
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        ws_per_message_deflate=config.quote_ws_compress,
+        ws_max_size=config.ws_max_size,
+        ws_max_queue=config.ws_max_queue,
+    )
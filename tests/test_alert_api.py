@@ -94,7 +94,7 @@ class TestAlertAPI:
         ))
 
         # 模拟检查所有预警
-        service.check_all_alerts = AsyncMock(return_value=[])
+        service.check_all_alerts_list = AsyncMock(return_value=[])
 
         # 模拟获取预警记录
         service.get_alert_records = AsyncMock(return_value=[])
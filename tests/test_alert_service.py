@@ -3,6 +3,8 @@
 
 测试预警规则管理、预警检查和预警记录功能。
 """
+import asyncio
+
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from datetime import datetime
@@ -218,6 +220,258 @@ class TestAlertService:
                 assert "跌幅" in result.message
                 assert result.trigger_change_pct == -5.0
 
+    @pytest.mark.asyncio
+    async def test_check_all_alerts_fetches_each_symbol_once(self, alert_service, mock_session):
+        """测试同一股票的多条规则只获取一次行情，触发记录一条语句写入并一次提交"""
+        rules = [
+            AlertRule(id=1, name="高价", stock_code="600000", alert_type="price_above",
+                      threshold={"price": 10.0}, status="active"),
+            AlertRule(id=2, name="涨幅", stock_code="600000", alert_type="change_up",
+                      threshold={"change_percent": 1.0}, status="active"),
+            AlertRule(id=3, name="低价", stock_code="000001", alert_type="price_below",
+                      threshold={"price": 5.0}, status="active"),
+        ]
+        rules_result = Mock()
+        rules_result.scalars.return_value.all.return_value = rules
+        mock_session.execute = AsyncMock(return_value=rules_result)
+
+        # INSERT ... RETURNING 按参数顺序返回记录
+        async def insert_returning(stmt, rows):
+            inserted = Mock()
+            inserted.all.return_value = [AlertRecord(id=i, **row) for i, row in enumerate(rows, 1)]
+            return inserted
+
+        mock_session.scalars = AsyncMock(side_effect=insert_returning)
+
+        mock_quote = {"price": 12.5, "change_percent": 2.5, "volume": 1000000}
+
+        with patch.object(alert_service.stock_service, 'get_stock_quote', return_value=mock_quote) as get_quote:
+            with patch.object(alert_service, '_notify', new_callable=AsyncMock) as notify:
+                result = await alert_service.check_all_alerts_list(mock_session)
+
+        assert sorted(call.args[0] for call in get_quote.call_args_list) == ["000001", "600000"]
+        assert [record.rule_id for record in result] == [1, 2]
+        mock_session.scalars.assert_awaited_once()
+        mock_session.commit.assert_called_once()
+        assert notify.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_check_all_alerts_streams_records(self, alert_service, mock_session):
+        """测试逐条产出触发记录，提前结束迭代时通知已全部入队"""
+        rules = [
+            AlertRule(id=i, name=f"规则{i}", stock_code="600000", alert_type="price_above",
+                      threshold={"price": 10.0}, status="active")
+            for i in (1, 2)
+        ]
+        rules_result = Mock()
+        rules_result.scalars.return_value.all.return_value = rules
+        mock_session.execute = AsyncMock(return_value=rules_result)
+
+        async def insert_returning(stmt, rows):
+            inserted = Mock()
+            inserted.all.return_value = [AlertRecord(id=i, **row) for i, row in enumerate(rows, 1)]
+            return inserted
+
+        mock_session.scalars = AsyncMock(side_effect=insert_returning)
+
+        with patch.object(alert_service.stock_service, 'get_stock_quote', return_value={"price": 12.5}):
+            with patch.object(alert_service, '_notify', new_callable=AsyncMock) as notify:
+                stream = alert_service.check_all_alerts(mock_session)
+                first = await stream.__anext__()
+                await stream.aclose()
+
+        assert first.rule_id == 1
+        assert notify.call_count == 2
+
+
+    @pytest.mark.asyncio
+    async def test_gather_by_symbol_bounded(self, alert_service):
+        """测试按股票并发获取数据时不超过并发上限"""
+        running, peak = 0, 0
+
+        async def fetch(symbol):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return symbol.upper()
+
+        symbols = [f"s{i}" for i in range(10)]
+        data = await alert_service._gather_by_symbol(fetch, symbols, asyncio.Semaphore(3))
+
+        assert data == {symbol: symbol.upper() for symbol in symbols}
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_quote_requests_coalesced(self, alert_service):
+        """测试同一股票的并发行情请求只调用一次股票服务"""
+        import time
+
+        def slow_quote(code):
+            time.sleep(0.05)
+            return {"price": 12.5}
+
+        with patch.object(alert_service.stock_service, 'get_stock_quote', side_effect=slow_quote) as get_quote:
+            quotes = await asyncio.gather(*(alert_service._cached_quote("600000") for _ in range(5)))
+
+        assert get_quote.call_count == 1
+        assert all(quote.price == 12.5 for quote in quotes)
+        assert alert_service._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_quote_cached_between_checks(self, alert_service, mock_session):
+        """测试缓存有效期内重复检查不再请求行情"""
+        rule = AlertRule(id=1, name="高价", stock_code="600000", alert_type="price_above",
+                         threshold={"price": 100.0}, status="active")
+        mock_quote = {"price": 12.5, "change_percent": 2.5, "volume": 1000000}
+
+        with patch.object(alert_service.stock_service, 'get_stock_quote', return_value=mock_quote) as get_quote:
+            assert await alert_service.check_alert(mock_session, rule) is None
+            assert await alert_service.check_alert(mock_session, rule) is None
+
+        get_quote.assert_called_once_with("600000")
+
+    @pytest.mark.asyncio
+    async def test_mark_alert_as_read_single_update(self, alert_service, mock_session):
+        """测试标记已读为单条 UPDATE，按影响行数返回结果"""
+        mock_session.execute = AsyncMock(side_effect=[Mock(rowcount=1), Mock(rowcount=0)])
+
+        assert await alert_service.mark_alert_as_read(mock_session, 1) is True
+        assert await alert_service.mark_alert_as_read(mock_session, 999) is False
+        assert mock_session.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_delete_alert_rule_not_found(self, alert_service, mock_session):
+        """测试删除不存在的预警规则"""
+        mock_session.execute = AsyncMock(return_value=Mock(rowcount=0))
+
+        assert await alert_service.delete_alert_rule(mock_session, 999) is False
+        mock_session.delete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_check_volume_spike_alert_triggered(self, alert_service, mock_session):
+        """测试成交量异动按近期均量判断"""
+        rule = AlertRule(id=1, name="放量", stock_code="600000", alert_type="volume_spike",
+                         threshold={"volume_ratio": 2.0, "days": 3}, status="active")
+        mock_quote = {"price": 12.5, "change_percent": 2.5, "volume": 2500}
+        klines = [{"volume": v, "turnover_rate": 1.0} for v in (1000, 1200, 800, 50000)]
+
+        with patch.object(alert_service.stock_service, 'get_stock_quote', return_value=mock_quote):
+            with patch.object(alert_service.stock_service, 'get_kline_data', return_value=klines):
+                with patch.object(alert_service, '_notify', new_callable=AsyncMock):
+                    result = await alert_service.check_alert(mock_session, rule)
+
+        assert result is not None
+        assert "平均 1000" in result.message
+
+    def test_quote_from_dict(self):
+        """测试行情字典转换为定长结构，缺失与空值记为 0"""
+        from app.services.alert_service import Quote
+
+        quote = Quote.from_dict({"price": "12.5", "change_percent": None, "volume": 100, "name": "x"})
+
+        assert quote == Quote(price=12.5, change_percent=0.0, volume=100.0, amount=0.0)
+
+    def test_compiler_table_covers_alert_types(self):
+        """测试每种预警类型都有编译器，编译出的判断函数绑定了阈值"""
+        from app.services.alert_service import _COMPILERS, _compile_change_down
+
+        assert set(_COMPILERS) == set(AlertType)
+        predicate = _compile_change_down({"change_percent": 3.0})
+        assert predicate("600000", 10.0, -1.0, 0, None) is None
+        assert "跌幅 5.00%" in predicate("600000", 10.0, -5.0, 0, None)
+
+    def test_predicate_cached_until_rule_updated(self, alert_service):
+        """测试编译结果按规则缓存，更新时间变化后重新编译"""
+        from datetime import datetime
+
+        rule = AlertRule(
+            id=1,
+            stock_code="600000",
+            alert_type=AlertType.PRICE_ABOVE,
+            threshold={"price": 10.0},
+            updated_at=datetime(2024, 1, 1),
+        )
+        first = alert_service._predicate_for(rule)
+        assert alert_service._predicate_for(rule) is first
+
+        rule.threshold = {"price": 20.0}
+        rule.updated_at = datetime(2024, 1, 2)
+        second = alert_service._predicate_for(rule)
+        assert second is not first
+        assert second("600000", 15.0, 0.0, 0, None) is None
+
+    @pytest.mark.asyncio
+    async def test_unread_count_cached_until_change(self, alert_service, mock_session):
+        """测试未读数量短时缓存，标记已读后失效"""
+        count_result = Mock()
+        count_result.scalar.return_value = 3
+        mock_session.execute = AsyncMock(return_value=count_result)
+
+        assert await alert_service.get_unread_count(mock_session) == 3
+        assert await alert_service.get_unread_count(mock_session) == 3
+        assert mock_session.execute.await_count == 1
+
+        mock_session.execute = AsyncMock(side_effect=[Mock(rowcount=1), count_result])
+        await alert_service.mark_alert_as_read(mock_session, 1)
+        await alert_service.get_unread_count(mock_session)
+        assert mock_session.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_notifications_coalesced_in_background(self):
+        """测试通知在后台合并：批量回调收到一次列表，逐条回调收到每条记录"""
+        alert_service = AlertService(notify_latency=0.05)
+        batches, items = [], []
+        alert_service.register_notification_callback(batches.append, batch=True)
+        alert_service.register_notification_callback(items.append)
+
+        rule = AlertRule(id=1, name="高价", stock_code="600000", alert_type="price_above",
+                         threshold={"price": 10.0}, status="active")
+        for record_id in (1, 2, 3):
+            await alert_service._notify(AlertRecord(id=record_id, rule_id=1, message="m"), rule)
+
+        assert batches == [] and items == []
+        await asyncio.sleep(0.2)
+
+        assert [[alert["id"] for alert in batch] for batch in batches] == [[1, 2, 3]]
+        assert [alert["id"] for alert in items] == [1, 2, 3]
+        await alert_service.close()
+
+    @pytest.mark.asyncio
+    async def test_get_alert_records_with_rule(self, alert_service):
+        """测试按需预加载关联规则，未预加载时访问 record.rule 直接报错"""
+        from sqlalchemy.exc import InvalidRequestError
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from app.models.alert import Base
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            for code in ("600000", "000001"):
+                rule = AlertRule(name=code, stock_code=code, alert_type="price_above", threshold={"price": 1.0})
+                session.add(rule)
+                await session.flush()
+                session.add_all([AlertRecord(rule_id=rule.id, message=f"{code}-{i}") for i in range(2)])
+            await session.commit()
+
+            by_code = await alert_service.get_alert_records(session, stock_code="600000", with_rule=True)
+            assert len(by_code) == 2
+            assert {record.rule.stock_code for record in by_code} == {"600000"}
+
+            session.expunge_all()
+            all_records = await alert_service.get_alert_records(session, with_rule=True)
+            assert {record.rule.stock_code for record in all_records} == {"600000", "000001"}
+
+            session.expunge_all()
+            plain = await alert_service.get_alert_records(session)
+            with pytest.raises(InvalidRequestError):
+                plain[0].rule
+
+        await engine.dispose()
+
 
 class TestAlertModels:
     """预警模型测试类"""
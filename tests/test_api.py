@@ -106,7 +106,17 @@ class TestStockEndpoints:
     def test_kline_with_invalid_period(self, client):
         """测试无效周期的K线接口"""
         response = client.get("/api/v1/stocks/kline/600000?period=invalid")
-        assert response.status_code == 400
+        assert response.status_code == 422
+
+    def test_stock_quote_malformed_code(self, client):
+        """测试格式错误的股票代码在路由层被拒绝"""
+        response = client.get("/api/v1/stocks/quote/abc")
+        assert response.status_code == 422
+
+    def test_kline_with_malformed_date(self, client):
+        """测试格式错误的日期参数在路由层被拒绝"""
+        response = client.get("/api/v1/stocks/kline/600000?start_date=2023-01-01")
+        assert response.status_code == 422
 
     def test_kline_with_dates(self, client):
         """测试带日期参数的K线接口"""
@@ -4,12 +4,16 @@
 测试用户认证、API 密钥管理和权限验证功能。
 """
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from jose.jwt import decode as jwt_decode
+
 from app.services.auth_service import (
     get_password_hash,
+    hash_password_async,
     verify_password,
+    verify_password_async,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -48,6 +52,26 @@ class TestPasswordHashing:
         assert verify_password(wrong_password, hashed) is False
 
 
+    def test_get_password_hash_uses_configured_rounds(self):
+        """测试 bcrypt 代价因子取自配置"""
+        from dataclasses import replace
+        from app.config import get_config
+
+        config = replace(get_config(), bcrypt_rounds=4)
+        with patch("app.services.auth_service.get_config", return_value=config):
+            hashed = get_password_hash("password123")
+
+        assert hashed.startswith("$2b$04$")
+        assert verify_password("password123", hashed) is True
+
+    @pytest.mark.asyncio
+    async def test_password_hashing_async(self):
+        """测试线程内的异步哈希与验证"""
+        hashed = await hash_password_async("password123")
+
+        assert await verify_password_async("password123", hashed) is True
+        assert await verify_password_async("wrong", hashed) is False
+
 class TestTokenGeneration:
     """测试令牌生成功能"""
 
@@ -104,6 +128,22 @@ class TestTokenGeneration:
 
         assert payload is None
 
+    def test_decode_token_cached_until_expiry(self):
+        """测试令牌签名只验证一次，缓存命中后仍按 exp 过期"""
+        import time
+        from app.services.auth_service import _decode_cached
+
+        _decode_cached.cache_clear()
+        token = create_access_token({"sub": "123"}, timedelta(minutes=30))
+
+        with patch("app.services.auth_service.jwt.decode", wraps=jwt_decode) as decode:
+            assert decode_token(token)["sub"] == "123"
+            assert decode_token(token)["sub"] == "123"
+            assert decode.call_count == 1
+
+            with patch("app.services.auth_service.time.time", return_value=time.time() + 3600):
+                assert decode_token(token) is None
+
 
 class TestAPIKey:
     """测试 API 密钥功能"""
@@ -135,6 +175,13 @@ class TestAPIKey:
 
         assert verify_api_key(wrong_key, hashed) is False
 
+    def test_hash_api_key_is_deterministic_digest(self):
+        """测试 API 密钥哈希为可按索引查找的固定摘要"""
+        api_key = "sk_" + "a" * 32
+
+        assert hash_api_key(api_key) == hash_api_key(api_key)
+        assert len(hash_api_key(api_key)) == 32
+
 
 class TestAuthService:
     """测试认证服务"""
@@ -357,6 +404,74 @@ class TestAuthService:
         mock_session.add.assert_called()
         mock_session.commit.assert_called()
 
+    @pytest.mark.asyncio
+    async def test_verify_api_key_unknown(self, mock_session):
+        """测试未知 API 密钥单次查询即返回 None"""
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.return_value = None
+        mock_session.execute.return_value = mock_result
+
+        auth_service = AuthService(mock_session)
+
+        result = await auth_service.verify_api_key("sk_" + "x" * 32)
+
+        assert result is None
+        mock_session.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_verify_api_key_returns_joined_user(self, mock_session):
+        """测试有效 API 密钥直接返回随密钥加载的用户，只查询一次"""
+        from app.models.user import APIKey, User
+
+        user = User(id=1, username="testuser", is_active=True)
+        key_record = APIKey(user_id=1, expires_at=None, is_active=True)
+        key_record.user = user
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.return_value = key_record
+        mock_session.execute.return_value = mock_result
+
+        auth_service = AuthService(mock_session)
+
+        result = await auth_service.verify_api_key("sk_" + "x" * 32)
+
+        assert result is user
+        assert key_record.last_used_at is not None
+        mock_session.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_increment_usage_single_update(self, mock_session):
+        """测试使用次数以单条 UPDATE 原子自增"""
+        mock_session.execute.return_value = MagicMock(rowcount=1)
+
+        auth_service = AuthService(mock_session)
+
+        assert await auth_service.increment_usage(1, 3) is True
+        mock_session.execute.assert_awaited_once()
+        mock_session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_check_quota_reads_columns(self, mock_session):
+        """测试配额检查只读取使用量与上限两列"""
+        mock_result = MagicMock()
+        mock_result.one_or_none.return_value = (100, 100)
+        mock_session.execute.return_value = mock_result
+
+        auth_service = AuthService(mock_session)
+
+        assert await auth_service.check_quota(1) == (False, 100, 100)
+
+        mock_result.one_or_none.return_value = None
+        assert await auth_service.check_quota(2) == (False, 0, 0)
+
+    @pytest.mark.asyncio
+    async def test_verify_api_key_malformed(self, mock_session):
+        """测试格式不符的 API 密钥不查询数据库"""
+        auth_service = AuthService(mock_session)
+
+        assert await auth_service.verify_api_key("not-a-key") is None
+        assert await auth_service.verify_api_key("sk_short") is None
+        mock_session.execute.assert_not_awaited()
+
     @pytest.mark.asyncio
     async def test_list_api_keys(self, mock_session):
         """测试列出 API 密钥"""
@@ -364,8 +479,8 @@ class TestAuthService:
 
         mock_result = MagicMock()
         keys = [
-            APIKey(id=1, user_id=1, name="Key 1", key_hash="hash1", key_prefix="sk_abc...", is_active=True),
-            APIKey(id=2, user_id=1, name="Key 2", key_hash="hash2", key_prefix="sk_def...", is_active=True),
+            APIKey(id=1, user_id=1, name="Key 1", key_hash=b"hash1", key_prefix="sk_abc...", is_active=True),
+            APIKey(id=2, user_id=1, name="Key 2", key_hash=b"hash2", key_prefix="sk_def...", is_active=True),
         ]
         mock_result.scalars.return_value.all.return_value = keys
         mock_session.execute.return_value = mock_result
@@ -378,28 +493,22 @@ class TestAuthService:
 
     @pytest.mark.asyncio
     async def test_delete_api_key(self, mock_session):
-        """测试删除 API 密钥"""
-        from app.models.user import APIKey
-
-        mock_result = MagicMock()
-        key = APIKey(id=1, user_id=1, name="Key 1", key_hash="hash", key_prefix="sk_abc...")
-        mock_result.scalar_one_or_none.return_value = key
-        mock_session.execute.return_value = mock_result
+        """测试删除 API 密钥（单条 DELETE）"""
+        mock_session.execute.return_value = MagicMock(rowcount=1)
 
         auth_service = AuthService(mock_session)
 
         result = await auth_service.delete_api_key(1, 1)
 
         assert result is True
-        mock_session.delete.assert_called_once()
+        mock_session.execute.assert_awaited_once()
+        mock_session.delete.assert_not_called()
         mock_session.commit.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_delete_api_key_not_found(self, mock_session):
         """测试删除不存在的 API 密钥"""
-        mock_result = MagicMock()
-        mock_result.scalar_one_or_none.return_value = None
-        mock_session.execute.return_value = mock_result
+        mock_session.execute.return_value = MagicMock(rowcount=0)
 
         auth_service = AuthService(mock_session)
 
@@ -407,6 +516,31 @@ class TestAuthService:
 
         assert result is False
 
+    @pytest.mark.asyncio
+    async def test_invalidate_session(self, mock_session):
+        """测试按 jti 单条 UPDATE 使会话失效"""
+        mock_session.execute.side_effect = [MagicMock(rowcount=1), MagicMock(rowcount=0)]
+
+        auth_service = AuthService(mock_session)
+
+        assert await auth_service.invalidate_session("jti-1") is True
+        assert await auth_service.invalidate_session("jti-1") is False
+        assert mock_session.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_sessions_batches(self, mock_session):
+        """测试过期会话按批删除，直到不足一批为止"""
+        full, partial = MagicMock(rowcount=100), MagicMock(rowcount=5)
+        mock_session.execute.side_effect = [full, partial]
+
+        auth_service = AuthService(mock_session)
+
+        removed = await auth_service.cleanup_expired_sessions(batch_size=100)
+
+        assert removed == 105
+        assert mock_session.execute.call_count == 2
+        assert mock_session.commit.call_count == 2
+
 
 class TestUserModel:
     """测试用户模型"""
@@ -447,7 +581,7 @@ class TestUserModel:
         api_key = APIKey(
             user_id=1,
             name="Test API Key",
-            key_hash="hashed_key",
+            key_hash=b"\x00" * 32,
             key_prefix="sk_test...",
             is_active=True,
         )
@@ -466,7 +600,7 @@ class TestUserModel:
             device_info="Chrome/120.0",
             ip_address="127.0.0.1",
             is_valid=True,
-            expires_at=datetime.utcnow() + timedelta(days=7),
+            expires_at=datetime.now(timezone.utc) + timedelta(days=7),
         )
 
         assert session.user_id == 1
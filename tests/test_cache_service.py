@@ -4,15 +4,19 @@
 测试 Redis 缓存功能和降级处理。
 """
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from app.services.cache_service import (
     RedisCache,
     get_cache,
     reset_cache,
     cached,
+    cached_batch,
+    coalesce_cache,
     CACHE_TTL,
-    get_cache_ttl
+    get_cache_ttl,
+    _pack,
+    _unpack,
 )
 
 
@@ -34,6 +38,11 @@ class TestCacheTTL:
         assert get_cache_ttl("quote") == 30
         assert get_cache_ttl("unknown") == 300  # 默认值
 
+    def test_cache_ttl_read_only(self):
+        """测试 TTL 配置运行期不可修改"""
+        with pytest.raises(TypeError):
+            CACHE_TTL["quote"] = 1
+
 
 class TestRedisCache:
     """Redis 缓存测试"""
@@ -49,7 +58,7 @@ class TestRedisCache:
         assert cache is not None
         assert cache._redis_client is not None or cache._redis_client is None
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
     def test_cache_connection_failure(self, mock_redis):
         """测试 Redis 连接失败时的降级处理"""
         mock_redis.side_effect = Exception("Connection failed")
@@ -58,7 +67,143 @@ class TestRedisCache:
         # 应该降级到内存模式
         assert cache.is_connected() is False
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
+    def test_cache_uses_bounded_blocking_pool(self, mock_redis):
+        """测试缓存客户端使用按配置封顶的阻塞连接池"""
+        import redis
+
+        from app.config import get_config
+
+        mock_redis.return_value = MagicMock()
+
+        RedisCache()
+
+        pool = mock_redis.call_args.kwargs["connection_pool"]
+        assert isinstance(pool, redis.BlockingConnectionPool)
+        assert pool.max_connections == get_config().redis_cache_max_connections
+        assert pool.timeout == get_config().redis_cache_pool_timeout
+
+    @patch('redis.Redis')
+    def test_cache_client_tracking(self, mock_redis):
+        """测试启用客户端缓存时连接池使用 RESP3 与本地响应缓存，并停用 L1"""
+        from dataclasses import replace
+
+        from app.config import get_config
+
+        config = replace(get_config(), redis_client_tracking=True)
+        mock_client = MagicMock()
+        mock_client.get.return_value = _pack({"v": 1})
+        mock_redis.return_value = mock_client
+
+        with patch('app.services.cache_service.get_config', return_value=config):
+            cache = RedisCache()
+
+        pool = mock_redis.call_args.kwargs["connection_pool"]
+        assert pool.cache is not None
+        cache.get("quote:600000")
+        cache.get("quote:600000")
+        assert mock_client.get.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch('redis.Redis')
+    async def test_client_tracking_keeps_l1_for_async_reads(self, mock_redis):
+        """测试启用客户端缓存时异步读取仍命中 L1（异步客户端没有本地缓存）"""
+        from dataclasses import replace
+
+        from app.config import get_config
+
+        config = replace(get_config(), redis_client_tracking=True)
+        mock_redis.return_value = MagicMock()
+        aio_client = AsyncMock()
+        aio_client.get.return_value = _pack({"v": 1})
+
+        with patch('app.services.cache_service.get_config', return_value=config):
+            cache = RedisCache()
+
+        with patch('redis.asyncio.Redis', return_value=aio_client):
+            assert await cache.aget("quote:600000") == {"v": 1}
+            assert await cache.aget("quote:600000") == {"v": 1}
+
+        aio_client.get.assert_awaited_once_with("quote:600000")
+
+    @patch('redis.Redis')
+    def test_cache_without_tracking_does_not_need_redis_cache(self, mock_redis):
+        """测试未开启客户端缓存时不依赖 redis.cache（redis-py 5.0 无该模块）"""
+        mock_redis.return_value = MagicMock()
+
+        with patch.dict("sys.modules", {"redis.cache": None}):
+            cache = RedisCache()
+
+        assert cache.is_connected
+
+    @patch('redis.Redis')
+    def test_cache_ops_skip_ping_until_failure(self, mock_redis):
+        """测试缓存操作不逐次 PING，命令失败后标记断开"""
+        from redis import ConnectionError as RedisConnectionError
+
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_client.get.return_value = None
+        mock_redis.return_value = mock_client
+
+        cache = RedisCache()
+        cache.get("a")
+        cache.get("b")
+        assert mock_client.ping.call_count == 1
+
+        mock_client.get.side_effect = RedisConnectionError("down")
+        assert cache.get("a") is None
+        assert cache.is_connected() is False
+        mock_client.get.reset_mock()
+        cache.get("a")
+        mock_client.get.assert_not_called()
+
+    @patch('redis.Redis')
+    def test_cache_l1_serves_repeat_reads(self, mock_redis):
+        """测试重复读取由进程内 L1 缓存返回，写入与删除使 L1 失效"""
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_client.get.return_value = _pack({"v": 1})
+        mock_redis.return_value = mock_client
+
+        cache = RedisCache()
+        assert cache.get("quote:600000") == {"v": 1}
+        assert cache.get("quote:600000") == {"v": 1}
+        assert mock_client.get.call_count == 1
+
+        cache.set("quote:600000", {"v": 2})
+        mock_client.get.return_value = _pack({"v": 2})
+        assert cache.get("quote:600000") == {"v": 2}
+        assert mock_client.get.call_count == 2
+
+        mock_client.scan_iter.return_value = iter([])
+        mock_client.pipeline.return_value.execute.return_value = []
+        cache.delete_pattern("quote:*")
+        cache.get("quote:600000")
+        assert mock_client.get.call_count == 3
+
+    def test_pack_compresses_large_values(self):
+        """测试超过阈值的缓存值压缩存储，解码后与原值一致"""
+        from app.services.cache_service import COMPRESS_THRESHOLD
+
+        small = {"close": 10.5}
+        large = {"close": [10.5] * COMPRESS_THRESHOLD}
+
+        assert _pack(small)[:1] == b"\x00"
+        packed = _pack(large)
+        assert packed[:1] == b"\x01"
+        assert len(packed) < COMPRESS_THRESHOLD
+        assert _unpack(_pack(small)) == small
+        assert _unpack(packed) == large
+
+    def test_pack_passes_bytes_through(self):
+        """测试已序列化的字节原样存储与返回，不经过 msgpack 编解码"""
+        body = b'{"code": "600000"}'
+
+        assert _pack(body) == b"\x02" + body
+        assert _unpack(_pack(bytearray(body))) == body
+
+    @patch('redis.Redis')
     def test_cache_get_miss(self, mock_redis):
         """测试缓存未命中"""
         mock_client = MagicMock()
@@ -70,7 +215,7 @@ class TestRedisCache:
         result = cache.get("test_key")
         assert result is None
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
     def test_cache_set(self, mock_redis):
         """测试缓存设置"""
         mock_client = MagicMock()
@@ -83,7 +228,28 @@ class TestRedisCache:
         # 验证 setex 被调用
         mock_client.setex.assert_called_once()
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
+    def test_cache_roundtrip_msgpack(self, mock_redis):
+        """测试缓存值以 msgpack 编码，不支持的类型按字符串保存，旧 JSON 值视为未命中"""
+        from decimal import Decimal
+
+        import numpy as np
+
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_redis.return_value = mock_client
+
+        cache = RedisCache()
+        assert cache.set("test_key", {"price": Decimal("1.20"), "volume": np.int64(3)}, ttl=60)
+        stored = mock_client.setex.call_args.args[2]
+
+        mock_client.get.return_value = stored
+        assert cache.get("test_key") == {"price": "1.20", "volume": 3}
+
+        mock_client.get.return_value = b'{"price": 1.2}'
+        assert cache.get("legacy_key") is None
+
+    @patch('redis.Redis')
     def test_cache_delete(self, mock_redis):
         """测试缓存删除"""
         mock_client = MagicMock()
@@ -95,19 +261,53 @@ class TestRedisCache:
 
         mock_client.delete.assert_called_once_with("test_key")
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
     def test_cache_delete_pattern(self, mock_redis):
         """测试批量删除缓存"""
         mock_client = MagicMock()
         mock_client.ping.return_value = True
-        mock_client.keys.return_value = ["key1", "key2"]
-        mock_client.delete.return_value = 2
+        mock_client.scan_iter.return_value = iter(["key1", "key2"])
+        pipe = mock_client.pipeline.return_value
+        pipe.execute.return_value = [2]
         mock_redis.return_value = mock_client
 
         cache = RedisCache()
         deleted = cache.delete_pattern("test:*")
 
         assert deleted == 2
+        mock_client.keys.assert_not_called()
+        pipe.unlink.assert_called_once_with("key1", "key2")
+
+
+class TestGetCache:
+    """全局缓存实例测试"""
+
+    def setup_method(self):
+        reset_cache()
+
+    def teardown_method(self):
+        reset_cache()
+
+    def test_get_cache_creates_single_instance_under_threads(self):
+        """测试多线程并发首次获取只创建一个实例"""
+        import threading
+        import time
+
+        created = []
+
+        def slow_init(self):
+            created.append(self)
+            time.sleep(0.05)
+
+        with patch.object(RedisCache, "__init__", slow_init):
+            threads = [threading.Thread(target=get_cache) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(created) == 1
+            assert get_cache() is created[0]
 
 
 class TestCachedDecorator:
@@ -117,7 +317,7 @@ class TestCachedDecorator:
         """每个测试前重置缓存"""
         reset_cache()
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
     def test_cached_decorator_sync(self, mock_redis):
         """测试同步函数缓存装饰器"""
         mock_client = MagicMock()
@@ -131,15 +331,50 @@ class TestCachedDecorator:
 
         result = test_func(1, 2)
         assert result == 3
-        # 验证 setex 被调用
-        mock_client.setex.assert_called()
+        # 未命中后以 SET ... NX GET 写入
+        mock_client.set.assert_called_once_with(
+            "test:1:2", _pack(3), ex=60, nx=True, get=True
+        )
+
+    @patch('redis.Redis')
+    def test_cached_decorator_caches_none_when_enabled(self, mock_redis):
+        """测试 cache_none=True 时缓存的 None 视为命中，不再回源"""
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_client.get.return_value = _pack(None)
+        mock_redis.return_value = mock_client
+
+        calls = []
+
+        @cached("test", ttl=60, cache_none=True)
+        def test_func(a):
+            calls.append(a)
+            return None
+
+        assert test_func(1) is None
+        assert calls == []
+
+    @patch('redis.Redis')
+    def test_cached_decorator_concurrent_fill(self, mock_redis):
+        """测试回源期间已被其他进程写入时返回已存在的值"""
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_client.get.return_value = None
+        mock_client.set.return_value = _pack(100)
+        mock_redis.return_value = mock_client
+
+        @cached("test", ttl=60)
+        def test_func(a, b):
+            return a + b
+
+        assert test_func(1, 2) == 100
 
-    @patch('redis.from_url')
+    @patch('redis.Redis')
     def test_cached_decorator_cache_hit(self, mock_redis):
         """测试缓存命中"""
         mock_client = MagicMock()
         mock_client.ping.return_value = True
-        mock_client.get.return_value = '{"result": 100}'
+        mock_client.get.return_value = _pack({"result": 100})
         mock_redis.return_value = mock_client
 
         @cached("test", ttl=60)
@@ -151,8 +386,112 @@ class TestCachedDecorator:
         # setex 不应该被调用（缓存命中）
         mock_client.setex.assert_not_called()
 
+    def test_key_builder_format(self):
+        """测试缓存键格式：位置参数在前，关键字参数按名称排序，非标量参数忽略"""
+        from app.services.cache_service import _make_key_builder
+
+        build = _make_key_builder("quote", True)
+        assert build("600000", 5, [1], period="1d", adjust="qfq") == "quote:600000:5:adjust=qfq:period=1d"
+        assert build() == "quote"
+        assert _make_key_builder("quote", False)("600000") == "quote"
+
+    def test_compiled_key_builder(self):
+        """测试标注为标量类型的函数生成专用键构造函数，未标注时回退通用构造函数"""
+        from app.services.cache_service import _compile_key_builder
+
+        class Service:
+            def get_kline(self, code: str, days: int = 30, *, period: str = "1d"):
+                ...
+
+        build = _compile_key_builder(Service.get_kline, "kline")
+        assert build(Service(), "600000") == "kline:600000:30:1d"
+        assert build(Service(), code="600000", days=5, period="1w") == "kline:600000:5:1w"
+
+        def untyped(code, days=30):
+            ...
+
+        assert _compile_key_builder(untyped, "kline") is None
+
     @pytest.mark.asyncio
-    @patch('redis.from_url')
+    @patch('redis.Redis')
+    async def test_coalesce_cache_merges_concurrent_reads(self, mock_redis):
+        """测试合并上下文内并发的缓存读取只发起一次 MGET"""
+        import asyncio
+
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_redis.return_value = mock_client
+
+        aio_client = AsyncMock()
+        aio_client.mget.return_value = [_pack(1), None]
+        aio_client.set.return_value = None
+
+        @cached("quote", ttl=60)
+        async def get_quote(code):
+            return len(code)
+
+        with patch('redis.asyncio.Redis', return_value=aio_client):
+            async with coalesce_cache():
+                results = await asyncio.gather(get_quote("a"), get_quote("bb"), get_quote("a"))
+
+        assert results == [1, 2, 1]
+        aio_client.mget.assert_awaited_once_with(["quote:a", "quote:bb"])
+        aio_client.get.assert_not_awaited()
+
+    @patch('redis.Redis')
+    def test_cached_batch_fetches_only_misses(self, mock_redis):
+        """测试批量缓存装饰器一次 MGET，只为未命中的键调用原函数并一次写回"""
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_client.mget.return_value = [_pack(1), None]
+        pipe = mock_client.pipeline.return_value
+        mock_redis.return_value = mock_client
+
+        calls = []
+
+        @cached_batch("test", ttl=60)
+        def test_func(codes):
+            calls.append(codes)
+            return {code: len(code) for code in codes}
+
+        result = test_func(["a", "bb"])
+
+        assert result == {"a": 1, "bb": 2}
+        assert calls == [["bb"]]
+        mock_client.mget.assert_called_once_with(["test:a", "test:bb"])
+        pipe.setex.assert_called_once_with("test:bb", 60, _pack(2))
+        pipe.execute.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch('redis.Redis')
+    async def test_cached_batch_async_uses_async_client(self, mock_redis):
+        """测试异步批量缓存经异步客户端 MGET 与管道写回，不调用同步客户端"""
+        mock_client = MagicMock()
+        mock_client.ping.return_value = True
+        mock_redis.return_value = mock_client
+
+        aio_client = AsyncMock()
+        aio_client.mget.return_value = [_pack(1), None]
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        aio_client.pipeline = MagicMock(return_value=pipe)
+
+        @cached_batch("test", ttl=60)
+        async def test_func(codes):
+            return {code: len(code) for code in codes}
+
+        with patch('redis.asyncio.Redis', return_value=aio_client):
+            result = await test_func(["a", "bb"])
+
+        assert result == {"a": 1, "bb": 2}
+        aio_client.mget.assert_awaited_once_with(["test:a", "test:bb"])
+        pipe.setex.assert_called_once_with("test:bb", 60, _pack(2))
+        pipe.execute.assert_awaited_once()
+        mock_client.mget.assert_not_called()
+        mock_client.pipeline.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch('redis.Redis')
     async def test_cached_decorator_async(self, mock_redis):
         """测试异步函数缓存装饰器"""
         mock_client = MagicMock()
@@ -160,9 +499,18 @@ class TestCachedDecorator:
         mock_client.get.return_value = None
         mock_redis.return_value = mock_client
 
+        aio_client = AsyncMock()
+        aio_client.get.return_value = None
+        aio_client.set.return_value = None
+
         @cached("test_async", ttl=60)
         async def test_async_func(a):
             return a * 2
 
-        result = await test_async_func(5)
+        with patch('redis.asyncio.Redis', return_value=aio_client):
+            result = await test_async_func(5)
         assert result == 10
+        # 协程中走异步客户端，不调用阻塞的同步客户端
+        aio_client.get.assert_awaited_once_with("test_async:5")
+        aio_client.set.assert_awaited_once()
+        mock_client.get.assert_not_called()
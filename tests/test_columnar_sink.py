@@ -0,0 +1,88 @@
+"""
+列式分析存储测试用例
+
+测试写入缓冲、分区落盘与自动刷新逻辑。
+"""
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.columnar_sink import ColumnarSink
+
+
+def _quote(day: date) -> dict:
+    return {
+        "trade_date": day,
+        "open": 10.0,
+        "high": 11.0,
+        "low": 9.5,
+        "close": 10.5,
+        "volume": 1000.0,
+        "notes": "not mirrored",
+    }
+
+
+class TestColumnarSink:
+    """测试列式存储缓冲与落盘"""
+
+    def test_flush_writes_one_file_per_partition(self, tmp_path):
+        """测试按 股票代码/年份 分区写出"""
+        sink = ColumnarSink(root=str(tmp_path), flush_rows=100)
+
+        with patch.object(sink, "_write_table") as mock_write:
+            sink.append("quotes", "000001", [_quote(date(2023, 12, 29)), _quote(date(2024, 1, 2))])
+            sink.append("quotes", "600000", [_quote(date(2024, 1, 2))])
+            mock_write.assert_not_called()
+
+            assert sink.flush() == 3
+
+        paths = sorted(call.args[0] for call in mock_write.call_args_list)
+        assert len(paths) == 3
+        assert "quotes/stock_code=000001/year=2023/" in paths[0].replace("\\", "/")
+        rows = mock_write.call_args_list[0].args[1]
+        assert "notes" not in rows[0]
+        assert sink.flush() == 0
+
+    def test_append_auto_flushes_at_threshold(self, tmp_path):
+        """测试缓冲达到阈值自动落盘"""
+        sink = ColumnarSink(root=str(tmp_path), flush_rows=2)
+
+        with patch.object(sink, "_write_table") as mock_write:
+            sink.append("klines", "000001", [_quote(date(2024, 1, 2)), _quote(date(2024, 1, 3))])
+
+        mock_write.assert_called_once()
+        assert len(mock_write.call_args.args[1]) == 2
+
+    def test_unknown_dataset(self, tmp_path):
+        """测试未知数据集"""
+        sink = ColumnarSink(root=str(tmp_path))
+
+        with pytest.raises(ValueError):
+            sink.append("ticks", "000001", [])
+
+    def test_view_keeps_stock_code_as_varchar(self, tmp_path):
+        """测试视图将 stock_code 分区固定为 VARCHAR，避免被推断为整数"""
+        (tmp_path / "quotes").mkdir()
+        duckdb = MagicMock()
+
+        with patch.dict("sys.modules", {"duckdb": duckdb}):
+            ColumnarSink(root=str(tmp_path))._connection()
+
+        sql = duckdb.connect.return_value.execute.call_args.args[0]
+        assert "hive_types = {'stock_code': VARCHAR, 'year': INTEGER}" in sql
+
+    def test_roundtrip_leading_zero_code(self, tmp_path):
+        """测试前导零股票代码落盘后仍可按字符串查询"""
+        pytest.importorskip("pyarrow")
+        pytest.importorskip("duckdb")
+
+        sink = ColumnarSink(root=str(tmp_path), flush_rows=100)
+        sink.append("quotes", "000001", [_quote(date(2024, 1, 2))])
+        sink.flush()
+
+        df = sink.query("SELECT stock_code, close FROM quotes WHERE stock_code = ?", ["000001"])
+        sink.close()
+
+        assert df["stock_code"].tolist() == ["000001"]
+        assert df["close"].tolist() == [10.5]
@@ -13,6 +13,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 
 from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 
@@ -127,7 +128,7 @@ class TestStockOperations:
 
             assert stock is not None
             mock_session.execute.assert_called_once()
-            mock_session.commit.assert_called_once()
+            mock_session.commit.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_insert_stocks_bulk(self, mock_session):
@@ -151,7 +152,7 @@ class TestStockOperations:
 
             assert count == 2
             mock_session.execute.assert_called_once()
-            mock_session.commit.assert_called_once()
+            mock_session.commit.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_get_stock_by_code(self, mock_session):
@@ -175,6 +176,22 @@ class TestStockOperations:
         assert stock is not None
         mock_session.execute.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_get_stock_id_cached(self, mock_session):
+        """测试代码到 ID 的解析命中缓存后不再查库，未找到的代码不缓存"""
+        mock_session.scalar = AsyncMock(side_effect=[7, None])
+
+        with patch("app.services.data_storage.get_engine"):
+            from app.services.data_storage import DataStorageService
+
+            service = DataStorageService()
+            assert await service.get_stock_id(mock_session, "000001") == 7
+            assert await service.get_stock_id(mock_session, "000001") == 7
+            assert await service.get_stock_id(mock_session, "999999") is None
+
+        assert mock_session.scalar.await_count == 2
+        assert "999999" not in service._stock_ids
+
     @pytest.mark.asyncio
     async def test_get_all_stocks(self, mock_session):
         """测试获取所有股票"""
@@ -235,7 +252,26 @@ class TestQuoteOperations:
             )
 
             assert quote is not None
-            mock_session.commit.assert_called_once()
+            mock_session.commit.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upsert_quote_without_returning(self, mock_session):
+        """测试单条行情写入不带 RETURNING，仅返回受影响行数"""
+        mock_session.execute.return_value = MagicMock(rowcount=1)
+
+        with patch("app.services.data_storage.get_engine"):
+            from app.services.data_storage import DataStorageService
+
+            service = DataStorageService()
+            count = await service.upsert_quote(
+                mock_session,
+                {"stock_id": 1, "trade_date": "20240115", "open": 10.5, "close": 10.8},
+            )
+
+        assert count == 1
+        stmt = mock_session.execute.call_args.args[0]
+        assert not stmt._returning
+        assert "ON CONFLICT" in str(stmt.compile(dialect=postgresql.dialect()))
 
     @pytest.mark.asyncio
     async def test_insert_quotes_bulk(self, mock_session):
@@ -275,6 +311,16 @@ class TestQuoteOperations:
 
             assert count == 2
 
+    def test_trade_date_string_coerced_to_date(self):
+        """测试字符串交易日期转换为 date"""
+        from datetime import date
+        from app.services.data_storage import _to_date
+
+        assert _to_date("2024-01-15") == date(2024, 1, 15)
+        assert _to_date("20240115") == date(2024, 1, 15)
+        assert _to_date(date(2024, 1, 15)) == date(2024, 1, 15)
+        assert _to_date(None) is None
+
 
 class TestKLineOperations:
     """测试K线数据操作"""
@@ -320,7 +366,7 @@ class TestKLineOperations:
             )
 
             assert kline is not None
-            mock_session.commit.assert_called_once()
+            mock_session.commit.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_insert_klines_bulk(self, mock_session):
@@ -389,6 +435,9 @@ class TestIncrementalUpdate:
         )
 
         assert date == "2024-01-15"
+        sql = str(mock_session.execute.call_args.args[0])
+        assert "max(stock_quotes.trade_date)" in sql
+        assert "ORDER BY" not in sql
 
     @pytest.mark.asyncio
     async def test_get_latest_kline_date(self, mock_session):
@@ -3,6 +3,9 @@
 
 测试数据库连接、Redis连接和数据模型。
 """
+import json
+from datetime import date
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -74,15 +77,59 @@ class TestRedisConnection:
         """测试创建 Redis 客户端"""
         from app.db.database import create_redis_client, get_redis_async
 
-        # Mock Redis 连接
-        with patch("redis.asyncio.Redis.from_url") as mock_redis:
+        # Mock Redis 连接池
+        with patch("app.db.database._redis_client", None), \
+             patch("redis.asyncio.ConnectionPool.from_url") as mock_pool, \
+             patch("redis.asyncio.Redis.from_pool") as mock_redis:
             mock_client = AsyncMock()
             mock_redis.return_value = mock_client
 
             client = await create_redis_client(redis_url="redis://localhost:6379/0")
 
-            assert client is not None
-            mock_redis.assert_called_once()
+            assert client is mock_client
+            mock_pool.assert_called_once()
+            assert mock_pool.call_args.kwargs["health_check_interval"] == 30
+            assert mock_pool.call_args.kwargs["decode_responses"] is False
+            mock_redis.assert_called_once_with(mock_pool.return_value)
+
+    @pytest.mark.asyncio
+    async def test_snapshot_keys_separate_from_cache(self):
+        """测试行情快照键不与 RedisCache 的 quote: 缓存键共用前缀"""
+        from app.db.database import snapshot
+
+        client = AsyncMock()
+        client.mget.return_value = [None]
+        with patch("app.db.database.get_redis_async", AsyncMock(return_value=client)):
+            await snapshot(["600000"])
+
+        client.mget.assert_awaited_once_with(["snapshot:quote:600000"])
+
+    @pytest.mark.asyncio
+    async def test_shared_pubsub_close_stops_reader(self):
+        """测试关闭共享订阅时等待读取任务结束并关闭连接"""
+        import asyncio
+
+        from app.db.database import SharedPubSub
+
+        pubsub = MagicMock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.close = AsyncMock()
+
+        async def listen():
+            await asyncio.Event().wait()
+            yield {}
+
+        pubsub.listen = listen
+        client = MagicMock()
+        client.pubsub.return_value = pubsub
+
+        shared = SharedPubSub(client)
+        await shared.subscribe("quote:600000")
+        reader = shared._reader_task
+        await shared.close()
+
+        assert reader.cancelled()
+        pubsub.close.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_get_redis_async(self):
@@ -167,7 +214,7 @@ class TestStockModel:
 
         quote = StockQuote(
             stock_id=1,
-            trade_date="2024-01-15",
+            trade_date=date(2024, 1, 15),
             open=10.5,
             high=11.0,
             low=10.2,
@@ -177,7 +224,7 @@ class TestStockModel:
         )
 
         assert quote.stock_id == 1
-        assert quote.trade_date == "2024-01-15"
+        assert quote.trade_date == date(2024, 1, 15)
         assert quote.close == 10.8
 
     def test_kline_model_creation(self):
@@ -187,7 +234,7 @@ class TestStockModel:
         kline = KLineData(
             stock_id=1,
             period="1d",
-            trade_date="2024-01-15",
+            trade_date=date(2024, 1, 15),
             open=10.5,
             high=11.0,
             low=10.2,
@@ -206,7 +253,7 @@ class TestStockModel:
         analysis = StockAnalysis(
             stock_id=1,
             analysis_type="daily",
-            analysis_date="2024-01-15",
+            analysis_date=date(2024, 1, 15),
             content={"trend": "up", "signal": "buy"},
             summary="今日看涨",
             confidence=0.8,
@@ -228,6 +275,298 @@ class TestStockModel:
         assert MarketType.HK.value == "HK"
         assert MarketType.US.value == "US"
 
+    def test_enum_columns_use_native_pg_enum(self):
+        """测试低基数字符串列在 PostgreSQL 上映射为原生 ENUM"""
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+
+        from app.models.stock import KLineData, Stock
+
+        dialect = postgresql.dialect()
+        assert "market market_type NOT NULL" in str(CreateTable(Stock.__table__).compile(dialect=dialect))
+        assert "period kline_period NOT NULL" in str(CreateTable(KLineData.__table__).compile(dialect=dialect))
+
+    @pytest.mark.asyncio
+    async def test_bulk_insert_quotes_in_batches(self):
+        """测试行情按批次以 Core executemany 写入"""
+        from sqlalchemy import func, select
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.models.stock import Base, Stock, StockQuote, bulk_insert_quotes
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[Stock.__table__, StockQuote.__table__]
+            )
+
+        rows = (
+            {
+                "stock_id": 1,
+                "trade_date": date(2024, 1, day),
+                "open": 10.0,
+                "high": 11.0,
+                "low": 9.5,
+                "close": 10.5,
+                "volume": 1000.0,
+            }
+            for day in range(1, 6)
+        )
+
+        async with AsyncSession(engine) as session:
+            with patch.object(session, "execute", wraps=session.execute) as spy:
+                inserted = await bulk_insert_quotes(session, rows, batch_size=2)
+            count = await session.scalar(select(func.count()).select_from(StockQuote))
+
+        assert inserted == 5
+        assert count == 5
+        assert spy.await_count == 3
+
+        await engine.dispose()
+
+    def test_copy_records_apply_bind_processors(self):
+        """测试 COPY 行数据经过列类型转换（定点缩放、JSON 序列化）"""
+        from sqlalchemy.dialects.postgresql.asyncpg import dialect
+        from app.models.stock import KLineData, Stock, _copy_records
+
+        kline_rows = [{"stock_id": 1, "trade_date": date(2024, 1, 2), "close": 10.5, "amount": None}]
+        assert list(_copy_records(KLineData.__table__, list(kline_rows[0]), kline_rows, dialect())) == [
+            (1, date(2024, 1, 2), 105000, None)
+        ]
+
+        stock_rows = [{"code": "000001", "extra_data": {"a": 1}}]
+        assert list(_copy_records(Stock.__table__, ["code", "extra_data"], stock_rows, dialect())) == [
+            ("000001", '{"a": 1}')
+        ]
+
+    @pytest.mark.asyncio
+    async def test_upsert_rows_uses_copy_for_large_batches(self):
+        """测试 asyncpg 下大批量 upsert 走 COPY 暂存表，小批量仍为单条 INSERT"""
+        from sqlalchemy.dialects.postgresql.asyncpg import dialect
+        from app.models.stock import COPY_UPSERT_MIN_ROWS, StockQuote, upsert_rows
+
+        driver_conn = MagicMock()
+        driver_conn.copy_records_to_table = AsyncMock()
+        raw = MagicMock(driver_connection=driver_conn)
+        connection = MagicMock()
+        connection.get_raw_connection = AsyncMock(return_value=raw)
+
+        session = MagicMock()
+        session.execute = AsyncMock()
+        session.connection = AsyncMock(return_value=connection)
+        session.get_bind.return_value = MagicMock(dialect=dialect())
+
+        def on_conflict(stmt):
+            return stmt.on_conflict_do_nothing(index_elements=["stock_id", "trade_date"])
+
+        rows = [
+            {"stock_id": 1, "trade_date": date(2024, 1, 1), "close": 10.0}
+            for _ in range(COPY_UPSERT_MIN_ROWS)
+        ]
+        assert await upsert_rows(session, StockQuote.__table__, rows, on_conflict) == len(rows)
+
+        driver_conn.copy_records_to_table.assert_awaited_once()
+        assert driver_conn.copy_records_to_table.await_args.kwargs["columns"] == ["stock_id", "trade_date", "close"]
+        statements = [str(call.args[0]) for call in session.execute.await_args_list]
+        assert statements[0] == (
+            "CREATE TEMP TABLE _stage_stock_quotes ON COMMIT DROP AS "
+            "SELECT stock_id, trade_date, close FROM stock_quotes WITH NO DATA"
+        )
+        assert "FROM _stage_stock_quotes ON CONFLICT" in statements[1]
+        assert statements[2] == "DROP TABLE _stage_stock_quotes"
+
+        session.execute.reset_mock()
+        await upsert_rows(session, StockQuote.__table__, rows[:1], on_conflict)
+        session.execute.assert_awaited_once()
+        assert driver_conn.copy_records_to_table.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_upsert_rows_streams_generator_to_copy(self):
+        """测试生成器输入配合 row_count 直接流式交给 COPY，不先物化为列表"""
+        from types import GeneratorType
+        from sqlalchemy.dialects.postgresql.asyncpg import dialect
+        from app.models.stock import COPY_UPSERT_MIN_ROWS, StockQuote, upsert_rows
+
+        driver_conn = MagicMock()
+        driver_conn.copy_records_to_table = AsyncMock()
+        connection = MagicMock()
+        connection.get_raw_connection = AsyncMock(return_value=MagicMock(driver_connection=driver_conn))
+        session = MagicMock()
+        session.execute = AsyncMock()
+        session.connection = AsyncMock(return_value=connection)
+        session.get_bind.return_value = MagicMock(dialect=dialect())
+
+        rows = ({"stock_id": 1, "trade_date": date(2024, 1, 1), "close": 10.0} for _ in range(COPY_UPSERT_MIN_ROWS))
+        count = await upsert_rows(
+            session, StockQuote.__table__, rows,
+            lambda stmt: stmt.on_conflict_do_nothing(), row_count=COPY_UPSERT_MIN_ROWS,
+        )
+
+        assert count == COPY_UPSERT_MIN_ROWS
+        records = driver_conn.copy_records_to_table.await_args.kwargs["records"]
+        assert isinstance(records, GeneratorType)
+        assert len(list(records)) == COPY_UPSERT_MIN_ROWS
+
+    @pytest.mark.asyncio
+    async def test_upsert_rows_chunks_values_path(self):
+        """测试非 COPY 路径按块执行，块大小受绑定参数上限约束"""
+        from app.models import stock
+        from app.models.stock import StockQuote, upsert_rows
+
+        session = MagicMock()
+        session.execute = AsyncMock()
+        session.get_bind.return_value.dialect.name = "sqlite"
+
+        def on_conflict(stmt):
+            return stmt.on_conflict_do_nothing(index_elements=["stock_id", "trade_date"])
+
+        rows = [{"stock_id": 1, "trade_date": date(2024, 1, 1), "close": 10.0} for _ in range(25)]
+        with patch.object(stock, "UPSERT_CHUNK", 10), patch.object(stock, "COPY_UPSERT_MIN_ROWS", 1000):
+            assert await upsert_rows(session, StockQuote.__table__, rows, on_conflict) == 25
+        assert session.execute.await_count == 3
+
+        session.execute.reset_mock()
+        with patch.object(stock, "PG_MAX_BIND_PARAMS", 15):
+            await upsert_rows(session, StockQuote.__table__, rows[:10], on_conflict)
+        assert session.execute.await_count == 2
+
+
+    @pytest.mark.asyncio
+    async def test_prices_stored_as_fixed_point(self):
+        """测试价格以整数定点存储，读取与比较仍使用 float"""
+        from sqlalchemy import select
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.models.stock import Base, Stock, StockQuote
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[Stock.__table__, StockQuote.__table__]
+            )
+
+        async with AsyncSession(engine) as session:
+            session.add(StockQuote(
+                stock_id=1,
+                trade_date=date(2024, 1, 15),
+                open=10.1,
+                high=10.2,
+                low=9.9,
+                close=10.15,
+                volume=1200.0,
+                amount=12180.5,
+            ))
+            await session.commit()
+
+            raw = (await session.execute(text("SELECT close, volume, amount FROM stock_quotes"))).one()
+            quote = await session.scalar(select(StockQuote).where(StockQuote.close >= 10.15))
+
+        assert tuple(raw) == (101500, 1200, 1218050)
+        assert quote.close == 10.15
+        assert quote.amount == 12180.5
+
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_quote_check_constraints(self):
+        """测试最高价低于最低价的行情被 CHECK 约束拒绝"""
+        from sqlalchemy.exc import IntegrityError
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.models.stock import Base, Stock, StockQuote
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[Stock.__table__, StockQuote.__table__]
+            )
+
+        async with AsyncSession(engine) as session:
+            session.add(StockQuote(
+                stock_id=1,
+                trade_date=date(2024, 1, 15),
+                open=10.0,
+                high=9.0,
+                low=10.5,
+                close=10.0,
+                volume=100.0,
+            ))
+            with pytest.raises(IntegrityError):
+                await session.commit()
+
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_analysis_content_stored_packed(self):
+        """测试分析内容压缩存储为二进制，读取时还原为 dict"""
+        from sqlalchemy import select
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.orm import undefer
+        from app.models.stock import Base, Stock, StockAnalysis
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[Stock.__table__, StockAnalysis.__table__]
+            )
+
+        content = {"trend": "up", "signals": [{"name": "macd", "value": 0.5}] * 50}
+        async with AsyncSession(engine) as session:
+            session.add(StockAnalysis(stock_id=1, analysis_date=date(2024, 1, 15), content=content))
+            await session.commit()
+
+            raw = await session.scalar(text("SELECT content_packed FROM stock_analysis"))
+            analysis = await session.scalar(select(StockAnalysis).options(undefer(StockAnalysis.content)))
+
+        assert isinstance(raw, bytes)
+        assert len(raw) < len(json.dumps(content))
+        assert analysis.content == content
+
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_refresh_kline_indicators(self):
+        """测试重算K线指标并替换旧指标行"""
+        from sqlalchemy import func, select
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.models.stock import Base, KLineData, KLineIndicators, Stock, bulk_insert_klines
+        from app.services.indicators import refresh_kline_indicators
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all,
+                tables=[Stock.__table__, KLineData.__table__, KLineIndicators.__table__],
+            )
+
+        rows = [
+            {
+                "stock_id": 1,
+                "period": "1d",
+                "trade_date": date(2024, 1, day),
+                "open": 10.0 + day,
+                "high": 10.5 + day,
+                "low": 9.5 + day,
+                "close": 10.0 + day,
+                "volume": 1000.0,
+            }
+            for day in range(1, 11)
+        ]
+
+        async with AsyncSession(engine) as session:
+            await bulk_insert_klines(session, rows)
+            assert await refresh_kline_indicators(session, 1, "1d") == 10
+            assert await refresh_kline_indicators(session, 1, "1d") == 10
+
+            count = await session.scalar(select(func.count()).select_from(KLineIndicators))
+            latest = await session.scalar(
+                select(KLineIndicators).order_by(KLineIndicators.trade_date.desc()).limit(1)
+            )
+
+        assert count == 10
+        assert latest.trade_date == date(2024, 1, 10)
+        assert latest.ma_50 == pytest.approx(15.5)
+        assert latest.atr_14 > 0
+
+        await engine.dispose()
+
 
 class TestConnectionTest:
     """测试连接测试功能"""
@@ -248,6 +587,23 @@ class TestConnectionTest:
 
             assert isinstance(result, bool)
 
+    @pytest.mark.asyncio
+    async def test_test_database_connection_uses_text_clause(self):
+        """测试数据库探测使用 text() 语句并缓存成功结果"""
+        import app.db.database as database
+
+        mock_conn = AsyncMock()
+        mock_engine = MagicMock()
+        mock_engine.connect.return_value.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        with patch.object(database, "_last_db_ok_at", 0.0), \
+             patch("app.db.database.get_engine", return_value=mock_engine):
+            assert await database.test_database_connection() is True
+            assert await database.test_database_connection() is True
+
+        mock_conn.execute.assert_awaited_once_with(database.SELECT1)
+
     @pytest.mark.asyncio
     async def test_test_redis_connection_mock(self):
         """测试Redis连接测试（Mock）"""
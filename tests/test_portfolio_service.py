@@ -57,6 +57,16 @@ class TestPortfolioService:
         assert TransactionType.SPLIT.value == "split"
         assert TransactionType.MERGE.value == "merge"
 
+    def test_enum_columns_stored_as_smallint(self):
+        """测试枚举列以 SMALLINT 编码存取"""
+        column_type = Transaction.__table__.c.transaction_type.type
+
+        assert column_type.process_bind_param("sell", None) == 2
+        assert column_type.process_bind_param(TransactionType.BUY, None) == 1
+        assert column_type.process_result_value(2, None) is TransactionType.SELL
+        with pytest.raises(ValueError):
+            column_type.process_bind_param("unknown", None)
+
     @pytest.mark.asyncio
     async def test_create_portfolio(self, portfolio_service, mock_session):
         """测试创建投资组合"""
@@ -412,3 +422,44 @@ class TestPortfolioService:
         assert "returns" in report
         assert "positions" in report
         assert report["total_positions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_update_position_prices(self):
+        """测试批量更新持仓价格只写 current_price，并按 RETURNING 计数"""
+        from sqlalchemy import insert, select
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Position.metadata.create_all, tables=[Position.__table__])
+            await conn.execute(
+                insert(Position.__table__),
+                [
+                    {"portfolio_id": portfolio_id, "stock_code": code, "quantity": 100.0,
+                     "cost_price": 10.0, "total_cost": 1000.0, "position_type": "long"}
+                    for portfolio_id, code in ((1, "600000"), (1, "000001"), (1, "000002"), (2, "600000"))
+                ],
+            )
+
+        async with AsyncSession(engine) as session:
+            service = PortfolioService(session)
+            updated = await service.update_position_prices({"600000": 12.0, "000001": 9.5, "300750": 1.0})
+            rows = (await session.execute(
+                select(Position.stock_code, Position.current_price, Position.market_value).order_by(Position.id)
+            )).all()
+
+        assert updated == 3
+        assert [tuple(row) for row in rows] == [
+            ("600000", 12.0, 1200.0),
+            ("000001", 9.5, 950.0),
+            ("000002", None, None),
+            ("600000", 12.0, 1200.0),
+        ]
+
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_update_position_prices_empty(self, portfolio_service, mock_session):
+        """测试空价格表不访问数据库"""
+        assert await portfolio_service.update_position_prices({}) == 0
+        mock_session.execute.assert_not_called()
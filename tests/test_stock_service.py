@@ -77,6 +77,57 @@ class TestStockCache:
         assert cache.get("key2") == "value2"
 
 
+class TestBarBuffer:
+    """列式K线缓冲测试"""
+
+    def test_append_grows_and_view_slices_by_date(self):
+        """测试扩容追加与按日期二分切片"""
+        import numpy as np
+        from app.services.stock_service import BarBuffer
+
+        bars = BarBuffer(capacity=2)
+        dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-06"))
+        closes = np.arange(5, dtype=np.float64)
+        bars.append(dates[:3], close=closes[:3])
+        bars.append(dates[3:], close=closes[3:])
+
+        view = bars.view("2024-01-02", "2024-01-04")
+
+        assert len(bars) == 5
+        assert view["close"].tolist() == [1.0, 2.0, 3.0]
+        assert np.shares_memory(view["close"], bars.view()["close"])
+
+    def test_view_is_read_only(self):
+        """测试视图只读，写入不会污染共享的缓冲，缓冲本身仍可追加"""
+        import numpy as np
+        from app.services.stock_service import BarBuffer
+
+        bars = BarBuffer(capacity=4)
+        bars.append(np.array(["2024-01-01"], dtype="datetime64[D]"), close=np.array([1.0]))
+        view = bars.view()
+
+        with pytest.raises(ValueError):
+            view["close"][0] = 99.0
+        bars.append(np.array(["2024-01-02"], dtype="datetime64[D]"), close=np.array([2.0]))
+
+        assert bars.view()["close"].tolist() == [1.0, 2.0]
+
+    def test_to_records(self):
+        """测试转换为字典列表"""
+        import numpy as np
+        from app.services.stock_service import BarBuffer
+
+        bars = BarBuffer()
+        bars.append(np.array(["2024-01-02"], dtype="datetime64[D]"), open=10.0, close=10.5, volume=100.0)
+
+        record = bars.to_records("sh600000")[0]
+
+        assert record["date"] == "2024-01-02"
+        assert record["close"] == 10.5
+        assert record["volume"] == 100
+        assert isinstance(record["volume"], int)
+
+
 class TestStockService:
     """股票服务测试"""
 
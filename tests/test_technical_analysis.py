@@ -409,3 +409,48 @@ class TestEdgeCases:
         # 短期 MA 应该在长期 MA 之下 (下跌趋势)
         assert ma_df["MA5"].iloc[-1] < ma_df["MA10"].iloc[-1]
         assert ma_df["MA10"].iloc[-1] < ma_df["MA20"].iloc[-1]
+
+
+class TestVectorizedIndicators:
+    """数组指标内核测试"""
+
+    def test_ema_matches_pandas(self):
+        """测试 EMA 与 pandas ewm 口径一致"""
+        from app.services.indicators import ema
+
+        df = create_mock_data(days=100)
+
+        expected = calculate_ema(df["close"], 12).to_numpy()
+        assert np.allclose(ema(df["close"].to_numpy(), 12), expected)
+
+    def test_rsi_matches_pandas(self):
+        """测试 RSI 与 calculate_rsi 口径一致"""
+        from app.services.indicators import rsi
+
+        df = create_mock_data(days=100)
+
+        expected = calculate_rsi(df, 14).to_numpy()
+        assert np.allclose(rsi(df["close"].to_numpy(), 14), expected)
+
+    def test_atr_constant_range(self):
+        """测试价差恒定时 ATR 等于该价差"""
+        from app.services.indicators import atr
+
+        close = np.full(30, 10.0)
+        result = atr(close + 0.5, close - 0.5, close, 14)
+
+        assert np.allclose(result, 1.0)
+
+    def test_kdj_matches_recursive_definition(self):
+        """测试 KDJ 与逐行递归定义一致"""
+        df = create_mock_data(days=60)
+        kdj_df = calculate_kdj(df)
+
+        low_n = df["low"].rolling(window=9, min_periods=1).min()
+        high_n = df["high"].rolling(window=9, min_periods=1).max()
+        rsv = ((df["close"] - low_n) / (high_n - low_n) * 100).fillna(50).to_numpy()
+        k = [50.0]
+        for value in rsv[1:]:
+            k.append(2 / 3 * k[-1] + value / 3)
+
+        assert np.allclose(kdj_df["K"].to_numpy(), k)
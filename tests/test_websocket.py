@@ -138,6 +138,30 @@ class TestWebSocketEndpoints:
             # 接收错误消息
             data = ws.receive_json()
             assert data["type"] == "error"
+            assert data["message"] == "Unknown message type: invalid_type"
+
+    def test_websocket_malformed_frames(self, client):
+        """测试格式错误的帧返回对应错误"""
+        with client.websocket_connect("/api/v1/ws/quote") as ws:
+            ws.receive_json()
+
+            ws.send_text("{not json")
+            data = ws.receive_json()
+            assert data["message"] == "Invalid JSON format"
+
+            ws.send_json({"type": "subscribe", "stocks": "600000"})
+            data = ws.receive_json()
+            assert data["type"] == "error"
+            assert data["message"].startswith("Invalid subscribe message")
+
+    def test_websocket_binary_frame(self, client):
+        """测试二进制帧同样可以被解析"""
+        with client.websocket_connect("/api/v1/ws/quote") as ws:
+            ws.receive_json()
+
+            ws.send_bytes(b'{"type": "ping"}')
+            data = ws.receive_json()
+            assert data["type"] == "pong"
 
     def test_websocket_disconnect(self, client):
         """测试断开连接"""
@@ -171,6 +195,34 @@ class TestWebSocketEndpoints:
                 assert data["data"]["total_connections"] >= 1
 
 
+    def test_websocket_oversized_message(self, client):
+        """测试超出长度限制的消息在解析前被拒绝"""
+        from app.api.websocket import manager
+
+        with client.websocket_connect("/api/v1/ws/quote") as ws:
+            ws.receive_json()
+
+            ws.send_text("x" * (manager.max_message_size + 1))
+
+            data = ws.receive_json()
+            assert data["type"] == "error"
+            assert data["message"] == "Message too large"
+
+    def test_websocket_oversized_message_counts_bytes(self, client):
+        """测试文本帧按 UTF-8 字节数而非字符数判断长度"""
+        from app.api.websocket import manager
+
+        with client.websocket_connect("/api/v1/ws/quote") as ws:
+            ws.receive_json()
+
+            # 字符数约为上限的三分之一，UTF-8 编码后超出上限
+            ws.send_text("股" * (manager.max_message_size // 3 + 1))
+
+            data = ws.receive_json()
+            assert data["type"] == "error"
+            assert data["message"] == "Message too large"
+
+
 class TestWebSocketStatus:
     """WebSocket 状态端点测试"""
 
@@ -213,6 +265,37 @@ class TestConnectionManager:
         assert stats["total_connections"] == 0
         assert stats["total_subscriptions"] == 0
         assert stats["tracked_stocks"] == 0
+        assert stats["top_stocks"] == []
+
+    @pytest.mark.asyncio
+    async def test_manager_stats_follow_subscription_changes(self):
+        """测试统计信息随订阅变化更新"""
+        from app.api.websocket import ConnectionManager
+
+        manager = ConnectionManager()
+        first_ws = MagicMock()
+        first_ws.accept = AsyncMock()
+        second_ws = MagicMock()
+        second_ws.accept = AsyncMock()
+
+        first_id = await manager.connect(first_ws)
+        second_id = await manager.connect(second_ws)
+        await manager.subscribe(first_id, ["600000", "000001"])
+        await manager.subscribe(second_id, ["600000"])
+
+        stats = manager.get_stats()
+        assert stats["total_connections"] == 2
+        assert stats["total_subscriptions"] == 3
+        assert stats["top_stocks"][0] == ("600000", 2)
+        assert manager.get_stats() is stats
+
+        await manager.disconnect(first_id)
+        stats = manager.get_stats()
+        assert stats["total_connections"] == 1
+        assert stats["total_subscriptions"] == 1
+        assert stats["subscribers_per_stock"] == {"600000": 1}
+
+        await manager.disconnect(second_id)
 
 
 @pytest.mark.asyncio
@@ -274,3 +357,204 @@ async def test_websocket_subscribe_unsubscribe():
 
     # 清理
     await manager.disconnect(client_id)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_isolates_failed_client():
+    """测试广播时单个客户端发送失败不影响其他客户端"""
+    from app.api.websocket import ConnectionManager
+    from starlette.websockets import WebSocketState
+
+    manager = ConnectionManager()
+
+    good_ws = MagicMock()
+    good_ws.client_state = WebSocketState.CONNECTED
+    good_ws.accept = AsyncMock()
+    good_ws.send_text = AsyncMock()
+
+    bad_ws = MagicMock()
+    bad_ws.client_state = WebSocketState.CONNECTED
+    bad_ws.accept = AsyncMock()
+    bad_ws.send_text = AsyncMock()
+
+    good_id = await manager.connect(good_ws)
+    bad_id = await manager.connect(bad_ws)
+
+    bad_ws.send_text.side_effect = RuntimeError("connection lost")
+    await manager.broadcast_to_all({"message": "hello"})
+
+    good_ws.send_text.assert_awaited_with('{"type":"broadcast","data":{"message":"hello"}}')
+    assert bad_id not in manager.active_connections
+    assert good_id in manager.active_connections
+
+    await manager.disconnect(good_id)
+
+
+@pytest.mark.asyncio
+async def test_quote_pushes_are_coalesced():
+    """测试合并窗口内的多条行情打包为一条 multi 消息"""
+    from app.api.websocket import ConnectionManager
+    from starlette.websockets import WebSocketState
+
+    manager = ConnectionManager()
+
+    ws = MagicMock()
+    ws.client_state = WebSocketState.CONNECTED
+    ws.accept = AsyncMock()
+    ws.send_text = AsyncMock()
+
+    client_id = await manager.connect(ws)
+    await manager.subscribe(client_id, ["600000", "000001"])
+    ws.send_text.reset_mock()
+
+    await manager.broadcast_to_subscribers("600000", {"price": 10.5})
+    await manager.broadcast_to_subscribers("000001", {"price": 12.3})
+    await asyncio.sleep(manager.batch_window * 4)
+
+    ws.send_text.assert_awaited_once_with(
+        '{"type":"multi","items":['
+        '{"type":"quote","stock_code":"600000","data":{"price":10.5}},'
+        '{"type":"quote","stock_code":"000001","data":{"price":12.3}}]}'
+    )
+
+    await manager.disconnect(client_id)
+
+
+@pytest.mark.asyncio
+async def test_handle_reuse_after_disconnect():
+    """测试断开连接后句柄被复用且订阅关系被清理"""
+    from app.api.websocket import ConnectionManager
+
+    manager = ConnectionManager()
+
+    first_ws = MagicMock()
+    first_ws.accept = AsyncMock()
+    first_id = await manager.connect(first_ws)
+    await manager.subscribe(first_id, ["600000"])
+    first_handle = manager._handles[first_id]
+    assert manager.stock_subscribers["600000"].tolist() == [first_handle]
+
+    await manager.disconnect(first_id)
+    assert "600000" not in manager.stock_subscribers
+
+    second_ws = MagicMock()
+    second_ws.accept = AsyncMock()
+    second_id = await manager.connect(second_ws)
+    assert manager._handles[second_id] == first_handle
+    assert manager.active_connections == {second_id: second_ws}
+
+    await manager.disconnect(second_id)
+
+
+@pytest.mark.asyncio
+async def test_cleanup_only_disconnects_expired_clients():
+    """测试心跳超时清理只断开未刷新心跳的客户端"""
+    from app.api.websocket import ConnectionManager
+
+    manager = ConnectionManager()
+
+    stale_ws = MagicMock()
+    stale_ws.accept = AsyncMock()
+    fresh_ws = MagicMock()
+    fresh_ws.accept = AsyncMock()
+
+    with patch("app.api.websocket.time.time", return_value=1000.0):
+        stale_id = await manager.connect(stale_ws)
+        fresh_id = await manager.connect(fresh_ws)
+
+    with patch("app.api.websocket.time.time", return_value=1050.0):
+        await manager.handle_ping(fresh_id)
+
+    with patch("app.api.websocket.time.time", return_value=1061.0):
+        await manager._cleanup_stale_connections()
+
+    assert stale_id not in manager.active_connections
+    assert fresh_id in manager.active_connections
+
+    manager._cleanup_task.cancel()
+    await manager.disconnect(fresh_id)
+
+
+@pytest.mark.asyncio
+async def test_pubsub_channels_follow_subscriber_transitions():
+    """测试仅在订阅者数量 0↔1 变化时订阅/取消订阅 Redis 频道"""
+    from app.api.websocket import ConnectionManager
+
+    manager = ConnectionManager()
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.unsubscribe = AsyncMock()
+    manager.attach_pubsub(pubsub)
+    handler = pubsub.set_handler.call_args[0][0]
+
+    first_ws = MagicMock()
+    first_ws.accept = AsyncMock()
+    second_ws = MagicMock()
+    second_ws.accept = AsyncMock()
+    first_id = await manager.connect(first_ws)
+    second_id = await manager.connect(second_ws)
+
+    await manager.subscribe(first_id, ["600000"])
+    await manager.subscribe(second_id, ["600000"])
+    pubsub.subscribe.assert_awaited_once_with("quote:600000")
+
+    handler("quote:600000", '{"price": 10.5}')
+    queue = manager._queues[manager._handles[first_id]]
+    assert queue.get_nowait() == {
+        "type": "quote",
+        "stock_code": "600000",
+        "data": {"price": 10.5}
+    }
+
+    await manager.unsubscribe(first_id, ["600000"])
+    pubsub.unsubscribe.assert_not_awaited()
+
+    await manager.disconnect(second_id)
+    pubsub.unsubscribe.assert_awaited_once_with("quote:600000")
+
+    await manager.disconnect(first_id)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_sent_as_single_multi_frame():
+    """测试行情快照一次 MGET 读取并合并为一条 multi 消息，非 JSON 对象的值被跳过"""
+    from app.api.websocket import ConnectionManager
+    from starlette.websockets import WebSocketState
+
+    manager = ConnectionManager()
+    manager._pubsub = MagicMock()
+
+    ws = MagicMock()
+    ws.client_state = WebSocketState.CONNECTED
+    ws.accept = AsyncMock()
+    ws.send_text = AsyncMock()
+    client_id = await manager.connect(ws)
+    ws.send_text.reset_mock()
+
+    with patch(
+        "app.api.websocket.snapshot",
+        AsyncMock(return_value=[b'{"price":10.5}', None, b"\x00\x81\xa1v\x01", b"[1]"]),
+    ) as mock_snapshot:
+        await manager.send_snapshot(client_id, ["600000", "000001", "000002", "000003"])
+
+    mock_snapshot.assert_awaited_once_with(["600000", "000001", "000002", "000003"])
+    ws.send_text.assert_awaited_once_with(
+        '{"type":"multi","items":['
+        '{"type":"quote","stock_code":"600000","data":{"price":10.5}}]}'
+    )
+
+    await manager.disconnect(client_id)
+
+
+def test_send_queue_size_from_config():
+    """测试出站行情队列上限读取配置 ws_send_queue"""
+    from dataclasses import replace
+
+    from app.api.websocket import ConnectionManager
+    from app.config import get_config
+
+    config = replace(get_config(), ws_send_queue=5)
+    with patch("app.api.websocket.get_config", return_value=config):
+        manager = ConnectionManager()
+
+    assert manager.max_queue == 5